@@ -0,0 +1,171 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark how finding the next queued deployment scales with the size of
+the queue.
+
+This fills a scratch TagOpsDB with queued deployments (by default half of
+them for another environment, declared first, which is the worst case
+for filtering) and reports the number of SQL queries and the latency of
+Installer.find_deployment(), Installer.find_deployments() and the old
+in-Python environment filtering. The created rows are removed at the end.
+
+Usage:
+    python benchmarks/find_deployment.py --config-dir DIR \\
+        --package-id ID --tier-id ID [--sizes 10,100,1000,5000]
+
+DIR must hold deploy.yml and the tagopsdb/dbaccess configuration, as for
+the installer. Never point this at a production database.
+"""
+
+import argparse
+import os.path
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tagopsdb
+import tds.apps
+import tds.model
+
+from helpers import QueryCounter, print_table, timed
+
+
+def legacy_find_deployment(installer):
+    """The original find_deployment(), filtering environments in Python."""
+    deps = tds.model.Deployment.find(status='queued', order_by='declared')
+
+    while deps:
+        deployment = deps[0]
+        if any(
+            x.environment_id != installer.environment.id for x in
+            deployment.app_deployments
+        ) or any(
+            x.host.environment_id != installer.environment.id for x in
+            deployment.host_deployments
+        ):
+            deps.pop(0)
+            continue
+        return deployment
+
+    return None
+
+
+def add_queued_deployments(count, package_id, tier_id, environment_id):
+    """Create count queued deployments with one tier deployment each."""
+    deployments = list()
+    for _idx in range(count):
+        deployment = tagopsdb.Deployment(user='benchmark', status='queued')
+        tagopsdb.Session.add(deployment)
+        deployments.append(deployment)
+    tagopsdb.Session.flush()
+
+    for deployment in deployments:
+        tagopsdb.Session.add(tagopsdb.AppDeployment(
+            package_id=package_id,
+            deployment_id=deployment.id,
+            app_id=tier_id,
+            user='benchmark',
+            status='pending',
+            environment_id=environment_id,
+        ))
+    tagopsdb.Session.commit()
+
+    return [deployment.id for deployment in deployments]
+
+
+def remove_deployments(dep_ids):
+    """Delete the given deployments and their tier deployments."""
+    for idx in range(0, len(dep_ids), 500):
+        chunk = dep_ids[idx:idx + 500]
+        tagopsdb.Session.query(tagopsdb.AppDeployment).filter(
+            tagopsdb.AppDeployment.deployment_id.in_(chunk)
+        ).delete(synchronize_session=False)
+        tagopsdb.Session.query(tagopsdb.Deployment).filter(
+            tagopsdb.Deployment.id.in_(chunk)
+        ).delete(synchronize_session=False)
+    tagopsdb.Session.commit()
+
+
+def measure(func):
+    """Return (query count, seconds) for one call of func."""
+    tagopsdb.Session.close()
+    results = dict()
+    with QueryCounter() as counter:
+        with timed(results, 'elapsed'):
+            func()
+
+    return counter.count, results['elapsed']
+
+
+def main():
+    """Fill the queue in steps and measure each lookup at each step."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--config-dir', required=True)
+    parser.add_argument('--package-id', type=int, required=True)
+    parser.add_argument('--tier-id', type=int, required=True)
+    parser.add_argument('--sizes', default='10,100,1000,5000')
+    parser.add_argument(
+        '--other-env-fraction', type=float, default=0.5,
+        help='Fraction of queued deployments for another environment'
+    )
+    args = parser.parse_args()
+
+    installer = tds.apps.Installer(dict(
+        config_dir=args.config_dir,
+        user_level='admin',
+    ))
+    other_env = tagopsdb.Session.query(tagopsdb.Environment).filter(
+        tagopsdb.Environment.id != installer.environment.id
+    ).first()
+
+    lookups = [
+        ('find_deployment', installer.find_deployment),
+        ('find_deployments', installer.find_deployments),
+        ('legacy', lambda: legacy_find_deployment(installer)),
+    ]
+
+    created = list()
+    rows = list()
+    try:
+        for size in [int(x) for x in args.sizes.split(',')]:
+            missing = size - len(created)
+            num_other = int(missing * args.other_env_fraction)
+            # Other environment first: the worst case for the old filter
+            created.extend(add_queued_deployments(
+                num_other, args.package_id, args.tier_id, other_env.id
+            ))
+            created.extend(add_queued_deployments(
+                missing - num_other, args.package_id, args.tier_id,
+                installer.environment.id
+            ))
+
+            row = [size]
+            for _name, func in lookups:
+                queries, elapsed = measure(func)
+                row.extend([queries, '%.1f' % (elapsed * 1000)])
+            rows.append(row)
+    finally:
+        tagopsdb.Session.rollback()
+        remove_deployments(created)
+
+    headers = ['queued']
+    for name, _func in lookups:
+        headers.extend(['%s queries' % name, '%s ms' % name])
+    print_table(headers, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shared helpers for the TDS benchmark scripts.
+"""
+
+import contextlib
+import time
+
+import sqlalchemy.event
+import tagopsdb
+
+
+class QueryCounter(object):
+    """
+    Count the SQL statements executed on the tagopsdb engine while
+    active (use as a context manager).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.engine = tagopsdb.Session.get_bind()
+
+    def _before_cursor_execute(self, *_args, **_kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        sqlalchemy.event.listen(
+            self.engine, 'before_cursor_execute', self._before_cursor_execute
+        )
+        return self
+
+    def __exit__(self, *_exc_info):
+        sqlalchemy.event.remove(
+            self.engine, 'before_cursor_execute', self._before_cursor_execute
+        )
+
+
+@contextlib.contextmanager
+def timed(results, key):
+    """Store the wall-clock time of the enclosed block in results[key]."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        results[key] = time.time() - start
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile (0-100) of values."""
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def print_table(headers, rows):
+    """Print rows as a simple aligned table."""
+    widths = [
+        max(len(str(x)) for x in [header] + [row[i] for row in rows])
+        for i, header in enumerate(headers)
+    ]
+    fmt = '  '.join('%%%ds' % width for width in widths)
+
+    print(fmt % tuple(headers))
+    for row in rows:
+        print(fmt % tuple(row))
@@ -0,0 +1,276 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark installer throughput with the simulated deploy strategy.
+
+This adds a tier of fake hosts to a scratch TagOpsDB, queues deployments of
+a package to the whole tier and runs them, either in-process with
+Installer ('installer' mode) or through TDSInstallerDaemon and its worker
+processes ('daemon' mode). It reports deployments and host deployments per
+hour, SQL queries per host deployment (installer mode only, as the daemon's
+queries happen in its workers) and the tail latency of host deployments and
+deployments. The created rows are removed at the end.
+
+Usage:
+    python benchmarks/installer_throughput.py --config-dir DIR \\
+        --package-id ID --tier-id ID [--hosts 2000] [--deployments 5]
+
+DIR must hold deploy.yml and the tagopsdb/dbaccess configuration, as for
+the installer; in daemon mode deploy.yml must select the 'simulated'
+deploy strategy, since the workers read it. Never point this at a
+production database.
+"""
+
+import argparse
+import os.path
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tagopsdb
+import tds.apps
+import tds.deploy_strategy
+
+from helpers import QueryCounter, percentile, print_table, timed
+
+FINISHED = ('complete', 'failed', 'stopped')
+
+
+def add_hosts(count, tier_id, environment_id):
+    """Create count hosts in the given tier and return their IDs."""
+    first_cage = tagopsdb.Session.query(tagopsdb.Host).count()
+    hosts = list()
+    for idx in range(count):
+        host = tagopsdb.Host(
+            state='operational',
+            hostname='benchmark%05d' % idx,
+            distribution='Centos 6.4',
+            app_id=tier_id,
+            cage_location=first_cage + idx,
+            cab_location='benchmark',
+            elevation=8,
+            environment_id=environment_id,
+        )
+        tagopsdb.Session.add(host)
+        hosts.append(host)
+    tagopsdb.Session.commit()
+
+    return [new_host.id for new_host in hosts]
+
+
+def add_deployments(count, package_id, tier_id, environment_id, host_ids):
+    """
+    Create count deployments of the package to the whole tier and queue
+    them all at once. Return their IDs.
+    """
+    deployments = list()
+    for _idx in range(count):
+        deployment = tagopsdb.Deployment(
+            user='benchmark', status='pending', delay=0
+        )
+        tagopsdb.Session.add(deployment)
+        deployments.append(deployment)
+    tagopsdb.Session.flush()
+
+    for deployment in deployments:
+        tagopsdb.Session.add(tagopsdb.AppDeployment(
+            package_id=package_id,
+            deployment_id=deployment.id,
+            app_id=tier_id,
+            user='benchmark',
+            status='pending',
+            environment_id=environment_id,
+        ))
+        for host_id in host_ids:
+            tagopsdb.Session.add(tagopsdb.HostDeployment(
+                package_id=package_id,
+                deployment_id=deployment.id,
+                host_id=host_id,
+                user='benchmark',
+                status='pending',
+            ))
+    tagopsdb.Session.flush()
+
+    for deployment in deployments:
+        deployment.status = 'queued'
+    tagopsdb.Session.commit()
+
+    return [deployment.id for deployment in deployments]
+
+
+def remove_rows(dep_ids, host_ids):
+    """Delete the given deployments with their children, and hosts."""
+    for model, column, ids in (
+        (tagopsdb.HostDeployment, 'deployment_id', dep_ids),
+        (tagopsdb.AppDeployment, 'deployment_id', dep_ids),
+        (tagopsdb.Deployment, 'id', dep_ids),
+        (tagopsdb.Host, 'id', host_ids),
+    ):
+        for idx in range(0, len(ids), 500):
+            tagopsdb.Session.query(model).filter(
+                getattr(model, column).in_(ids[idx:idx + 500])
+            ).delete(synchronize_session=False)
+    tagopsdb.Session.commit()
+
+
+def run_installer(installer, dep_ids):
+    """Run the given deployments in-process; return the query count."""
+    dep_ids = set(dep_ids)
+    with QueryCounter() as counter:
+        while True:
+            tagopsdb.Session.close()
+            found = [
+                deployment for deployment, _targets in
+                installer.find_deployments()
+                if deployment.id in dep_ids
+            ]
+            if not found:
+                break
+            for deployment in found:
+                installer.do_serial_deployment(deployment)
+
+    return counter.count
+
+
+def run_daemon(installer, dep_ids):
+    """Run the given deployments through TDSInstallerDaemon."""
+    # Imported here so that installer mode doesn't need kazoo.
+    from tds.scripts.tds_installer import TDSInstallerDaemon
+
+    daemon = TDSInstallerDaemon(installer)
+    daemon.configure()
+    daemon.queue_signal.notify()
+    try:
+        while True:
+            daemon.run_callback()
+            daemon.loop_callback()
+            tagopsdb.Session.close()
+            unfinished = tagopsdb.Session.query(tagopsdb.Deployment).filter(
+                tagopsdb.Deployment.id.in_(dep_ids),
+                ~tagopsdb.Deployment.status.in_(FINISHED),
+            ).count()
+            if not unfinished:
+                break
+    finally:
+        daemon.end_callback()
+
+
+def main():
+    """Set up the tier and deployments, run them and report."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--config-dir', required=True)
+    parser.add_argument('--package-id', type=int, required=True)
+    parser.add_argument('--tier-id', type=int, required=True)
+    parser.add_argument('--hosts', type=int, default=2000)
+    parser.add_argument('--deployments', type=int, default=5)
+    parser.add_argument(
+        '--mode', choices=('installer', 'daemon'), default='installer'
+    )
+    parser.add_argument(
+        '--distribution', default='lognormal',
+        help='Latency distribution of the simulated deploy strategy'
+    )
+    parser.add_argument(
+        '--latency', type=float, default=1.0,
+        help='Mean simulated per-host latency in seconds'
+    )
+    parser.add_argument('--spread', type=float, default=0.5)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument(
+        '--batch-size', default=None,
+        help='Override rollout.batch_size in installer mode'
+    )
+    args = parser.parse_args()
+
+    installer = tds.apps.Installer(dict(
+        config_dir=args.config_dir,
+        user_level='admin',
+    ))
+    if args.mode == 'daemon':
+        if installer.config.get('deploy_strategy', 'salt') != 'simulated':
+            parser.error(
+                "daemon mode needs 'deploy_strategy: simulated' in deploy.yml"
+            )
+    else:
+        strategy_cls = tds.deploy_strategy.SimulatedDeployStrategy
+        installer.deploy_strategy = strategy_cls(
+            distribution=args.distribution,
+            latency=args.latency,
+            spread=args.spread,
+            failure_rate=args.failure_rate,
+            seed=args.seed,
+        )
+
+    if args.batch_size is not None:
+        installer.batch_size = args.batch_size
+
+    env_id = installer.environment.id
+    host_ids = add_hosts(args.hosts, args.tier_id, env_id)
+    dep_ids = list()
+    results = dict()
+    queries = None
+    try:
+        dep_ids = add_deployments(
+            args.deployments, args.package_id, args.tier_id, env_id, host_ids
+        )
+        with timed(results, 'elapsed'):
+            if args.mode == 'daemon':
+                run_daemon(installer, dep_ids)
+            else:
+                queries = run_installer(installer, dep_ids)
+
+        tagopsdb.Session.close()
+        host_deps = tagopsdb.Session.query(tagopsdb.HostDeployment).filter(
+            tagopsdb.HostDeployment.deployment_id.in_(dep_ids)
+        ).all()
+        deployments = tagopsdb.Session.query(tagopsdb.Deployment).filter(
+            tagopsdb.Deployment.id.in_(dep_ids)
+        ).all()
+        host_durations = [dep.duration for dep in host_deps]
+        dep_durations = [dep.duration for dep in deployments]
+        num_failed = len([dep for dep in host_deps if dep.status != 'ok'])
+    finally:
+        tagopsdb.Session.rollback()
+        remove_rows(dep_ids, host_ids)
+
+    elapsed = results['elapsed']
+    hours = elapsed / 3600.0
+    rows = [
+        ['mode', args.mode],
+        ['hosts', args.hosts],
+        ['deployments', len(dep_durations)],
+        ['host deployments', len(host_durations)],
+        ['failed host deployments', num_failed],
+        ['elapsed s', '%.1f' % elapsed],
+        ['deployments/hour', '%.1f' % (len(dep_durations) / hours)],
+        ['host deployments/hour', '%.1f' % (len(host_durations) / hours)],
+        ['queries/host deployment', '-' if queries is None else
+         '%.2f' % (float(queries) / max(len(host_durations), 1))],
+    ]
+    for name, values in (
+        ('host deployment', host_durations),
+        ('deployment', dep_durations),
+    ):
+        for pct in (50, 95, 99):
+            rows.append([
+                '%s p%d s' % (name, pct),
+                '%.2f' % percentile(values, pct),
+            ])
+    print_table(['metric', 'value'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the per-request cost of setting up a REST view.
+
+Every REST view is constructed repeatedly, once the way each request used
+to (parsing the settings files and looking up the enum choices of the
+model) and once with the process-wide settings and choices caches, and
+the mean construction time of each is reported. No SQL is executed.
+
+Usage:
+    python benchmarks/rest_settings.py --config-dir DIR [--iterations 200]
+
+DIR must hold deploy.yml, tds_rest.yml and the tagopsdb/dbaccess
+configuration, as for the REST API.
+"""
+
+import argparse
+import os.path
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyramid.testing import DummyRequest
+
+import tds.apps
+import tds.utils.config
+import tds.views.rest
+import tds.views.rest.base
+import tds.views.rest.json_validators
+import tds.views.rest.settings
+
+from helpers import print_table, timed
+
+
+def view_classes(cls=tds.views.rest.base.BaseView):
+    """Return all the REST view classes, by name."""
+    classes = dict()
+    for subclass in cls.__subclasses__():
+        classes[subclass.__name__] = subclass
+        classes.update(view_classes(subclass))
+    return classes
+
+
+def construct_uncached(cls, request):
+    """Construct the view as before the settings and choices caches."""
+    tds.views.rest.json_validators._CHOICES.pop(cls, None)
+    tds.views.rest.settings.registry.request_reload()
+    cls(request)
+
+
+def main():
+    """Construct each view with and without the caches and time it."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--config-dir', required=True)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    tds.utils.config.TDSConfig.default_conf_dir = args.config_dir
+    tds.apps.TDSProgramBase(dict(
+        config_dir=args.config_dir,
+        user_level='admin',
+    )).initialize_db()
+
+    request = DummyRequest()
+    rows = list()
+    for name, cls in sorted(view_classes().items()):
+        results = dict()
+        with timed(results, 'uncached'):
+            for _idx in range(args.iterations):
+                construct_uncached(cls, request)
+        with timed(results, 'cached'):
+            for _idx in range(args.iterations):
+                cls(request)
+
+        uncached = results['uncached'] * 1e6 / args.iterations
+        cached = results['cached'] * 1e6 / args.iterations
+        rows.append([name, '%.0f' % uncached, '%.0f' % cached,
+                     '%.1f' % (uncached / cached)])
+
+    print_table(['view', 'uncached us', 'cached us', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -327,3 +327,166 @@ Feature: deploy daemon
             | strategy  | host_st   |
             | salt      | pending   |
             | salt      | failed    |
+
+    Scenario Outline: run daemon with a tier deployment in batches
+        Given there are hosts:
+            | name  | env   | app_id    |
+            | host2 | dev   | 2         |
+            | host3 | dev   | 2         |
+        And there are deployments:
+            | id    | user  | status    |
+            | 6     | foo   | queued    |
+        And there are tier deployments:
+            | id    | deployment_id | status    | user  | app_id    | package_id    | environment_id    |
+            | 6     | 6             | pending   | foo   | 2         | 1             | 1                 |
+        And there are host deployments:
+            | id    | deployment_id | status    | user  | host_id   | package_id    |
+            | 6     | 6             | pending   | foo   | 1         | 1             |
+            | 7     | 6             | pending   | foo   | 2         | 1             |
+            | 8     | 6             | pending   | foo   | 3         | 1             |
+        And the deploy strategy is "<strategy>"
+        And the rollout batch size is "<batch_size>"
+        When I run "deploy_daemon"
+        Then there is a deployment with id=6,status="complete"
+        And there is a tier deployment with id=6,deployment_id=6,status="complete"
+        And there is a host deployment with id=6,deployment_id=6,status="ok"
+        And the host deployment with id=6 has duration greater than 0
+        And there is a host deployment with id=7,deployment_id=6,status="ok"
+        And the host deployment with id=7 has duration greater than 0
+        And there is a host deployment with id=8,deployment_id=6,status="ok"
+        And the host deployment with id=8 has duration greater than 0
+        And package "myapp" version "121" was deployed to the deploy target with name="tier1"
+
+        Examples:
+            | strategy  | batch_size    |
+            | salt      | 2             |
+            | salt      | 3             |
+            | salt      | 50%           |
+            | salt      | 100%          |
+
+    Scenario Outline: stop a tier deployment once the failure threshold is crossed
+        Given there are hosts:
+            | name  | env   | app_id    |
+            | host2 | dev   | 2         |
+            | host3 | dev   | 2         |
+        And there are deployments:
+            | id    | user  | status    |
+            | 6     | foo   | queued    |
+        And there are tier deployments:
+            | id    | deployment_id | status    | user  | app_id    | package_id    | environment_id    |
+            | 6     | 6             | pending   | foo   | 2         | 1             | 1                 |
+        And there are host deployments:
+            | id    | deployment_id | status    | user  | host_id   | package_id    |
+            | 6     | 6             | pending   | foo   | 1         | 1             |
+            | 7     | 6             | pending   | foo   | 2         | 1             |
+            | 8     | 6             | pending   | foo   | 3         | 1             |
+        And the deploy strategy is "<strategy>"
+        And the rollout batch size is "2"
+        And the rollout failure threshold is "0"
+        And the host "host1" will fail to deploy
+        When I run "deploy_daemon"
+        Then there is a deployment with id=6,status="failed"
+        And there is a tier deployment with id=6,deployment_id=6,status="incomplete"
+        And there is a host deployment with id=6,deployment_id=6,status="failed"
+        And there is a host deployment with id=7,deployment_id=6,status="ok"
+        And there is a host deployment with id=8,deployment_id=6,status="pending",duration=0
+        And package "myapp" version "121" was deployed to host "host2"
+        And package "myapp" version "121" was not deployed to host "host3"
+
+        Examples:
+            | strategy  |
+            | salt      |
+
+    Scenario Outline: run daemon with a tier deployment in waves
+        Given there are hosts:
+            | name  | env   | app_id    |
+            | host2 | dev   | 2         |
+            | host3 | dev   | 2         |
+        And there are deployments:
+            | id    | user  | status    |
+            | 6     | foo   | queued    |
+        And there are tier deployments:
+            | id    | deployment_id | status    | user  | app_id    | package_id    | environment_id    |
+            | 6     | 6             | pending   | foo   | 2         | 1             | 1                 |
+        And there are host deployments:
+            | id    | deployment_id | status    | user  | host_id   | package_id    |
+            | 6     | 6             | pending   | foo   | 1         | 1             |
+            | 7     | 6             | pending   | foo   | 2         | 1             |
+            | 8     | 6             | pending   | foo   | 3         | 1             |
+        And the deploy strategy is "<strategy>"
+        And the rollout waves are "<waves>"
+        When I run "deploy_daemon"
+        Then there is a deployment with id=6,status="complete"
+        And there is a tier deployment with id=6,deployment_id=6,status="complete"
+        And there is a host deployment with id=6,deployment_id=6,status="ok"
+        And there is a host deployment with id=7,deployment_id=6,status="ok"
+        And there is a host deployment with id=8,deployment_id=6,status="ok"
+        And package "myapp" version "121" was deployed to the deploy target with name="tier1"
+
+        Examples:
+            | strategy  | waves     |
+            | salt      | 1         |
+            | salt      | 1,50%     |
+            | salt      | 1,1,1     |
+
+    Scenario Outline: stop a tier deployment when its canary wave fails
+        Given there are hosts:
+            | name  | env   | app_id    |
+            | host2 | dev   | 2         |
+            | host3 | dev   | 2         |
+        And there are deployments:
+            | id    | user  | status    |
+            | 6     | foo   | queued    |
+        And there are tier deployments:
+            | id    | deployment_id | status    | user  | app_id    | package_id    | environment_id    |
+            | 6     | 6             | pending   | foo   | 2         | 1             | 1                 |
+        And there are host deployments:
+            | id    | deployment_id | status    | user  | host_id   | package_id    |
+            | 6     | 6             | pending   | foo   | 1         | 1             |
+            | 7     | 6             | pending   | foo   | 2         | 1             |
+            | 8     | 6             | pending   | foo   | 3         | 1             |
+        And the deploy strategy is "<strategy>"
+        And the rollout waves for tier "tier1" are "1,50%"
+        And the host "host1" will fail to deploy
+        When I run "deploy_daemon"
+        Then there is a deployment with id=6,status="failed"
+        And there is a tier deployment with id=6,deployment_id=6,status="incomplete"
+        And there is a host deployment with id=6,deployment_id=6,status="failed"
+        And there is a host deployment with id=7,deployment_id=6,status="pending",duration=0
+        And there is a host deployment with id=8,deployment_id=6,status="pending",duration=0
+        And package "myapp" version "121" was not deployed to host "host2"
+        And package "myapp" version "121" was not deployed to host "host3"
+
+        Examples:
+            | strategy  |
+            | salt      |
+
+    Scenario Outline: run daemon with a tier deployment published asynchronously
+        Given there are hosts:
+            | name  | env   | app_id    |
+            | host2 | dev   | 2         |
+        And there are deployments:
+            | id    | user  | status    |
+            | 6     | foo   | queued    |
+        And there are tier deployments:
+            | id    | deployment_id | status    | user  | app_id    | package_id    | environment_id    |
+            | 6     | 6             | pending   | foo   | 2         | 1             | 1                 |
+        And there are host deployments:
+            | id    | deployment_id | status    | user  | host_id   | package_id    |
+            | 6     | 6             | pending   | foo   | 1         | 1             |
+            | 7     | 6             | pending   | foo   | 2         | 1             |
+        And the deploy strategy is "<strategy>"
+        And the deploy strategy publishes asynchronously
+        And the rollout batch size is "2"
+        And the host "host2" will fail to deploy
+        When I run "deploy_daemon"
+        Then there is a deployment with id=6,status="failed"
+        And there is a tier deployment with id=6,deployment_id=6,status="incomplete"
+        And there is a host deployment with id=6,deployment_id=6,status="ok"
+        And the host deployment with id=6 has duration greater than 0
+        And there is a host deployment with id=7,deployment_id=6,status="failed"
+        And package "myapp" version "121" was deployed to host "host1"
+
+        Examples:
+            | strategy  |
+            | salt      |
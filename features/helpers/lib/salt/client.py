@@ -14,10 +14,16 @@
 
 import json
 import os
+import re
+import threading
 
 import salt.config
 
 
+# The installer may publish from several threads at once
+RESULTS_LOCK = threading.Lock()
+
+
 class SMinion(object):
     """Fake salt.minion.SMinion class"""
 
@@ -42,6 +48,10 @@ class SMinion(object):
         return input_data
 
     def record_results(self, stuff):
+        with RESULTS_LOCK:
+            self._record_results(stuff)
+
+    def _record_results(self, stuff):
         work_dir = os.environ.get('BEHAVE_WORK_DIR', os.getcwd())
         results_file = os.path.join(work_dir, self.RESULTS_FILE)
 
@@ -77,29 +87,50 @@ class SMinion(object):
             result='Restart of app "%s" successful' % app,
         )
 
-    def return_full_data(self, *args, **kwargs):
-        (host_re, command), (args,) = args[:2], args[2:]
-        hostname = host_re[:-2]   # Remove '.*' to get hostname
-
+    @staticmethod
+    def get_hostnames(target, expr_form='glob'):
+        if expr_form == 'pcre':
+            # '^(host1|host2)(\..*)?$' -> ['host1', 'host2']
+            match = re.match(r'^\^\((.*)\)\(\\\.\.\*\)\?\$$', target)
+            return [
+                re.sub(r'\\(.)', r'\1', hostname)
+                for hostname in match.group(1).split('|')
+            ]
+        elif expr_form == 'list':
+            return target.split(',')
+
+        return [target[:-2]]   # Remove '.*' to get hostname
+
+    def run_command(self, hostnames, command, args):
         input = self.read_input()
 
-        if hostname in input:
-            result = input[hostname]
-        elif command == 'tds.restart':
-            result = self.restart(hostname, *args)
-        elif command == 'tds.install':
-            result = self.install(hostname, *args)
-        else:
-            raise Exception('Unknown command:%r', command)
+        results = []
+        for hostname in hostnames:
+            if hostname in input:
+                result = input[hostname]
+            elif command == 'tds.restart':
+                result = self.restart(hostname, *args)
+            elif command == 'tds.install':
+                result = self.install(hostname, *args)
+            else:
+                raise Exception('Unknown command:%r', command)
+            results.append(result)
 
-        self.record_results([result])
+        self.record_results(results)
 
         return dict(
-            hostname=dict(
-                ret=result['result'],
-            ),
+            (hostname, dict(ret=result['result']))
+            for hostname, result in zip(hostnames, results)
+        )
+
+    def return_full_data(self, *args, **kwargs):
+        (host_re, command), (args,) = args[:2], args[2:]
+        hostnames = self.get_hostnames(
+            host_re, kwargs.get('expr_form', 'glob')
         )
 
+        return self.run_command(hostnames, command, args)
+
 
 class Caller(object):
     """Fake salt.client.Caller class"""
@@ -18,4 +18,4 @@ def minion_config(path,
                   minion_id=False):
     """Fake minion_config() method"""
 
-    return {}
+    return {'id': 'tds-fake-minion'}
@@ -0,0 +1,23 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+class SAuth(object):
+    """Fake salt.crypt.SAuth class"""
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def gen_token(self, clear_tok):
+        return 'fake-token-%s' % clear_tok
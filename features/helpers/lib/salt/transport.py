@@ -0,0 +1,74 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import time
+
+import salt.client
+
+
+class Channel(object):
+    """
+    Fake salt.transport.Channel class, emulating the master side of
+    minion_pub/pub_ret in-process.
+
+    A host's return becomes available 'delay' seconds after the job is
+    published, where 'delay' may be given for the host in the salt input
+    file (default 0).
+    """
+
+    jids = itertools.count(20160101000000000000)
+    jobs = {}
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.sminion = salt.client.SMinion(opts)
+
+    @classmethod
+    def factory(cls, opts, **kwargs):
+        return cls(opts)
+
+    def send(self, load):
+        if load['cmd'] == 'minion_pub':
+            return self.minion_pub(load)
+        elif load['cmd'] == 'pub_ret':
+            return self.pub_ret(load)
+
+        raise Exception('Unknown command:%r', load['cmd'])
+
+    def minion_pub(self, load):
+        hostnames = self.sminion.get_hostnames(load['tgt'], load['tgt_type'])
+        returns = self.sminion.run_command(
+            hostnames, load['fun'], load['arg']
+        )
+
+        input = self.sminion.read_input()
+        now = time.time()
+
+        jid = str(next(self.jids))
+        self.jobs[jid] = dict(
+            (hostname, (now + input.get(hostname, {}).get('delay', 0), ret))
+            for hostname, ret in returns.items()
+        )
+
+        return dict(jid=jid, minions=hostnames)
+
+    def pub_ret(self, load):
+        now = time.time()
+
+        return dict(
+            (hostname, ret)
+            for hostname, (ready_time, ret) in self.jobs[load['jid']].items()
+            if ready_time <= now
+        )
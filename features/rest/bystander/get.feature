@@ -93,6 +93,7 @@ Feature: REST API bystander GET
         When I query GET "/bystander"
         Then the response code is 200
         And the response object conforms to the bystander expectation
+        And getting bystander info takes at most 5 database queries
 
     @rest
     Scenario Outline: use limit and/or start
@@ -289,3 +289,34 @@ Feature: REST API performance GET
         Then the response code is 200
         And the response list contains an object with month="2016-01",total=5,ok=3,failed=1,pending=1
         And the response list contains an object with month="2016-02",total=0,ok=0,failed=0,pending=0
+
+    @rest
+    Scenario Outline: get packages info by day or week
+        Given there is an application with name="app1"
+        And there are packages:
+            | version   | revision  | created               | status        |
+            | 1         | 1         | 2016-01-02 01:00:00   | failed        |
+            | 2         | 2         | 2016-01-02 02:00:00   | completed     |
+            | 3         | 3         | 2016-01-03 03:00:00   | removed       |
+            | 4         | 4         | 2016-01-04 04:00:00   | pending       |
+            | 5         | 5         | 2016-01-04 04:00:01   | processing    |
+        When I query GET "/performance/packages?start=2016-01-01&limit=<limit>&granularity=<granularity>"
+        Then the response code is 200
+        And the response list contains an object with <props>
+
+        Examples:
+            | granularity   | limit | props                                                                             |
+            | day           | 4     | day="2016-01-02",total=2,failed=1,completed=1,removed=0,pending=0,processing=0    |
+            | day           | 4     | day="2016-01-03",total=1,failed=0,completed=0,removed=1,pending=0,processing=0    |
+            | day           | 4     | day="2016-01-01",total=0,failed=0,completed=0,removed=0,pending=0,processing=0    |
+            | week          | 2     | week="2015-12-28",total=3,failed=1,completed=1,removed=1,pending=0,processing=0   |
+            | week          | 2     | week="2016-01-04",total=2,failed=0,completed=0,removed=0,pending=1,processing=1   |
+            | month         | 1     | month="2016-01",total=5,failed=1,completed=1,removed=1,pending=1,processing=1     |
+
+    @rest
+    Scenario: bad granularity
+        When I query GET "/performance/packages?granularity=year"
+        Then the response code is 400
+        And the response contains errors:
+            | location  | name          | description                                                                                       |
+            | query     | granularity   | Validation failed: Value year for argument granularity must be one of: ['day', 'month', 'week'].  |
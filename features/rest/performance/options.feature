@@ -27,5 +27,6 @@ Feature: REST API performance OPTIONS
         And the response body contains "Get HTTP method options and parameters for this URL endpoint."
         And the response body contains "limit"
         And the response body contains "start"
-        And the response body contains "Number of months to cover."
-        And the response body contains "Date or datetime during the first month to cover."
+        And the response body contains "granularity"
+        And the response body contains "Number of periods to cover."
+        And the response body contains "Date or datetime during the first period to cover."
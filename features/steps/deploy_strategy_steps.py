@@ -105,6 +105,35 @@ def get_strat_helper(context):
 
 given(u'the deploy strategy is "{strategy}"')(set_strat_helper)
 
+
+@given(u'the deploy strategy publishes asynchronously')
+def given_the_deploy_strategy_publishes_asynchronously(context):
+    add_config_val(
+        context, context.strategy_helper_type, dict(async_publish=True)
+    )
+
+
+@given(u'the rollout batch size is "{batch_size}"')
+def given_the_rollout_batch_size_is(context, batch_size):
+    add_config_val(context, 'rollout', dict(batch_size=batch_size))
+
+
+@given(u'the rollout failure threshold is "{max_failures}"')
+def given_the_rollout_failure_threshold_is(context, max_failures):
+    add_config_val(context, 'rollout', dict(max_failures=max_failures))
+
+
+@given(u'the rollout waves are "{waves}"')
+def given_the_rollout_waves_are(context, waves):
+    add_config_val(context, 'rollout', dict(waves=waves.split(',')))
+
+
+@given(u'the rollout waves for tier "{tier}" are "{waves}"')
+def given_the_rollout_waves_for_tier_are(context, tier, waves):
+    add_config_val(
+        context, 'rollout', dict(tiers={tier: dict(waves=waves.split(','))})
+    )
+
 @then(u'package "{pkg}" version "{version}" was deployed to host "{hostname}"')
 def then_the_package_version_was_deployed_to_host(context, pkg, version,
                                                   hostname):
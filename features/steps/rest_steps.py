@@ -24,9 +24,15 @@ import json
 import requests
 import yaml
 
+import cornice.errors
+import pyramid.testing
+import sqlalchemy.event
+import tagopsdb
+
 from behave import given, then, when
 
 import tds.utils
+import tds.views.rest.bystander
 
 from .model_steps import parse_properties
 
@@ -474,6 +480,37 @@ def then_the_test_conforms_to_the_bystander_expectation(context):
             assert not env_dict['stage_ahead']
 
 
+@then(u'getting bystander info takes at most {count} database queries')
+def then_getting_bystander_info_takes_at_most_queries(context, count):
+    """
+    Run the bystander GET validation (which builds the response) in this
+    process and count the SQL statements it executes.
+    """
+    request = pyramid.testing.DummyRequest()
+    request.errors = cornice.errors.Errors(request)
+    view = tds.views.rest.bystander.BystanderView(request)
+
+    statements = []
+
+    def before_cursor_execute(_conn, _cursor, statement, *_args):
+        statements.append(statement)
+
+    engine = tagopsdb.Session.get_bind()
+    sqlalchemy.event.listen(
+        engine, 'before_cursor_execute', before_cursor_execute
+    )
+    try:
+        view.validate_bystander_get(request)
+    finally:
+        sqlalchemy.event.remove(
+            engine, 'before_cursor_execute', before_cursor_execute
+        )
+
+    assert not request.errors, request.errors
+    assert view.result, view.result
+    assert len(statements) <= int(count), statements
+
+
 @then(u'the response object conforms to the performance expectation')
 def then_the_response_conforms_to_the_performance_expectation(context):
     returned = context.response.json()
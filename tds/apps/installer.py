@@ -17,13 +17,16 @@ Daemon to do installs. It checks the database to see what deployments it needs
 to do, does them, and updates the database.
 """
 
+import collections
 import logging
+import math
 import os
 import sys
 
 import time
 from datetime import datetime, timedelta
 
+import sqlalchemy.orm
 import tagopsdb
 import tds.deploy_strategy
 import tds.exceptions
@@ -65,12 +68,20 @@ class Installer(TDSProgramBase):
             env=self.config.get('env', {'environment': 'dev'})['environment']
         )
 
+        rollout_config = self.config.get('rollout', {})
+        self.batch_size = rollout_config.get('batch_size', 1)
+        self.max_failures = rollout_config.get('max_failures', None)
+        self.waves = rollout_config.get('waves', None)
+        self.tier_rollouts = rollout_config.get('tiers', {})
+
     def create_deploy_strategy(self, deploy_strat_name):
         """
         Create a deploy strategy and set it to self.deploy_strategy.
         """
         if deploy_strat_name == 'salt':
             cls = tds.deploy_strategy.TDSSaltDeployStrategy
+        elif deploy_strat_name == 'simulated':
+            cls = tds.deploy_strategy.SimulatedDeployStrategy
         else:
             raise tds.exceptions.ConfigurationError(
                 'Invalid deploy strategy: %r', deploy_strat_name
@@ -101,115 +112,362 @@ class Installer(TDSProgramBase):
         """
         tagopsdb.Session.commit()
 
-    def find_deployment(self):
+    @staticmethod
+    def get_deployment_targets(deployment):
+        """
+        Return the set of targets the given deployment touches, as
+        ('tier', tier ID, environment ID) and ('host', host ID,
+        environment ID) tuples.
+        """
+        return frozenset(
+            [('tier', x.app_id, x.environment_id)
+             for x in deployment.app_deployments] +
+            [('host', x.host_id, x.host.environment_id)
+             for x in deployment.host_deployments]
+        )
+
+    def queued_deployments_query(self):
+        """
+        Return a query for deployments with status == 'queued' whose tier
+        and host deployments are all in this environment, in 'declared'
+        order. The tier and host deployments (and their hosts) are loaded
+        up front, so the query count doesn't grow with the queue.
+        """
+        deployment = tagopsdb.model.Deployment
+        app_deployment = tagopsdb.model.AppDeployment
+        host_deployment = tagopsdb.model.HostDeployment
+
+        other_env_tier_deps = tagopsdb.Session.query(app_deployment.id).filter(
+            app_deployment.deployment_id == deployment.id,
+            app_deployment.environment_id != self.environment.id,
+        ).exists()
+        other_env_host_deps = tagopsdb.Session.query(host_deployment.id).join(
+            host_deployment.host
+        ).filter(
+            host_deployment.deployment_id == deployment.id,
+            tagopsdb.model.Host.environment_id != self.environment.id,
+        ).exists()
+
+        return tagopsdb.Session.query(deployment).filter(
+            deployment.status == 'queued',
+            ~other_env_tier_deps,
+            ~other_env_host_deps,
+        ).options(
+            sqlalchemy.orm.subqueryload(deployment.app_deployments),
+            sqlalchemy.orm.subqueryload(deployment.host_deployments)
+            .joinedload(host_deployment.host),
+        ).order_by(deployment.declared, deployment.id)
+
+    def find_deployments(self, ongoing=None, max_deployments=None,
+                         max_per_environment=None):
         """
-        Find host and tier deployments with status == 'queued'.
-        Returns the tuple that was appended to ongoing_deployments, False
-        otherwise.
+        Find deployments with status == 'queued' in this environment that
+        can be started now, in 'declared' order.
+
+        ongoing is a dict of deployment ID -> targets (as returned by
+        get_deployment_targets) for deployments that are already running.
+        A queued deployment is skipped if it shares a target with an
+        ongoing deployment or with an earlier queued deployment, so that
+        deployments to the same targets still run in order. No more than
+        max_deployments deployments will be running in total, and no more
+        than max_per_environment in any one environment.
+
+        Returns a list of (deployment, targets) tuples.
         """
-        deps = tds.model.Deployment.find(status='queued', order_by='declared')
+        if ongoing is None:
+            ongoing = dict()
+
+        if max_deployments is not None and len(ongoing) >= max_deployments:
+            return []
+
+        env_counts = collections.Counter()
+        busy_targets = set()
+        for targets in ongoing.values():
+            env_counts.update(set(target[2] for target in targets))
+            busy_targets |= targets
+
+        found = list()
 
-        while deps:
-            deployment = deps[0]
-            if any(
-                x.environment_id != self.environment.id for x in
-                deployment.app_deployments
-            ) or any(
-                x.host.environment_id != self.environment.id for x in
-                deployment.host_deployments
+        for delegate in self.queued_deployments_query():
+            if max_deployments is not None and \
+                    len(ongoing) + len(found) >= max_deployments:
+                break
+
+            deployment = tds.model.Deployment(delegate=delegate)
+            targets = self.get_deployment_targets(deployment)
+            env_ids = set(target[2] for target in targets)
+
+            conflict = bool(targets & busy_targets)
+            # Later deployments to these targets must wait for this one
+            busy_targets |= targets
+            if conflict:
+                continue
+
+            if max_per_environment is not None and any(
+                env_counts[env_id] >= max_per_environment
+                for env_id in env_ids
             ):
-                deps.pop(0)
                 continue
-            return deployment
 
-        return None
+            env_counts.update(env_ids)
+            found.append((deployment, targets))
 
-    def _do_host_deployment(self, host_deployment, first_dep=True):
+        return found
+
+    def find_deployment(self):
         """
-        Perform host deployment for given host and update database
-        with results.
+        Find the first deployment with status == 'queued' in this
+        environment. Returns the deployment, None otherwise.
         """
-        now = datetime.now()
-        # If host already has a valid deployment, nothing to do
-        if host_deployment.status == 'ok':
-            return 'ok'
+        delegate = self.queued_deployments_query().first()
+        if delegate is None:
+            return None
 
-        if not first_dep:
-            time.sleep(host_deployment.deployment.delay)
-
-        self._refresh(host_deployment.deployment)
-        if host_deployment.deployment.status == 'canceled':
-            return 'canceled'
-
-        host_deployment.status = 'inprogress'
-        tagopsdb.Session.commit()
+        return tds.model.Deployment(delegate=delegate)
 
-        log.info(
-            "Starting deployment of %s version %s to host %s..." % (
-                host_deployment.package.name,
-                host_deployment.package.version,
-                host_deployment.host.name,
+    @staticmethod
+    def _resolve_host_count(value, total):
+        """
+        Translate a rollout setting into a number of hosts. The setting may
+        be an integer or a percentage string (e.g. '25%') of total.
+        """
+        try:
+            if isinstance(value, basestring) and value.endswith('%'):
+                return int(math.ceil(total * float(value[:-1]) / 100))
+            return int(value)
+        except ValueError:
+            raise tds.exceptions.ConfigurationError(
+                'Invalid rollout setting: %r', value
             )
-        )
 
-        success, host_result = self.deploy_strategy.deploy_to_host(
-            host_deployment.host.name,
-            host_deployment.package.name,
-            host_deployment.package.version,
-            retry=self.retry
+    def _get_rollout_plan(self, tier_name):
+        """
+        Return the rollout settings for the given tier: the global ones,
+        overridden by the tier's own entry under rollout.tiers if any.
+        """
+        plan = dict(
+            batch_size=self.batch_size,
+            max_failures=self.max_failures,
+            waves=self.waves,
         )
+        plan.update(self.tier_rollouts.get(tier_name, {}))
+        return plan
 
-        if success:
-            host_deployment.status = 'ok'
+    def _plan_waves(self, plan, host_deployments):
+        """
+        Split host deployments into the waves to deploy one after the other.
+        With plan['waves'] (e.g. [1, '10%', '50%']) each entry is the size of
+        a wave and the hosts left after the last one form a final wave;
+        otherwise every wave is a batch of plan['batch_size'] hosts.
+        """
+        total = len(host_deployments)
+        if plan['waves']:
+            sizes = [
+                max(1, self._resolve_host_count(value, total))
+                for value in plan['waves']
+            ]
         else:
-            host_deployment.status = 'failed'
-        self._set_duration(host_deployment, now)
+            sizes = []
+        batch_size = max(
+            1, self._resolve_host_count(plan['batch_size'], total)
+        )
 
-        host_deployment.deploy_result = host_result
-        tagopsdb.Session.commit()
+        waves = []
+        idx = 0
+        while idx < total:
+            if sizes:
+                size = sizes.pop(0)
+            elif plan['waves']:
+                size = total - idx
+            else:
+                size = batch_size
+            waves.append(host_deployments[idx:idx + size])
+            idx += size
+        return waves
+
+    def _deploy_to_hosts(self, targets):
+        """
+        Run the deploy strategy for a list of (hostname, package name,
+        version) targets, submitting one job per package version. Yield
+        (hostname, success, result, duration) for each host as soon as
+        it returns.
+        """
+        by_package = collections.OrderedDict()
+        for hostname, pkg_name, version in targets:
+            by_package.setdefault((pkg_name, version), []).append(hostname)
 
-        log.info(
-            "Finished deployment of %s version %s to host %s, status: %s" % (
+        now = datetime.now()
+        jobs = [
+            self.deploy_strategy.submit_deploy(
+                hostnames, pkg_name, version, retry=self.retry
+            )
+            for (pkg_name, version), hostnames in by_package.items()
+        ]
+
+        for job in jobs:
+            for hostname, (success, host_result) in job:
+                yield (
+                    hostname, success, host_result,
+                    (datetime.now() - now).total_seconds(),
+                )
+
+    def _do_host_deployments(self, host_deployments, first_dep=True):
+        """
+        Perform host deployments for a batch of hosts concurrently and
+        update database with each host's result as soon as that host
+        finishes. Returns the list of host states,
+        or ['canceled'] if the deployment was canceled before the batch
+        was started.
+        """
+        if not host_deployments:
+            return []
+
+        deployment = host_deployments[0].deployment
+
+        # If host already has a valid deployment, nothing to do
+        pending = [dep for dep in host_deployments if dep.status != 'ok']
+        if not pending:
+            return ['ok'] * len(host_deployments)
+
+        if not first_dep:
+            time.sleep(deployment.delay)
+
+        self._refresh(deployment)
+        if deployment.status == 'canceled':
+            return ['canceled']
+
+        targets = list()
+        for host_deployment in pending:
+            host_deployment.status = 'inprogress'
+            targets.append((
+                host_deployment.host.name,
                 host_deployment.package.name,
                 host_deployment.package.version,
-                host_deployment.host.name,
-                host_deployment.status,
+            ))
+            log.info(
+                "Starting deployment of %s version %s to host %s..." % (
+                    host_deployment.package.name,
+                    host_deployment.package.version,
+                    host_deployment.host.name,
+                )
             )
+        tagopsdb.Session.commit()
+
+        pending_by_host = dict(
+            (target[0], host_deployment)
+            for target, host_deployment in zip(targets, pending)
         )
+        for hostname, success, host_result, duration in \
+                self._deploy_to_hosts(targets):
+            host_deployment = pending_by_host[hostname]
+            if success:
+                host_deployment.status = 'ok'
+            else:
+                host_deployment.status = 'failed'
+            host_deployment.duration = duration
+            host_deployment.deploy_result = host_result
+            tagopsdb.Session.commit()
+
+            log.info(
+                "Finished deployment of %s version %s to host %s, "
+                "status: %s" % (
+                    host_deployment.package.name,
+                    host_deployment.package.version,
+                    host_deployment.host.name,
+                    host_deployment.status,
+                )
+            )
 
-        return host_deployment.status
+        return [dep.status for dep in host_deployments]
+
+    def _do_host_deployment(self, host_deployment, first_dep=True):
+        """
+        Perform host deployment for given host and update database
+        with results.
+        """
+        return self._do_host_deployments([host_deployment], first_dep)[0]
 
     def _do_tier_deployment(self, tier_deployment, first_dep=True):
         """
         Perform tier deployment for given tier (only doing hosts that
         require the deployment) and update database with results.
+
+        Hosts are deployed in waves (see _plan_waves), the hosts of a wave
+        in parallel, with the deployment's delay between waves. The rollout
+        stops early if more than max_failures hosts fail or, when the plan
+        has explicit waves, if any host of the first (canary) wave fails.
         """
         now = datetime.now()
         dep_hosts = sorted(
             tier_deployment.application.hosts,
             key=lambda host: host.name,
         )
-        tier_state = []
-
-        done_host_dep_ids = set()
-        canceled = False
-        tier_deployment.status = 'inprogress'
-        tagopsdb.Session.commit()
+        host_deployments = list()
         for dep_host in dep_hosts:
             host_deployment = tds.model.HostDeployment.get(
                 host_id=dep_host.id,
                 deployment_id=tier_deployment.deployment_id,
             )
-            if host_deployment is None:
-                continue
-            host_state = self._do_host_deployment(host_deployment, first_dep)
-            done_host_dep_ids.add(host_deployment.id)
-            tier_state.append(host_state)
-            if host_state == 'canceled':
+            if host_deployment is not None:
+                host_deployments.append(host_deployment)
+
+        plan = self._get_rollout_plan(tier_deployment.target.name)
+        waves = self._plan_waves(plan, host_deployments)
+        max_failures = None
+        if plan['max_failures'] is not None:
+            max_failures = self._resolve_host_count(
+                plan['max_failures'], len(host_deployments)
+            )
+
+        tier_state = []
+        done_host_dep_ids = set()
+        canceled = False
+        tier_deployment.status = 'inprogress'
+        tagopsdb.Session.commit()
+        for wave_num, wave in enumerate(waves):
+            if plan['waves']:
+                log.info(
+                    "Deploying %s to tier %s, wave %d of %d (%d host(s))" % (
+                        tier_deployment.package.name,
+                        tier_deployment.target.name,
+                        wave_num + 1,
+                        len(waves),
+                        len(wave),
+                    )
+                )
+            wave_state = self._do_host_deployments(wave, first_dep)
+            if 'canceled' in wave_state:
                 canceled = True
+                tier_state.append('canceled')
                 break
+            done_host_dep_ids.update(dep.id for dep in wave)
+            tier_state.extend(wave_state)
             first_dep = False
 
+            if max_failures is not None and \
+                    tier_state.count('failed') > max_failures:
+                stop_reason = '%d host(s) failed, threshold is %d' % (
+                    tier_state.count('failed'), max_failures,
+                )
+            elif plan['waves'] and wave_num == 0 and len(waves) > 1 and \
+                    'failed' in wave_state:
+                stop_reason = 'canary wave failed'
+            else:
+                stop_reason = None
+
+            if stop_reason is not None:
+                log.warning(
+                    "Stopping deployment of %s to tier %s: %s" % (
+                        tier_deployment.package.name,
+                        tier_deployment.target.name,
+                        stop_reason,
+                    )
+                )
+                # Remaining hosts belong to this tier; don't let them be
+                # picked up as standalone host deployments.
+                done_host_dep_ids.update(dep.id for dep in host_deployments)
+                break
+
         if (canceled and not first_dep) or any(
             x in tier_state for x in ('failed', 'canceled')
         ):
@@ -302,6 +560,35 @@ class Installer(TDSProgramBase):
         if deployment is not None:
             self.do_serial_deployment(deployment)
 
+    def serve(self, infile, outfile):
+        """
+        Run as a long-lived worker for TDSInstallerDaemon: read deployment
+        IDs from infile, one per line, and write each ID back to outfile
+        once its deployment is done. Return at end of input.
+        """
+        for line in iter(infile.readline, ''):
+            try:
+                dep_id = int(line)
+            except ValueError:
+                log.error('Worker received invalid deployment ID: %r', line)
+                continue
+
+            tagopsdb.Session.close()
+            deployment = self.get_deployment(dep_id)
+            if deployment is None:
+                log.error('Worker could not find deployment ID %d', dep_id)
+            else:
+                try:
+                    self.do_serial_deployment(deployment)
+                except Exception:
+                    # The daemon fixes up the status of the deployment, as
+                    # it does for a crashed installer process.
+                    log.exception('Deployment ID %d failed', dep_id)
+                    tagopsdb.Session.rollback()
+
+            outfile.write('%d\n' % dep_id)
+            outfile.flush()
+
 
 if __name__ == '__main__':
     def parse_command_line(cl_args):
@@ -310,18 +597,23 @@ if __name__ == '__main__':
         """
         # TODO implement parser thing?
         # Be sure to pass '--config-dir' for testing
+        cl_args = list(cl_args)
+        parsed = {}
+        if '--worker' in cl_args:
+            cl_args.remove('--worker')
+            parsed['worker'] = True
+        if not cl_args:
+            return parsed
         try:
             int(cl_args[-1])
         except ValueError:
-            return {
-                'config_dir': cl_args[-1],
-            }
+            parsed['config_dir'] = cl_args[-1]
         else:
-            return {
-                'deployment_id': cl_args[-1],
-            }
+            parsed['deployment_id'] = cl_args[-1]
+        return parsed
     parsed_args = parse_command_line(sys.argv[1:])
     parsed_args['user_level'] = 'admin'
+    worker = parsed_args.pop('worker', False)
 
     if 'config_dir' in parsed_args:
         logfile = os.path.join(parsed_args['config_dir'], 'tds_installer.log')
@@ -339,4 +631,10 @@ if __name__ == '__main__':
     log.addHandler(handler)
 
     prog = Installer(parsed_args)
-    prog.run()
+    if worker:
+        # Keep stdout for talking to the daemon; see Installer.serve.
+        daemon_pipe = sys.stdout
+        sys.stdout = sys.stderr
+        prog.serve(sys.stdin, daemon_pipe)
+    else:
+        prog.run()
@@ -20,19 +20,17 @@ import errno
 import logging
 import os
 import os.path
+import Queue
 import smtplib
 import sys
+import threading
 import time
-import hashlib
 
 from email.mime.text import MIMEText
 
 import requests
+import requests.adapters
 import requests.exceptions
-import lxml.html
-import jenkinsapi.jenkins
-
-from jenkinsapi.custom_exceptions import JenkinsAPIException, NotFound
 
 import tagopsdb
 import tagopsdb.exceptions
@@ -51,6 +49,63 @@ from . import TDSProgramBase
 log = logging.getLogger('tds.apps.repo_updater')
 
 
+class IngestItem(object):
+    """
+    A package going through the ingestion pipeline of the repo updater.
+    Records when it finished each stage and how many packages were queued
+    ahead of it at each stage.
+    """
+
+    def __init__(self, package, rpm_name, rpm_path):
+        # Only for the main thread; the stage threads use the plain values.
+        self.package = package
+        self.pkg_id = package.id
+        self.job = package.job
+        self.version = package.version
+        self.rpm_name = rpm_name
+        self.rpm_path = rpm_path
+        self.rpm = None
+        self.error = None
+        self.start = time.time()
+        self.times = list()
+        self.queue_depths = list()
+
+    def enqueue(self, stage, queue):
+        """Put this in the input queue of the given stage."""
+        self.queue_depths.append((stage, queue.qsize()))
+        queue.put(self)
+
+    def mark(self, stage):
+        """Record that this finished the given stage."""
+        self.times.append((stage, time.time()))
+
+    def fail(self, exc):
+        """Record the error that stopped this in a stage thread."""
+        if not isinstance(exc, exceptions.TDSException):
+            log.exception('Unexpected error ingesting %s', self.rpm_name)
+        self.error = exc
+
+    @property
+    def time_to_available(self):
+        """Seconds from entering the pipeline to the last stage finished."""
+        if not self.times:
+            return 0.0
+        return self.times[-1][1] - self.start
+
+    def describe(self):
+        """Return the per-stage durations and queue depths as text."""
+        parts = list()
+        previous = self.start
+        for stage, finished in self.times:
+            parts.append('%s %.1fs' % (stage, finished - previous))
+            previous = finished
+        parts.extend(
+            '%s queue %d' % (stage, depth)
+            for stage, depth in self.queue_depths
+        )
+        return ', '.join(parts)
+
+
 class RepoUpdater(TDSProgramBase):
     """
     TDS app that updates the yum repository based on files
@@ -58,6 +113,7 @@ class RepoUpdater(TDSProgramBase):
     """
 
     valid_rpms = None
+    last_prune = 0
 
     def initialize(self):
         """Init the required config and resources for the app"""
@@ -88,6 +144,103 @@ class RepoUpdater(TDSProgramBase):
         self.max_attempts = self.config.get('jenkins').get(
             'max_download_attempts', 3
         )
+        self.max_parallel_downloads = self.config.get('jenkins').get(
+            'max_parallel_downloads', 4
+        )
+        self.http = self.create_http_session(self.max_parallel_downloads)
+        self.configure_metrics()
+        self.pipeline_queue_size = self.config.get('repo').get(
+            'pipeline_queue_size', self.max_parallel_downloads
+        )
+        self.jenkins = utils.jenkins.get_client(
+            self.jenkins_url,
+            self.config.get('jenkins').get(
+                'metadata_ttl', utils.jenkins.DEFAULT_TTL
+            ),
+        )
+        self.artifact_cache = utils.artifact_cache.ArtifactCache(
+            self.config.get('repo').get(
+                'artifact_cache', os.path.join(self.incoming_dir, '.artifacts')
+            ),
+            self.http,
+            self.metrics,
+            self.config.get('jenkins').get('download_timeout', 60),
+        )
+        self.artifact_cache_max_age = 86400 * self.config.get('repo').get(
+            'artifact_cache_days', 7
+        )
+
+        self.index_mode = self.config.get('repo').get('index_mode', 'make')
+        if self.index_mode not in ('make', 'incremental'):
+            raise exceptions.ConfigurationError(
+                'Invalid repo.index_mode: {mode}'.format(mode=self.index_mode)
+            )
+        self.index_command = self.config.get('repo').get(
+            'index_command', ['createrepo', '--update', '--quiet']
+        )
+        if isinstance(self.index_command, basestring):
+            self.index_command = self.index_command.split()
+        self.index_debounce = self.config.get('repo').get('index_debounce', 0)
+        self.index_max_delay = self.config.get('repo').get(
+            'index_max_delay', 60
+        )
+        self.unindexed = list()
+        self.first_unindexed = None
+        self.last_unindexed = None
+
+    def configure_metrics(self):
+        """
+        Set up the metrics of the ingestion pipeline. Every
+        repo.metrics.interval seconds they are written to the
+        repo.metrics.file JSON file and, if repo.metrics.graphite is set,
+        sent to the graphite server of the graphite notifier.
+        """
+        metrics_config = self.config.get('repo').get('metrics', {})
+        self.metrics = utils.metrics.Metrics()
+        self.metrics_file = metrics_config.get('file', None)
+        self.metrics_interval = metrics_config.get('interval', 60)
+        self.metrics_graphite = None
+        if metrics_config.get('graphite', False):
+            try:
+                self.metrics_graphite = self.config.get('notifications')\
+                                                   .get('graphite')
+            except KeyError:
+                raise exceptions.ConfigurationError(
+                    'repo.metrics.graphite is set but notifications.graphite '
+                    'is missing from config file.'
+                )
+        self.last_metrics_flush = time.time()
+
+    def flush_metrics(self, force=False):
+        """
+        Write and forward the metrics if repo.metrics.interval seconds have
+        passed since they last were, or if force is set.
+        """
+        if not force and \
+                time.time() - self.last_metrics_flush < self.metrics_interval:
+            return
+        self.last_metrics_flush = time.time()
+
+        if self.metrics_file is not None:
+            try:
+                self.metrics.write(self.metrics_file)
+            except (IOError, OSError) as exc:
+                log.error('Unable to write metrics to %s: %s',
+                          self.metrics_file, exc)
+        if self.metrics_graphite is not None:
+            self.metrics.send_graphite(self.metrics_graphite, 'repo_updater.')
+
+    @staticmethod
+    def create_http_session(max_connections):
+        """
+        Create a requests session keeping up to max_connections connections
+        alive per host, to be shared by the download threads.
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_connections)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
     def validate_repo_config(self):
         """
@@ -127,27 +280,32 @@ class RepoUpdater(TDSProgramBase):
         except smtplib.SMTPException as exc:
             log.error('Email send failed: %s', exc)
 
-    def _download_rpms(self):
+    def ingest(self):
         """
         Determine the RPMs that need to be downloaded by reading the database
-        and download those RPMs into the self.incoming_dir directory.
+        and move each of them through the ingestion pipeline:
+
+          fetch -> verify -> stage -> publish -> index
+
+        Up to self.max_parallel_downloads threads fetch RPMs into the
+        self.incoming_dir directory and a thread verifies them, connected by
+        queues of at most self.pipeline_queue_size packages. Only this
+        thread touches the database: it stages and publishes each package as
+        soon as it is verified, and updates the repository index whenever
+        that is due, so one slow download doesn't hold up other packages.
+        Return the number of pending packages found, not counting those left
+        pending because Jenkins couldn't be reached.
         """
-        rpms = list()
-
         # Close the session to ensure the DB is read again
         tagopsdb.Session.close()
         self.pending_pkgs = tagopsdb.Package.find(status='pending')
         if not self.pending_pkgs:
-            return
-        try:
-            jenkins = jenkinsapi.jenkins.Jenkins(self.jenkins_url)
-        except Exception:
-            log.error(
-                'Unable to contact Jenkins server at {url}.'.format(
-                    url=self.jenkins_url,
-                )
-            )
-            return rpms
+            return 0
+
+        start = time.time()
+        fetch_queue = Queue.Queue()
+        verify_queue = Queue.Queue(self.pipeline_queue_size)
+        stage_queue = Queue.Queue(self.pipeline_queue_size)
 
         for pkg in self.pending_pkgs:
             rpm_name = '{name}-{version}-{revision}.{arch}.rpm'.format(
@@ -156,89 +314,197 @@ class RepoUpdater(TDSProgramBase):
                 revision=pkg.revision,
                 arch=pkg.application.arch,
             )
-            rpm_path = os.path.join(self.incoming_dir, rpm_name)
+            item = IngestItem(
+                pkg, rpm_name, os.path.join(self.incoming_dir, rpm_name)
+            )
+            item.enqueue('fetch', fetch_queue)
+            pkg.status = 'processing'
+        tagopsdb.Session.commit()
+
+        num_items = len(self.pending_pkgs)
+        threads = [
+            threading.Thread(
+                target=self._fetch_worker,
+                args=(fetch_queue, verify_queue),
+            )
+            for _idx in range(min(num_items, self.max_parallel_downloads))
+        ]
+        threads.append(threading.Thread(
+            target=self._verify_worker,
+            args=(num_items, verify_queue, stage_queue),
+        ))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        unreachable = 0
+        for _idx in range(num_items):
+            # Packages already waiting are taken first; the index is only
+            # updated while none arrive.
+            while True:
+                delay = self.index_delay(ingesting=True)
+                try:
+                    item = stage_queue.get(
+                        timeout=1.0 if delay is None else
+                        max(min(delay, 1.0), 0)
+                    )
+                except Queue.Empty:
+                    if self.index_due(ingesting=True):
+                        self.index_repo()
+                else:
+                    break
+
+            if isinstance(item.error, exceptions.FailedConnectionError):
+                unreachable += 1
+            self._stage_and_publish(item)
+            if self.index_overdue():
+                self.index_repo()
+
+        for thread in threads:
+            thread.join()
+        log.info('Ingestion pass over %d packages took %.1f seconds',
+                 num_items, time.time() - start)
+        return num_items - unreachable
+
+    def _fetch_worker(self, fetch_queue, verify_queue):
+        """
+        Fetch stage thread: download RPMs until fetch_queue is empty.
+        This must not use the database.
+        """
+        while True:
             try:
-                rpm = self._download_rpm_for_pkg(
-                    pkg, jenkins, rpm_name, rpm_path
+                item = fetch_queue.get_nowait()
+            except Queue.Empty:
+                return
+
+            try:
+                self._download_rpm_for_pkg(
+                    item.job, item.version, item.rpm_name, item.rpm_path
                 )
-            except exceptions.TDSException as exc:
-                if os.path.isfile(rpm_path):
-                    self.remove_file(rpm_path)
-                log.error('Failed to download RPM for package with id={id}: '
-                          '{exc}'.format(id=pkg.id, exc=exc))
-                pkg.status = 'failed'
-                tagopsdb.Session.commit()
-            else:
-                rpms.append(rpm)
+            except Exception as exc:
+                item.fail(exc)
+            item.mark('fetch')
+            item.enqueue('verify', verify_queue)
 
-        return rpms
+    def _verify_worker(self, num_items, verify_queue, stage_queue):
+        """
+        Verify stage thread: read the headers of num_items fetched RPMs.
+        This must not use the database.
+        """
+        for _idx in range(num_items):
+            item = verify_queue.get()
+            if item.error is None:
+                try:
+                    item.rpm = self._describe_rpm(item.rpm_name, item.rpm_path)
+                except Exception as exc:
+                    item.fail(exc)
+            item.mark('verify')
+            item.enqueue('stage', stage_queue)
 
-    def _download_rpm_for_pkg(self, pkg, jenkins, rpm_name, rpm_path):
+    def _stage_and_publish(self, item):
         """
-        Download the RPM for the given package. Raise an error on failure.
+        Stage and publish a verified package, or mark it as failed if an
+        earlier stage failed. If Jenkins couldn't be reached, the package is
+        left pending.
         """
-        pkg.status = 'processing'
-        tagopsdb.Session.commit()
+        if isinstance(item.error, exceptions.FailedConnectionError):
+            # Leave it for a later pass, when Jenkins is back.
+            log.error('%s', item.error)
+            self.metrics.increment('jenkins.unreachable')
+            item.package.status = 'pending'
+            tagopsdb.Session.commit()
+            return
+        if item.error is not None:
+            if os.path.isfile(item.rpm_path):
+                self.remove_file(item.rpm_path)
+            log.error('Failed to download RPM for package with id={id}: '
+                      '{exc}'.format(id=item.pkg_id, exc=item.error))
+            self.metrics.increment('packages.failed')
+            item.package.status = 'failed'
+            tagopsdb.Session.commit()
+            return
+
+        package = self.stage_rpm(item.rpm)
+        item.mark('stage')
+        if package is None or not self.publish_rpm(item.rpm, package):
+            return
+        item.mark('publish')
+
+        if not self.unindexed:
+            self.first_unindexed = time.time()
+        self.last_unindexed = time.time()
+        self.unindexed.append(item)
+
+    def _download_rpm_for_pkg(self, job_name, version, rpm_name, rpm_path):
+        """
+        Download the RPM for the package built by the given Jenkins job and
+        build number to rpm_path. Raise an error on failure.
+        This runs in a download thread, so it must not use the database.
 
-        job_name = pkg.job
-        matrix_name = None
-        if '/' in job_name:
-            job_name, matrix_name = job_name.split('/', 1)
-        job = jenkins[job_name]
+        The RPM goes through self.artifact_cache: if an RPM with the same
+        Jenkins fingerprint was downloaded before it is only linked, and an
+        interrupted transfer is resumed by the next attempt.
+        """
         try:
-            build = job.get_build(int(pkg.version))
-        except KeyError:
+            build = self.jenkins.get_build(job_name, version)
+        except (requests.exceptions.RequestException, ValueError):
+            raise exceptions.FailedConnectionError(
+                'Unable to contact Jenkins server at {url}.'.format(
+                    url=self.jenkins_url,
+                )
+            )
+        if build is None or rpm_name not in build.artifacts:
             raise exceptions.JenkinsJobNotFoundError(
-                'Artifact', job_name, pkg.version, self.jenkins_url,
+                'Artifact', job_name, version, self.jenkins_url,
             )
-        if matrix_name is not None:
-            build = [run for run in build.get_matrix_runs() if matrix_name
-                     in run.baseurl][0]
 
-        fingerprint_md5 = self._get_jenkins_fingerprint_md5(
-            job_name, rpm_name, pkg.version,
-        )
-        for _attempt in range(self.max_attempts):
-            try:
-                artifact = build.get_artifact_dict()[rpm_name]
-                rpm_url = artifact.url
-            except (KeyError, JenkinsAPIException, NotFound):
-                raise exceptions.JenkinsJobNotFoundError(
-                    'Artifact', job_name, pkg.version, self.jenkins_url,
-                )
+        fingerprint_md5 = build.fingerprints.get(rpm_name)
+        cached_path = None
+        if fingerprint_md5 is not None:
+            cached_path = self.artifact_cache.get(fingerprint_md5)
+        if cached_path is not None:
+            log.info('Using cached artifact for %s', rpm_name)
+            self.metrics.increment('download.cache_hits')
+            self.artifact_cache.link(cached_path, rpm_path)
+            return
 
-            if self.jenkins_direct_url is not None:
-                rpm_url = rpm_url.replace(
-                    self.jenkins_url, self.jenkins_direct_url,
-                )
+        rpm_url = build.artifacts[rpm_name]
+        if self.jenkins_direct_url is not None:
+            rpm_url = rpm_url.replace(
+                self.jenkins_url, self.jenkins_direct_url,
+            )
 
-            req = requests.get(rpm_url)
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.metrics.increment('download.retries')
+            try:
+                cached_path = self.artifact_cache.fetch(
+                    rpm_url, fingerprint_md5
+                )
+            except exceptions.ChecksumMismatchError as exc:
+                log.warning('Download of %s failed: %s', rpm_name, exc)
+                self.metrics.increment('download.checksum_mismatches')
+                continue
+            except requests.exceptions.RequestException as exc:
+                log.warning('Download of %s interrupted: %s', rpm_name, exc)
+                continue
 
-            if req.status_code != requests.codes.ok:
+            if cached_path is None:
                 raise exceptions.JenkinsJobNotFoundError(
-                    'Artifact', job_name, pkg.version, self.jenkins_url,
+                    'Artifact', job_name, version, self.jenkins_url,
                 )
-            data = req.content
-            with open(rpm_path, 'wb') as rpm_file:
-                rpm_file.write(data)
-                rpm_file.flush()
-                os.fsync(rpm_file.fileno())
-
-            md5 = hashlib.md5()
-            with open(rpm_path) as rpm_file:
-                md5.update(rpm_file.read())
-                file_md5 = md5.hexdigest()
-
-            if fingerprint_md5 is None or fingerprint_md5.lower() == \
-                    file_md5.lower():
-                break
-            else:
-                self.remove_file(rpm_path)
+            self.artifact_cache.link(cached_path, rpm_path)
+            break
         else:
             raise exceptions.JenkinsJobTransferError(
-                'Artifact', job_name, pkg.verion, self.jenkins_url,
+                'Artifact', job_name, version, self.jenkins_url,
             )
 
+    def _describe_rpm(self, rpm_name, rpm_path):
+        """
+        Return the RPMDescriptor for a downloaded RPM; notify and raise an
+        error if it is invalid.
+        """
         rpm = utils.rpm.RPMDescriptor.from_path(rpm_path)
         if rpm is None:
             self.notify_bad_rpm(rpm_name)
@@ -250,78 +516,40 @@ class RepoUpdater(TDSProgramBase):
         else:
             return rpm
 
-    def _get_jenkins_fingerprint_md5(self, job_name, rpm_name, version):
+    def stage_rpm(self, rpm):
         """
-        Acquire the Jenkins fingerprint MD5 for the given package.
-        This may return 'None' if fingerprinting has not been enabled
-        for the given job (specifically for the RPM artifacts).
+        Move a verified RPM from the incoming directory to the processing
+        directory. Return its package, or None on failure.
         """
+        package = model.Package.get(**rpm.info)
 
-        # Grab the 'fingerprints' page for the job
-        req = requests.get(os.path.join(
-            self.jenkins_url, 'job', job_name,
-            version, 'fingerprints', ''
-        ))
-
-        # The XPath is to extract an href from a row in a table
-        # where the artifact matches the RPM file
-        html = lxml.html.fromstring(req.content)
-        xpath = (
-            '//td[re:test(.,"(?<!\w)%s")]/../td[contains(.,"details")]/a/@href'
-            % rpm_name.replace('.', '\.')
-        )
-        fingerprint_href = html.xpath(
-            xpath,
-            namespaces = {'re': 'http://exslt.org/regular-expressions'}
-        )
-
-        # Found an href?  Get the md5 in it (last part of the path)!
-        # Otherwise let user know it's not there
-        if fingerprint_href:
-            return fingerprint_href[0].split('/')[-2]
-        else:
+        if package is None:
+            log.error(
+                'Missing entry for package "%s", '
+                'version %s, revision %s in database',
+                rpm.name, rpm.version, rpm.release
+            )
+            self.remove_file(rpm.path)
             return None
 
-    def prepare_rpms(self):
-        """Move RPMs in incoming directory to the processing directory."""
-        rpms = self._download_rpms()
-
-        if not rpms:
-            return
-
-        log.info('Valid files found, moving them from incoming directory '
-                 'to processing directory to be processed...')
-
-        good = list()
-        for rpm in rpms:
-            package = model.Package.get(**rpm.info)
-
-            if package is None:
-                log.error(
-                    'Missing entry for package "%s", '
-                    'version %s, revision %s in database',
-                    rpm.name, rpm.version, rpm.release
-                )
-                self.remove_file(rpm.path)
-                continue
-
-            try:
-                os.rename(
-                    rpm.path,
-                    os.path.join(self.processing_dir, rpm.filename)
-                )
-            except OSError as exc:
-                log.error('Unable to move file "%s" to "%s": %s',
-                          rpm.path, self.processing_dir, exc)
-                package.status = 'failed'
-                self.remove_file(rpm.path)
-            else:
-                rpm.path = os.path.join(self.processing_dir, rpm.filename)
-                good.append(rpm)
-            finally:
-                tagopsdb.Session.commit()
+        try:
+            os.rename(
+                rpm.path,
+                os.path.join(self.processing_dir, rpm.filename)
+            )
+        except OSError as exc:
+            log.error('Unable to move file "%s" to "%s": %s',
+                      rpm.path, self.processing_dir, exc)
+            self.metrics.increment('packages.failed')
+            package.status = 'failed'
+            self.remove_file(rpm.path)
+            package = None
+        else:
+            rpm.path = os.path.join(self.processing_dir, rpm.filename)
+        finally:
+            tagopsdb.Session.commit()
 
-        return good
+        return package
 
     def email_for_invalid_rpm(self, rpm_file):
         """Send an email to engineering if a bad RPM is found."""
@@ -342,19 +570,87 @@ class RepoUpdater(TDSProgramBase):
         smtp.sendmail(sender, receiver_emails, msg.as_string())
         smtp.quit()
 
-    def process_rpms(self, rpms):
-        """Copy RPMs in processing directory to the repository and run
-           update the repo.
+    def publish_rpm(self, rpm, package):
         """
-        ready_for_repo = []
+        Link an RPM in the processing directory into the repository, where
+        it waits for the next repo index update. Return whether that worked.
+        """
+        log.info('Moving file %s to repository', rpm.path)
 
-        if not rpms:
-            return
+        # TODO: ensure package is valid (security purposes)
 
-        for rpm in rpms:
-            log.info('Verifying file %s and if valid moving to repository',
-                     rpm.path)
+        dest_file = os.path.join(self.repo_dir, rpm.arch, rpm.filename)
 
+        try:
+            self.remove_file(dest_file)
+            os.link(rpm.path, dest_file)
+        except IOError:
+            time.sleep(2)   # Short delay before re-attempting
+
+            try:
+                self.remove_file(dest_file)
+                os.link(rpm.path, dest_file)
+            except IOError:
+                self.metrics.increment('packages.failed')
+                package.status = 'failed'
+                self.remove_file(rpm.path)
+                return False
+            finally:
+                tagopsdb.Session.commit()
+
+        return True
+
+    def index_delay(self, now=None, ingesting=False):
+        """
+        Return the seconds until the RPMs added to the repository since its
+        last index update should be indexed, or None if there are none.
+        Arrivals are coalesced until none have come for repo.index_debounce
+        seconds, but the oldest one waits no longer than
+        repo.index_max_delay seconds. Without a debounce, the RPMs of an
+        ingestion pass are coalesced until the pass is over (ingesting is
+        False).
+        """
+        if not self.unindexed:
+            return None
+        if now is None:
+            now = time.time()
+
+        due = self.first_unindexed + self.index_max_delay
+        if self.index_debounce or not ingesting:
+            due = min(due, self.last_unindexed + self.index_debounce)
+        return due - now
+
+    def index_due(self, now=None, ingesting=False):
+        """Return whether the repository index should be updated now."""
+        delay = self.index_delay(now, ingesting)
+        return delay is not None and delay <= 0
+
+    def index_overdue(self, now=None):
+        """
+        Return whether the oldest RPM not yet indexed has waited
+        repo.index_max_delay seconds, so the index must be updated even
+        though more RPMs are arriving.
+        """
+        if not self.unindexed:
+            return False
+        if now is None:
+            now = time.time()
+
+        return now - self.first_unindexed >= self.index_max_delay
+
+    def index_repo(self):
+        """
+        Update the repository index for all RPMs added since the last update
+        and mark their packages as completed (or failed).
+        """
+        items, self.unindexed = self.unindexed, list()
+        if not items:
+            return
+
+        # The packages may be from an earlier pass' database session.
+        rpms_packages = list()
+        for item in items:
+            rpm = item.rpm
             package = model.Package.get(**rpm.info)
 
             if package is None:
@@ -366,31 +662,51 @@ class RepoUpdater(TDSProgramBase):
                 self.remove_file(rpm.path)
                 continue
 
-            # TODO: ensure package is valid (security purposes)
-
-            dest_file = os.path.join(self.repo_dir, rpm.arch, rpm.filename)
-
-            try:
-                self.remove_file(dest_file)
-                os.link(rpm.path, dest_file)
-            except IOError:
-                time.sleep(2)   # Short delay before re-attempting
-
-                try:
-                    self.remove_file(dest_file)
-                    os.link(rpm.path, dest_file)
-                except IOError:
-                    package.status = 'failed'
-                    self.remove_file(rpm.path)
-                    continue
-                finally:
-                    tagopsdb.Session.commit()
-
-            ready_for_repo.append((rpm, package))
+            rpms_packages.append((rpm, package))
+
+        self.update_repo(rpms_packages)
+        log.info('Done processing.')
+
+        for item in items:
+            item.mark('index')
+            log.info('Package with id=%s available after %.1f seconds (%s)',
+                     item.pkg_id, item.time_to_available, item.describe())
+            self.metrics.observe('package.time_to_available',
+                                 item.time_to_available)
+
+        now = time.time()
+        for _rpm, package in rpms_packages:
+            self.metrics.increment('packages.' + package.status)
+            if package.status == 'completed' and package.created is not None:
+                # From being added as pending, in database (local) time
+                self.metrics.observe(
+                    'package.pending_to_completed',
+                    now - time.mktime(package.created.timetuple()),
+                )
+        self.flush_metrics()
 
-        if len(ready_for_repo) > 0:
-            self.update_repo(ready_for_repo)
-            log.info('Done processing.')
+    def _index_commands(self, rpms):
+        """
+        Return the commands that update the repository index for the given
+        RPMs: 'make' for the whole repository, or in incremental mode the
+        index command for each architecture directory they were added to.
+        """
+        if self.index_mode == 'make':
+            return [['make', '-C', self.repo_dir]]
+
+        return [
+            self.index_command + [os.path.join(self.repo_dir, arch)]
+            for arch in sorted(set(rpm.arch for rpm in rpms))
+        ]
+
+    def _run_index_commands(self, commands):
+        """Run the given index commands, stopping at the first failure."""
+        for command in commands:
+            start = time.time()
+            utils.run(command)
+            duration = time.time() - start
+            log.info('Ran "%s" in %.1f seconds', ' '.join(command), duration)
+            self.metrics.observe('index.' + self.index_mode, duration)
 
     def update_repo(self, rpms_packages):
         """
@@ -399,17 +715,21 @@ class RepoUpdater(TDSProgramBase):
         log.info('Updating repo...')
         old_umask = os.umask(0o002)
         final_status = 'completed'
+        commands = self._index_commands(
+            [rpm for rpm, _package in rpms_packages]
+        )
 
         try:
-            utils.run(['make', '-C', self.repo_dir])
+            self._run_index_commands(commands)
         except exceptions.RunProcessError as exc:
             log.error('yum database update failed, retrying: %s', exc)
             time.sleep(5)   # Short delay before re-attempting
 
             try:
-                utils.run(['make', '-C', self.repo_dir])
+                self._run_index_commands(commands)
             except exceptions.RunProcessError as exc:
                 log.error('yum database update failed, aborting: %s', exc)
+                self.metrics.increment('index.failures')
                 final_status = 'failed'
 
         log.info('Updating status of packages to: %s', final_status)
@@ -427,10 +747,20 @@ class RepoUpdater(TDSProgramBase):
 
     def run(self):
         """
-        Find files in incoming dir and add them to the yum repository
+        Find files in incoming dir and add them to the yum repository.
+        Return the number of pending packages found.
         """
-        rpms = self.prepare_rpms()
-        self.process_rpms(rpms)
+        found = self.ingest()
+
+        if self.index_due():
+            self.index_repo()
+
+        if time.time() - self.last_prune >= 3600:
+            self.last_prune = time.time()
+            self.artifact_cache.prune(self.artifact_cache_max_age)
+
+        self.flush_metrics()
+        return found
 
     @property
     def incoming_dir(self):
@@ -470,3 +800,5 @@ if __name__ == '__main__':
     prog = RepoUpdater(args)
     prog.initialize()
     prog.run()
+    prog.index_repo()
+    prog.flush_metrics(force=True)
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import tds.views.rest
+import tds.views.rest.settings
 
 from tds.apps import TDSProgramBase
 
@@ -21,4 +22,7 @@ from tds.apps import TDSProgramBase
 rest_api = TDSProgramBase({'user_level': 'admin'})
 rest_api.initialize_db()
 
+# Reload the REST settings on SIGHUP, as well as when their files change
+tds.views.rest.settings.install_reload_handler()
+
 application = tds.views.rest.config.make_wsgi_app()
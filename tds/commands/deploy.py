@@ -27,6 +27,7 @@ import tds.deploy_strategy
 import tds.exceptions
 import tds.model
 import tds.notifications
+import tds.utils.queue_signal
 
 from .base import BaseController, validate as input_validate
 
@@ -117,6 +118,8 @@ class DeployController(BaseController):
         """
         if deploy_strat_name == 'salt':
             cls = tds.deploy_strategy.TDSSaltDeployStrategy
+        elif deploy_strat_name == 'simulated':
+            cls = tds.deploy_strategy.SimulatedDeployStrategy
         else:
             raise tds.exceptions.ConfigurationError(
                 'Invalid deploy strategy: {strat}.'.format(
@@ -399,6 +402,14 @@ class DeployController(BaseController):
         notification = tds.notifications.Notifications(self.app_config)
         notification.notify(deployment)
 
+    def notify_queued(self):
+        """
+        Wake up the installer daemons now that a deployment is queued.
+        """
+        tds.utils.queue_signal.notify_queued(
+            self.app_config.get('zookeeper', None)
+        )
+
     @input_validate('package_hostonly')
     @input_validate('targets')
     @input_validate('application')
@@ -552,6 +563,7 @@ class DeployController(BaseController):
 
         self.deployment.status = 'queued'
         tagopsdb.Session.commit()
+        self.notify_queued()
         if params['detach']:
             log.info('Deployment ready for installer daemon, disconnecting '
                      'now.')
@@ -710,6 +722,7 @@ class DeployController(BaseController):
         # Let installer daemon access deployment now
         self.deployment.status = 'queued'
         tagopsdb.Session.commit()
+        self.notify_queued()
 
         if params['detach']:
             log.info('Deployment ready for installer daemon, disconnecting '
@@ -785,10 +798,28 @@ class DeployController(BaseController):
         restart_results = dict()
 
         delay = params.get('delay', None)
+        if delay is None:
+            # Without a delay between hosts, each package can be restarted
+            # on all of its hosts with a single call to the deploy strategy
+            pkg_hosts = OrderedDict()
+            for host, pkg in restart_targets:
+                pkg_hosts.setdefault(pkg.name, []).append(host.name)
+
+            for pkg_name, hostnames in pkg_hosts.items():
+                host_results = self.deploy_strategy.restart_hosts(
+                    hostnames, pkg_name
+                )
+                for hostname, host_result in host_results.items():
+                    restart_results[(hostname, pkg_name)] = host_result
+
         for i, (host, pkg) in enumerate(restart_targets):
-            success, restart_result = self.deploy_strategy.restart_host(
-                host.name, pkg.name
-            )
+            if (host.name, pkg.name) in restart_results:
+                success, restart_result = \
+                    restart_results[(host.name, pkg.name)]
+            else:
+                success, restart_result = self.deploy_strategy.restart_host(
+                    host.name, pkg.name
+                )
 
             log.info(
                 '{hostname}:\t\t[{status}]{printout}'.format(
@@ -955,6 +986,7 @@ class DeployController(BaseController):
                     continue
                 tagopsdb.Session.delete(host_dep)
         tagopsdb.Session.commit()
+        self.notify_queued()
         if params['detach']:
             log.info('Deployment ready for installer daemon, disconnecting '
                      'now.')
@@ -16,17 +16,9 @@
 
 import hashlib
 import logging
-import os.path
 import signal
 import time
 
-import jenkinsapi.jenkins
-try:
-    from jenkinsapi.custom_exceptions import JenkinsAPIException, NotFound
-except ImportError:
-    from jenkinsapi.exceptions import JenkinsAPIException, NotFound
-
-import lxml.html
 import requests
 import requests.exceptions
 
@@ -37,6 +29,7 @@ import tagopsdb.deploy.deploy
 import tagopsdb.deploy.package
 
 import tds.exceptions
+import tds.utils.queue_signal
 from .base import BaseController, validate
 from .. import utils
 
@@ -72,6 +65,18 @@ class PackageController(BaseController):
         """
         return self.app_config['jenkins.url']
 
+    @property
+    def jenkins(self):
+        """
+        Return the shared Jenkins client for self.jenkins_url.
+        """
+        return utils.jenkins.get_client(
+            self.jenkins_url,
+            self.app_config.get('jenkins', {}).get(
+                'metadata_ttl', utils.jenkins.DEFAULT_TTL
+            ),
+        )
+
     def _refresh(self, obj):
         """
         WTF
@@ -119,31 +124,16 @@ class PackageController(BaseController):
         This may return 'None' if fingerprinting has not been enabled
         for the given job (specifically for the RPM artifacts).
         """
-
-        # Grab the 'fingerprints' page for the job
-        req = requests.get(os.path.join(
-            self.jenkins_url, 'job', job_name,
-            version, 'fingerprints', ''
-        ))
-
-        # The XPath is to extract an href from a row in a table
-        # where the artifact matches the RPM file
-        html = lxml.html.fromstring(req.content)
-        xpath = (
-            '//td[re:test(.,"(?<!\w)%s")]/../td[contains(.,"details")]/a/@href'
-            % rpm_name.replace('.', '\.')
-        )
-        fingerprint_href = html.xpath(
-            xpath,
-            namespaces = {'re': 'http://exslt.org/regular-expressions'}
-        )
-
-        # Found an href?  Get the md5 in it (last part of the path)!
-        # Otherwise let user know it's not there
-        if fingerprint_href:
-            return fingerprint_href[0].split('/')[-2]
-        else:
-            return None
+        try:
+            return self.jenkins.get_fingerprint_md5(
+                job_name, version, rpm_name,
+            )
+        except (requests.exceptions.RequestException, ValueError):
+            raise tds.exceptions.FailedConnectionError(
+                'Unable to contact Jenkins server at {url}.'.format(
+                    url=self.jenkins_url,
+                )
+            )
 
     @validate('application')
     def add(
@@ -234,6 +224,10 @@ class PackageController(BaseController):
 
         package.status = 'pending'
         tagopsdb.Session.commit()
+        tds.utils.queue_signal.notify_queued(
+            self.app_config.get('zookeeper', None),
+            tds.utils.queue_signal.PACKAGE_QUEUE_PATH,
+        )
         if params['detach']:
             log.info('Package ready for repo updater daemon. Disconnecting '
                      'now.')
@@ -247,46 +241,39 @@ class PackageController(BaseController):
         Return the revision (e.g., git commit hash) if the build exists and is
         valid.
         """
-        try:
-            jenkins = jenkinsapi.jenkins.Jenkins(self.jenkins_url)
-        except Exception:
-            raise tds.exceptions.FailedConnectionError(
-                'Unable to contact Jenkins server at {url}.'.format(
-                    url=self.jenkins_url,
-                )
-            )
-
         matrix_name = None
         if '/' in job_name:
             job_name, matrix_name = job_name.split('/', 1)
 
         try:
-            job = jenkins[job_name]
-        except KeyError:
-            raise tds.exceptions.JenkinsJobNotFoundError(
-                "Job", job_name, version, self.jenkins_url,
-            )
+            build = self.jenkins.get_build(job_name, int(version))
+            if build is None:
+                if not self.jenkins.job_exists(job_name):
+                    raise tds.exceptions.JenkinsJobNotFoundError(
+                        "Job", job_name, version, self.jenkins_url,
+                    )
+                raise tds.exceptions.JenkinsJobNotFoundError(
+                    "Build", job_name, version, self.jenkins_url,
+                )
 
-        try:
-            build = job.get_build(int(version))
-        except (KeyError, JenkinsAPIException, NotFound):
-            raise tds.exceptions.JenkinsJobNotFoundError(
-                "Build", job_name, version, self.jenkins_url,
+            if matrix_name is not None:
+                build = self.jenkins.get_build(
+                    '/'.join((job_name, matrix_name)), int(version)
+                )
+                if build is None:
+                    raise tds.exceptions.JenkinsJobNotFoundError(
+                        "Matrix build", job_name, version, self.jenkins_url,
+                    )
+        except (requests.exceptions.RequestException, ValueError):
+            raise tds.exceptions.FailedConnectionError(
+                'Unable to contact Jenkins server at {url}.'.format(
+                    url=self.jenkins_url,
+                )
             )
 
-        if matrix_name is not None:
-            for run in build.get_matrix_runs():
-                if matrix_name in run.baseurl:
-                    build = run
-                    break
-            else:
-                raise tds.exceptions.JenkinsJobNotFoundError(
-                    "Matrix build", job_name, version, self.jenkins_url,
-                )
-        try:
-            return build.get_revision()
-        except:             # Not sure what exception will be raised --KN
-            return None
+        # The build is cached, so the fingerprint lookup that follows
+        # doesn't need another request.
+        return build.revision
 
     @validate('package')
     def delete(self, package, **params):
@@ -15,6 +15,15 @@
 'Different ways to deploy things to if(we) infrastructure'
 
 from .base import DeployStrategy
+from .job import DeployJob, ThreadedDeployJob, CompletedDeployJob
+from .simulated import SimulatedDeployStrategy
 from .tds_salt import TDSSaltDeployStrategy
 
-__all__ = ['DeployStrategy', 'TDSSaltDeployStrategy']
+__all__ = [
+    'CompletedDeployJob',
+    'DeployJob',
+    'DeployStrategy',
+    'SimulatedDeployStrategy',
+    'TDSSaltDeployStrategy',
+    'ThreadedDeployJob',
+]
@@ -16,6 +16,8 @@
 Abstract base DeployStrategy class.
 """
 
+from .job import ThreadedDeployJob
+
 
 class DeployStrategy(object):
     """Abstract base DeployStrategy class."""
@@ -27,3 +29,39 @@ class DeployStrategy(object):
     def restart_host(self, dep_host, app, retry=4):
         """Raise NotImplementedError."""
         raise NotImplementedError
+
+    def submit_deploy(self, dep_hosts, app, version, retry=4):
+        """
+        Start deploying an application to several hosts and return a
+        DeployJob to collect the per-host results from. Subclasses that
+        can target several hosts at once should override this.
+        """
+        return ThreadedDeployJob(
+            lambda host: self.deploy_to_host(host, app, version, retry),
+            dep_hosts
+        )
+
+    def submit_restart(self, dep_hosts, app, retry=4):
+        """
+        Start restarting an application on several hosts and return a
+        DeployJob to collect the per-host results from. Subclasses that
+        can target several hosts at once should override this.
+        """
+        return ThreadedDeployJob(
+            lambda host: self.restart_host(host, app, retry),
+            dep_hosts
+        )
+
+    def deploy_to_hosts(self, dep_hosts, app, version, retry=4):
+        """
+        Deploy an application to several hosts, returning a dict of
+        host -> (success, result).
+        """
+        return dict(self.submit_deploy(dep_hosts, app, version, retry))
+
+    def restart_hosts(self, dep_hosts, app, retry=4):
+        """
+        Restart an application on several hosts, returning a dict of
+        host -> (success, result).
+        """
+        return dict(self.submit_restart(dep_hosts, app, retry))
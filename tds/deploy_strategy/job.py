@@ -0,0 +1,133 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Handles for deployments submitted to several hosts at once, whose per-host
+results are collected as they arrive.
+"""
+
+import time
+
+from multiprocessing.pool import ThreadPool
+
+
+class DeployJob(object):
+    """
+    Base class for a submitted deployment job. Results are collected
+    either with poll() or by iterating over the job, which yields
+    (host, (success, result)) pairs as the hosts return.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, hosts, jid=None, timeout=None):
+        self.hosts = list(hosts)
+        self.jid = jid
+        self.timeout = timeout
+        self.start_time = time.time()
+        self.results = dict()
+
+    @property
+    def done(self):
+        """Return True once every host has a result."""
+        return len(self.results) == len(self.hosts)
+
+    def _collect(self):
+        """
+        Return a dict of host -> (success, result) for the hosts that have
+        returned so far. Must be defined in subclasses.
+        """
+        raise NotImplementedError
+
+    def poll(self):
+        """
+        Return a dict of host -> (success, result) for the hosts that
+        returned since the last call. Hosts that have not returned once
+        the timeout has passed are reported as failed.
+        """
+        if self.done:
+            return dict()
+
+        new_results = dict(
+            (host, result) for host, result in self._collect().items()
+            if host in self.hosts and host not in self.results
+        )
+
+        if self.timeout is not None and \
+                time.time() - self.start_time >= self.timeout:
+            for host in self.hosts:
+                if host not in self.results and host not in new_results:
+                    new_results[host] = (
+                        False, 'No data returned from host %s' % host
+                    )
+
+        self.results.update(new_results)
+        return new_results
+
+    def __iter__(self):
+        """Yield (host, (success, result)) pairs as hosts return."""
+        while not self.done:
+            new_results = self.poll()
+            for host in sorted(new_results):
+                yield host, new_results[host]
+
+            if not new_results and not self.done:
+                time.sleep(self.poll_interval)
+
+
+class ThreadedDeployJob(DeployJob):
+    """
+    Deploy job which runs a single-host function for each host in a
+    thread pool.
+    """
+
+    poll_interval = 0.1
+
+    def __init__(self, func, hosts, timeout=None):
+        super(ThreadedDeployJob, self).__init__(hosts, timeout=timeout)
+
+        self.pool = ThreadPool(max(1, len(self.hosts)))
+        self.pending = dict(
+            (host, self.pool.apply_async(func, (host,)))
+            for host in self.hosts
+        )
+        self.pool.close()
+
+    def _collect(self):
+        """Return results of the host calls that have finished."""
+        results = dict(
+            (host, async_result.get())
+            for host, async_result in self.pending.items()
+            if async_result.ready()
+        )
+
+        for host in results:
+            del self.pending[host]
+
+        if not self.pending:
+            self.pool.join()
+
+        return results
+
+
+class CompletedDeployJob(DeployJob):
+    """Deploy job whose results were already collected synchronously."""
+
+    def __init__(self, host_results, jid=None):
+        super(CompletedDeployJob, self).__init__(host_results, jid=jid)
+        self.host_results = host_results
+
+    def _collect(self):
+        """Return the results given at creation."""
+        return self.host_results
@@ -0,0 +1,131 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Deploy strategy that only pretends to deploy, for benchmarks and testing of
+the installer without any real hosts.
+"""
+
+import math
+import random
+import time
+
+import tds.exceptions
+
+from .base import DeployStrategy
+from .job import DeployJob
+
+
+class SimulatedDeployJob(DeployJob):
+    """Deploy job whose hosts return at precomputed times."""
+
+    poll_interval = 0.05
+
+    def __init__(self, outcomes):
+        """outcomes is a dict of host -> (latency, success, result)."""
+        super(SimulatedDeployJob, self).__init__(outcomes.keys())
+        self.outcomes = dict(
+            (host, (self.start_time + latency, (success, result)))
+            for host, (latency, success, result) in outcomes.items()
+        )
+
+    def _collect(self):
+        """Return results of the hosts whose latency has passed."""
+        now = time.time()
+        return dict(
+            (host, result)
+            for host, (finish_time, result) in self.outcomes.items()
+            if finish_time <= now
+        )
+
+
+class SimulatedDeployStrategy(DeployStrategy):
+    """
+    Pretend to deploy to hosts: each host returns after a latency drawn from
+    the configured distribution, and fails with probability failure_rate.
+
+    latency is the mean latency in seconds and spread its relative spread
+    (e.g. 0.5 for a standard deviation of half the mean); distribution is
+    one of 'constant', 'uniform', 'normal', 'lognormal' or 'exponential'.
+    """
+
+    distributions = (
+        'constant', 'uniform', 'normal', 'lognormal', 'exponential',
+    )
+
+    def __init__(self, distribution='lognormal', latency=5.0, spread=0.5,
+                 failure_rate=0.0, seed=None):
+        if distribution not in self.distributions:
+            raise tds.exceptions.ConfigurationError(
+                'Invalid latency distribution: %r', distribution
+            )
+
+        self.distribution = distribution
+        self.latency = float(latency)
+        self.spread = float(spread)
+        self.failure_rate = float(failure_rate)
+        self.random = random.Random(seed)
+
+    def sample_latency(self):
+        """Return a latency in seconds drawn from the distribution."""
+        if self.distribution == 'constant' or self.latency <= 0:
+            return max(self.latency, 0.0)
+        elif self.distribution == 'uniform':
+            return self.random.uniform(
+                self.latency * max(1 - self.spread, 0),
+                self.latency * (1 + self.spread),
+            )
+        elif self.distribution == 'normal':
+            return max(
+                self.random.gauss(self.latency, self.latency * self.spread),
+                0.0
+            )
+        elif self.distribution == 'lognormal':
+            # Pick the parameters so that the mean is self.latency.
+            sigma = math.sqrt(math.log(1 + self.spread ** 2))
+            mu = math.log(self.latency) - sigma ** 2 / 2
+            return self.random.lognormvariate(mu, sigma)
+        else:
+            return self.random.expovariate(1 / self.latency)
+
+    def _submit(self, dep_hosts, action):
+        """Draw an outcome for each host and return a SimulatedDeployJob."""
+        outcomes = dict()
+        for host in dep_hosts:
+            success = self.random.random() >= self.failure_rate
+            outcomes[host] = (
+                self.sample_latency(),
+                success,
+                'Simulated %s on %s %s' % (
+                    action, host, 'successful' if success else 'failed'
+                ),
+            )
+
+        return SimulatedDeployJob(outcomes)
+
+    def submit_deploy(self, dep_hosts, app, version, retry=4):
+        """Pretend to deploy app version to the given hosts."""
+        return self._submit(dep_hosts, 'deploy of %s %s' % (app, version))
+
+    def submit_restart(self, dep_hosts, app, retry=4):
+        """Pretend to restart app on the given hosts."""
+        return self._submit(dep_hosts, 'restart of %s' % app)
+
+    def deploy_to_host(self, dep_host, app, version, retry=4):
+        """Pretend to deploy app version to a single host."""
+        return self.deploy_to_hosts([dep_host], app, version, retry)[dep_host]
+
+    def restart_host(self, dep_host, app, retry=4):
+        """Pretend to restart app on a single host."""
+        return self.restart_hosts([dep_host], app, retry)[dep_host]
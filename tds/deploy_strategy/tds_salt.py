@@ -15,67 +15,255 @@
 """Salt-based DeployStrategy."""
 
 import os
+import re
+import threading
+import time
 
 import salt.client
 import salt.config
+import salt.crypt
+import salt.transport
 
 import tds.utils
 
 from .base import DeployStrategy
+from .job import CompletedDeployJob, DeployJob
 
 import logging
 log = logging.getLogger('tds')
 
-# Note: in order to do multi-host in one call, need to specify them as
-# comma-separated string in the first arguent to publish.publish, like:
-# 'x.tagged.com,y.tagged.com'
-# Then, after all the args to the function call being published, add
-# 'expr_form=list'
+
+def _host_for_minion(hosts, minion_id):
+    """
+    Return the host from hosts that the given minion ID belongs to (the
+    minion ID may be a FQDN), or None.
+    """
+    for host in hosts:
+        if minion_id == host or minion_id.startswith(host + '.'):
+            return host
+
+    return None
+
+
+def _parse_return(minion_data):
+    """Return a (success, result) pair for a minion's publish return."""
+    host_result = minion_data['ret']
+    return (host_result.endswith('successful'), host_result)
+
+
+class SaltDeployJob(DeployJob):
+    """
+    Salt job published to the master without waiting for the minions;
+    returns are fetched from the master by job ID as they arrive.
+    This follows what salt's own publish module does, minus the wait.
+    """
+
+    def __init__(self, opts, auth, hosts, target, cmd, args, timeout=120):
+        self.opts = opts
+        self.channel = salt.transport.Channel.factory(opts)
+        self.tok = auth.gen_token('salt')
+
+        peer_data = self.channel.send({
+            'cmd': 'minion_pub',
+            'fun': cmd,
+            'arg': args,
+            'tgt': target,
+            'tgt_type': 'pcre',
+            'ret': '',
+            'tok': self.tok,
+            'tmo': timeout,
+            'form': 'full',
+            'id': opts['id'],
+        })
+
+        super(SaltDeployJob, self).__init__(
+            hosts,
+            jid=peer_data['jid'] if peer_data else None,
+            timeout=timeout,
+        )
+
+        if self.jid is None:
+            # Nothing was published, so nothing will ever return
+            self.timeout = 0
+
+    def _collect(self):
+        """Fetch the returns for this job received so far by the master."""
+        if self.jid is None:
+            return dict()
+
+        returns = self.channel.send({
+            'cmd': 'pub_ret',
+            'id': self.opts['id'],
+            'tok': self.tok,
+            'jid': self.jid,
+        })
+
+        results = dict()
+        for minion_id, minion_data in (returns or {}).items():
+            host = _host_for_minion(self.hosts, minion_id)
+            if host is not None:
+                results[host] = _parse_return(minion_data)
+
+        return results
 
 
 class TDSSaltDeployStrategy(DeployStrategy):
     """Salt (master publish.publish) based DeployStrategy."""
 
-    def __init__(self, c_dir=None):
-        self.c_dir = c_dir
+    # Loading the minion config and creating a Caller (which loads all the
+    # salt modules) is expensive, so these are shared by all instances in
+    # the process, keyed by minion config path. Use refresh() to reload.
+    _salt_objects = dict()
+    _salt_objects_lock = threading.RLock()
 
-    @tds.utils.debug
-    def _publish(self, host, cmd, *args):
-        """Dispatch to salt master."""
+    def __init__(self, c_dir=None, async_publish=False):
+        self.c_dir = c_dir
+        self.async_publish = async_publish
 
+    @property
+    def minion_config_path(self):
+        """Path of the minion configuration file."""
         if self.c_dir is not None:
-            opts = salt.config.minion_config(
-                os.path.join(self.c_dir, 'minion')
-            )
+            return os.path.join(self.c_dir, 'minion')
         else:
-            opts = salt.config.minion_config('/etc/salt.tds/minion')
+            return '/etc/salt.tds/minion'
 
-        caller = salt.client.Caller(mopts=opts)
-        host_re = '%s.*' % host   # To allow FQDN matching
+    @classmethod
+    def refresh(cls):
+        """
+        Drop the cached minion configurations and salt objects, so they
+        are rebuilt on next use.
+        """
+        with cls._salt_objects_lock:
+            cls._salt_objects.clear()
+
+    def _get_salt_object(self, name, factory):
+        """
+        Return the cached salt object with the given name for this
+        strategy's minion config, building it with factory() if needed.
+        """
+        key = (self.minion_config_path, name)
+
+        with self._salt_objects_lock:
+            if key not in self._salt_objects:
+                start = time.time()
+                self._salt_objects[key] = factory()
+                log.debug(
+                    'Salt setup: built %s for %s in %.3fs',
+                    name, self.minion_config_path, time.time() - start
+                )
+
+            return self._salt_objects[key]
+
+    def _get_opts(self):
+        """Return the (cached) minion configuration."""
+        return self._get_salt_object(
+            'opts',
+            lambda: salt.config.minion_config(self.minion_config_path)
+        )
 
+    def _get_caller(self):
+        """Return the (cached) salt Caller."""
+        return self._get_salt_object(
+            'caller',
+            lambda: salt.client.Caller(mopts=self._get_opts())
+        )
+
+    def _get_auth(self):
+        """Return the (cached) salt master authentication object."""
+        return self._get_salt_object(
+            'auth',
+            lambda: salt.crypt.SAuth(self._get_opts())
+        )
+
+    @staticmethod
+    def _get_target(hosts):
+        """Return a pcre target matching all of the given hosts."""
+        # To allow FQDN matching
+        return r'^(%s)(\..*)?$' % '|'.join(re.escape(host) for host in hosts)
+
+    @tds.utils.debug
+    def _publish(self, hosts, cmd, *args):
+        """
+        Dispatch to salt master, targeting all the given hosts in a single
+        publish. Return a dict of host -> (success, result).
+        """
+        caller = self._get_caller()
+
+        start = time.time()
         # Set timeout high because... RedHat
         result = caller.sminion.functions['publish.full_data'](
-            host_re, cmd, args, timeout=120
+            self._get_target(hosts), cmd, args, expr_form='pcre', timeout=120
+        )
+        log.debug(
+            'Salt publish of %s to %d host(s) took %.3fs',
+            cmd, len(hosts), time.time() - start
+        )
+
+        return self._map_results(hosts, result or {})
+
+    @tds.utils.debug
+    def _submit(self, hosts, cmd, *args):
+        """
+        Dispatch to salt master and return a DeployJob for the results.
+        In async_publish mode the job is returned as soon as the master
+        has accepted it; otherwise this waits for all of the hosts.
+        """
+        if not self.async_publish:
+            return CompletedDeployJob(self._publish(hosts, cmd, *args))
+
+        opts = self._get_opts()
+        auth = self._get_auth()
+
+        start = time.time()
+        job = SaltDeployJob(
+            opts, auth, hosts, self._get_target(hosts), cmd, args
         )
+        log.debug(
+            'Salt publish of %s to %d host(s) took %.3fs, job ID %s',
+            cmd, len(hosts), time.time() - start, job.jid
+        )
+        return job
 
-        if not result:
-            return (False, 'No data returned from host %s' % host)
+    @staticmethod
+    def _map_results(hosts, result):
+        """
+        Map the per-minion returns of a publish back to the requested
+        hosts, as a dict of host -> (success, result).
+        """
+        host_results = dict(
+            (host, (False, 'No data returned from host %s' % host))
+            for host in hosts
+        )
 
-        # We're assuming only one key is being returned currently
-        host_result = result.values()[0]['ret']
-        success = host_result.endswith('successful')
+        for minion_id, minion_data in result.items():
+            host = _host_for_minion(hosts, minion_id)
+            if host is not None:
+                host_results[host] = _parse_return(minion_data)
 
-        return (success, host_result)
+        return host_results
 
     @tds.utils.debug
     def deploy_to_host(self, dep_host, app, version, retry=4):
         """Deploy an application to a given host"""
 
-        log.debug('Deploying to host %r', dep_host)
-        return self._publish(dep_host, 'tds.install', app, version)
+        return self.deploy_to_hosts([dep_host], app, version, retry)[dep_host]
+
+    @tds.utils.debug
+    def submit_deploy(self, dep_hosts, app, version, retry=4):
+        """Deploy an application to the given hosts in one publish"""
+
+        log.debug('Deploying to hosts %r', dep_hosts)
+        return self._submit(dep_hosts, 'tds.install', app, version)
 
     @tds.utils.debug
     def restart_host(self, dep_host, app, retry=4):
         """Restart application on a given host"""
 
-        return self._publish(dep_host, 'tds.restart', app)
+        return self.restart_hosts([dep_host], app, retry)[dep_host]
+
+    @tds.utils.debug
+    def submit_restart(self, dep_hosts, app, retry=4):
+        """Restart application on the given hosts in one publish"""
+
+        return self._submit(dep_hosts, 'tds.restart', app)
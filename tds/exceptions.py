@@ -44,6 +44,12 @@ class AssociatedTargetsError(TDSException):
     pass
 
 
+class ChecksumMismatchError(TDSException):
+    """Exception for when downloaded data does not match its checksum"""
+
+    pass
+
+
 class ConfigurationError(TDSException):
     """Exception for invalid or incomplete configuration files"""
 
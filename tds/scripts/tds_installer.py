@@ -23,7 +23,9 @@ from tds.apps.installer.
 import logging
 import os
 import os.path
+import select
 import signal
+import subprocess
 import time
 import sys
 
@@ -34,6 +36,7 @@ import tds.apps
 import tds.exceptions
 import tds.model
 import tds.utils.processes
+import tds.utils.queue_signal
 
 from . import TDSDaemon
 
@@ -48,62 +51,246 @@ class TDSInstallerDaemon(TDSDaemon):
         # ongoing_processes is a dict with deployment ID keys and values:
         # (subprocess_popen_instance, start_time)
         self.ongoing_processes = dict()
+        # ongoing_targets is a dict with deployment ID keys and the set of
+        # targets of the deployment as values; see
+        # Installer.get_deployment_targets
+        self.ongoing_targets = dict()
+        # idle_workers holds installer worker processes waiting for a
+        # deployment; retired_workers holds workers told to exit that have
+        # not been reaped yet. See Installer.serve.
+        self.idle_workers = list()
+        self.retired_workers = list()
         self.threshold = kwargs.pop('threshold') if 'threshold' in kwargs \
             else timedelta(minutes=30)
         self.heartbeat_time = datetime.now()
         self.zookeeper_path = '/tdsinstaller'
+        # Replaced by a ZooKeeperQueueSignal if ZooKeeper is configured;
+        # otherwise only the fallback polling finds new deployments.
+        self.queue_signal = tds.utils.queue_signal.LocalQueueSignal()
+        # check_queue is set when the database should be searched for new
+        # deployments at the next run; next_poll is when it is searched
+        # anyway, in case a notification got lost.
+        self.check_queue = True
+        self.next_poll = datetime.now()
 
         # Set up callbacks.
         def end_callback():
             self.clean_up_processes(True)
+            self.stop_workers()
 
         def loop_callback():
             self.clean_up_processes(wait=self.should_stop())
-            time.sleep(0.1)
+            self.wait_for_work()
 
         def run_callback():
-            self.handle_incoming_deployments()
+            if self.check_queue:
+                self.check_queue = False
+                self.handle_incoming_deployments()
 
         self.end_callback = end_callback
         self.loop_callback = loop_callback
         self.run_callback = run_callback
 
     def handle_incoming_deployments(self):
-        """Look for new deployments added to TagOpsDB and handle them."""
+        """
+        Look for new deployments added to TagOpsDB and start every one
+        that doesn't conflict with an ongoing deployment.
+        """
         tagopsdb.Session.close()
-        deployment = self.app.find_deployment()
+        deployments = self.app.find_deployments(
+            ongoing=self.ongoing_targets,
+            max_deployments=self.max_deployments,
+            max_per_environment=self.max_deployments_per_env,
+        )
 
         # Heartbeat test to see if daemon is 'stuck'
         if (datetime.now() - self.heartbeat_time).seconds >= 900:
             self.heartbeat_time = datetime.now()
-            log.info('HEARTBEAT - Deployment search result: %r', deployment)
+            log.info(
+                'HEARTBEAT - Deployment search result: %r',
+                [deployment for deployment, _targets in deployments]
+            )
             log.info("There {verb} {num_proc} ongoing process{mult}.".format(
                 verb='is' if len(self.ongoing_processes) == 1 else 'are',
                 num_proc=len(self.ongoing_processes),
                 mult='' if len(self.ongoing_processes) == 1 else 'es',
             ))
 
-        if deployment is None:
-            return
+        for deployment, targets in deployments:
+            self.start_deployment(deployment, targets)
 
-        log.info('Found deployment with ID %s', deployment.id)
-        deployment.status = 'inprogress'
-        tagopsdb.Session.commit()
+        if deployments:
+            interval = self.poll_backoff.reset()
+        else:
+            interval = self.poll_backoff.next()
+        self.next_poll = datetime.now() + timedelta(seconds=interval)
+
+        self.fill_worker_pool()
+
+    def wait_for_work(self):
+        """
+        Sleep until a deployment is queued or the next fallback poll is due.
+        While deployments are ongoing, wake up often to check on them.
+        """
+        timeout = (self.next_poll - datetime.now()).total_seconds()
+        if self.ongoing_processes:
+            timeout = min(timeout, 0.1)
+
+        if self.queue_signal.wait(max(timeout, 0)):
+            log.debug('Woken up by queue signal.')
+            self.check_queue = True
+        elif datetime.now() >= self.next_poll:
+            self.check_queue = True
+
+    def create_zoo(self, zoo_config):
+        """
+        Create the zookeeper object and watch for queued deployments.
+        """
+        lock = super(TDSInstallerDaemon, self).create_zoo(zoo_config)
+        self.queue_signal = tds.utils.queue_signal.ZooKeeperQueueSignal(
+            self.zoo, watch=True,
+        )
+        return lock
+
+    def shutdown_handler(self, signum, frame):
+        """
+        Shut down the daemon, waking it up if it is waiting for work.
+        """
+        super(TDSInstallerDaemon, self).shutdown_handler(signum, frame)
+        self.queue_signal.wake()
+
+    def start_worker(self):
+        """
+        Start an installer worker process, which does the deployments whose
+        IDs are written to its stdin.
+        """
         installer_file_path = os.path.abspath(tds.apps.installer.__file__)
         if installer_file_path.endswith('.pyc'):
             installer_file_path = installer_file_path[:-1]
+        args = [sys.executable, installer_file_path, '--worker']
+        if 'config_dir' in self.app.params:
+            # Workers use the same configuration as the daemon.
+            args.extend(['--config-dir', self.app.params['config_dir']])
+        worker = tds.utils.processes.start_process(
+            args,
+            stdin=subprocess.PIPE,
+            # The worker logs to its own file; don't let anything it prints
+            # to stderr fill up a pipe nobody reads.
+            stderr=None,
+        )
+        log.debug('Started installer worker %d.' % (worker.pid))
+        return worker
+
+    def fill_worker_pool(self):
+        """Start workers until there are enough idle ones."""
+        while len(self.idle_workers) < self.worker_pool_size:
+            try:
+                self.idle_workers.append(self.start_worker())
+            except tds.exceptions.RunProcessError as exc:
+                log.error('Exception: %r', exc.stderr)
+                break
+
+    def release_worker(self, worker):
+        """
+        Put a worker that finished its deployment back in the pool, or tell
+        it to exit if the pool is full.
+        """
+        if len(self.idle_workers) < self.worker_pool_size:
+            self.idle_workers.append(worker)
+        else:
+            self.retire_worker(worker)
+
+    def retire_worker(self, worker):
+        """Tell a worker to exit; it is reaped by reap_workers."""
+        worker.stdin.close()
+        self.retired_workers.append(worker)
+
+    def reap_workers(self):
+        """Reap retired workers that have exited."""
+        self.retired_workers = [
+            worker for worker in self.retired_workers if worker.poll() is None
+        ]
+
+    def stop_workers(self):
+        """
+        Tell all idle workers to exit and wait for retired workers, killing
+        the ones that do not exit in time.
+        """
+        while self.idle_workers:
+            self.retire_worker(self.idle_workers.pop())
+
+        kill_time = datetime.now() + self.deploy_exit_timeout
+        while True:
+            self.reap_workers()
+            if not self.retired_workers:
+                break
+            if datetime.now() >= kill_time:
+                for worker in self.retired_workers:
+                    log.warning('Killing installer worker %d.' % (worker.pid))
+                    worker.kill()
+                    worker.wait()
+                self.retired_workers = list()
+                break
+            time.sleep(0.1)
+
+    def dispatch(self, dep_id):
+        """
+        Hand the given deployment ID to an idle worker, starting a new one if
+        there is none, and return the worker.
+        """
+        while self.idle_workers:
+            worker = self.idle_workers.pop()
+            try:
+                worker.stdin.write('%d\n' % dep_id)
+            except IOError:
+                # The worker exited while idle.
+                log.warning(
+                    'Installer worker %d is gone, discarding it.' %
+                    (worker.pid)
+                )
+                self.retired_workers.append(worker)
+            else:
+                return worker
+
+        worker = self.start_worker()
+        worker.stdin.write('%d\n' % dep_id)
+        return worker
+
+    @staticmethod
+    def worker_finished(dep_id, proc):
+        """
+        Return True if the given worker reported the deployment as done and
+        False if not. A worker that exited is left for waitproc.
+        """
+        while select.select([proc.stdout], [], [], 0)[0]:
+            line = proc.stdout.readline()
+            if not line:
+                return False
+            try:
+                if int(line) == dep_id:
+                    return True
+            except ValueError:
+                pass
+            log.warning(
+                'Deployment ID %d: unexpected worker output %r' %
+                (dep_id, line)
+            )
+        return False
+
+    def start_deployment(self, deployment, targets):
+        """Hand the given deployment to an installer worker."""
+        log.info('Found deployment with ID %s', deployment.id)
+        deployment.status = 'inprogress'
+        tagopsdb.Session.commit()
         try:
-            deployment_process = tds.utils.processes.start_process([
-                sys.executable,
-                installer_file_path,
-                deployment.id,
-            ])
+            deployment_process = self.dispatch(deployment.id)
         except tds.exceptions.RunProcessError as exc:
             log.error('Exception: %r', exc.stderr)
         else:
             self.ongoing_processes[deployment.id] = (
                 deployment_process, datetime.now()
             )
+            self.ongoing_targets[deployment.id] = targets
 
     def clean_up_processes(self, wait=False):
         """
@@ -117,6 +304,7 @@ class TDSInstallerDaemon(TDSDaemon):
         killed = {}
         while True:
             now = datetime.now()
+            self.reap_workers()
             for dep_id in self.ongoing_processes.keys():
                 (proc, process_start) = self.ongoing_processes[dep_id]
                 term_time = process_start + self.threshold
@@ -143,8 +331,10 @@ class TDSInstallerDaemon(TDSDaemon):
                     proc.terminate()
                     terminated[proc] = now
 
-                # 3. Check for processes that have exited and verify status.
-                if self.waitproc(dep_id=dep_id, proc=proc):
+                # 3. Check for deployments that are done, either because the
+                # worker reported so or because it exited, and verify status.
+                worker_done = self.worker_finished(dep_id=dep_id, proc=proc)
+                if worker_done or self.waitproc(dep_id=dep_id, proc=proc):
                     dep = self.app.get_deployment(dep_id=dep_id)
                     self.app._refresh(dep)
                     log.debug(
@@ -170,6 +360,18 @@ class TDSInstallerDaemon(TDSDaemon):
                         self.app.commit_session()
 
                     del self.ongoing_processes[dep_id]
+                    self.ongoing_targets.pop(dep_id, None)
+                    # Deployments waiting on these targets may start now.
+                    self.check_queue = True
+
+                    if not worker_done:
+                        proc.stdin.close()
+                        proc.stdout.close()
+                    elif proc in terminated:
+                        # It may have been signalled just as it finished.
+                        self.retire_worker(proc)
+                    else:
+                        self.release_worker(proc)
 
                     if proc in terminated:
                         del(terminated[proc])
@@ -206,6 +408,21 @@ class TDSInstallerDaemon(TDSDaemon):
         self.deploy_exit_timeout = timedelta(
             seconds=self.app.config.get('deploy_exit_timeout', 5)
         )
+        self.max_deployments = self.app.config.get(
+            'max_concurrent_deployments', None
+        )
+        self.max_deployments_per_env = self.app.config.get(
+            'max_concurrent_deployments_per_env', None
+        )
+        self.worker_pool_size = self.app.config.get('installer_workers', 2)
+        poll_config = self.app.config.get('queue_poll', {})
+        self.poll_backoff = tds.utils.queue_signal.Backoff(
+            poll_config.get('min_interval', 1),
+            poll_config.get('max_interval', 30),
+        )
+        # Workers are only started once this daemon holds the lock and
+        # looks for deployments (see handle_incoming_deployments), so a
+        # standby daemon doesn't keep idle ones around.
 
     def waitproc(self, dep_id, proc):
         """
@@ -21,6 +21,7 @@ import time
 import signal
 
 import tds.apps
+import tds.utils.queue_signal
 
 from . import TDSDaemon
 
@@ -33,16 +34,81 @@ class UpdateDeployRepoDaemon(TDSDaemon):
     def __init__(self, app, **kwargs):
         super(UpdateDeployRepoDaemon, self).__init__(app)
         self.zookeeper_path = '/tdsdeployrepo'
+        # Replaced by a ZooKeeperQueueSignal if ZooKeeper is configured;
+        # otherwise only the fallback polling finds new packages.
+        self.queue_signal = tds.utils.queue_signal.LocalQueueSignal()
+        # check_queue is set when the database should be searched for
+        # pending packages at the next run; next_poll is when it is
+        # searched anyway, in case a notification got lost.
+        self.check_queue = True
+        self.next_poll = time.time()
 
         # Set up callbacks.
         def loop_callback():
-            time.sleep(1.0)
+            self.wait_for_work()
 
         def run_callback():
-            self.app.run()
+            if self.check_queue:
+                self.check_queue = False
+                if self.app.run():
+                    interval = self.poll_backoff.reset()
+                else:
+                    interval = self.poll_backoff.next()
+                self.next_poll = time.time() + interval
+            elif self.app.index_due():
+                self.app.index_repo()
+
+        def end_callback():
+            # Don't leave RPMs added to the repo unindexed.
+            self.app.index_repo()
+            self.app.flush_metrics(force=True)
 
         self.loop_callback = loop_callback
         self.run_callback = run_callback
+        self.end_callback = end_callback
+
+    def configure(self):
+        """
+        Read the fallback polling configuration.
+        """
+        poll_config = self.app.config.get('repo').get('queue_poll', {})
+        self.poll_backoff = tds.utils.queue_signal.Backoff(
+            poll_config.get('min_interval', 1),
+            poll_config.get('max_interval', 30),
+        )
+
+    def wait_for_work(self):
+        """
+        Sleep until a package is added, the next fallback poll is due or
+        the repository index should be updated.
+        """
+        timeout = self.next_poll - time.time()
+        index_delay = self.app.index_delay()
+        if index_delay is not None:
+            timeout = min(timeout, index_delay)
+
+        if self.queue_signal.wait(max(timeout, 0)):
+            log.debug('Woken up by queue signal.')
+            self.check_queue = True
+        elif time.time() >= self.next_poll:
+            self.check_queue = True
+
+    def create_zoo(self, zoo_config):
+        """
+        Create the zookeeper object and watch for added packages.
+        """
+        lock = super(UpdateDeployRepoDaemon, self).create_zoo(zoo_config)
+        self.queue_signal = tds.utils.queue_signal.ZooKeeperQueueSignal(
+            self.zoo, tds.utils.queue_signal.PACKAGE_QUEUE_PATH, watch=True,
+        )
+        return lock
+
+    def shutdown_handler(self, signum, frame):
+        """
+        Shut down the daemon, waking it up if it is waiting for work.
+        """
+        super(UpdateDeployRepoDaemon, self).shutdown_handler(signum, frame)
+        self.queue_signal.wake()
 
 
 def daemon_main():
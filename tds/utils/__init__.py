@@ -14,10 +14,14 @@
 
 """Common utility methods for the TDS application"""
 
+from . import artifact_cache
 from . import config
 from .debug import debug
+from . import jenkins
 from .processes import run
 from . import merge
+from . import metrics
 from . import rpm
 
-__all__ = ['config', 'debug', 'merge', 'rpm', 'run']
+__all__ = ['artifact_cache', 'config', 'debug', 'jenkins', 'merge', 'metrics',
+           'rpm', 'run']
@@ -0,0 +1,304 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local store of downloaded artifacts, addressed by their MD5 checksum.
+Interrupted downloads are resumed with HTTP Range requests and stored
+artifacts are hardlinked to where they are needed, so an artifact is never
+fetched or stored twice.
+"""
+
+import errno
+import hashlib
+import logging
+import os
+import os.path
+import re
+import shutil
+import threading
+import time
+
+import requests
+
+from tds.exceptions import ChecksumMismatchError
+from tds.utils.metrics import RATE_BUCKETS
+
+__all__ = ['ArtifactCache']
+
+log = logging.getLogger('tds.utils.artifact_cache')
+
+
+class ArtifactCache(object):
+    """
+    Content-addressed artifact store in a directory: complete artifacts are
+    named by their MD5, partial downloads live in its 'partial' directory
+    and the times artifacts were last linked are recorded by stamp files in
+    its 'used' directory.
+    Safe to use from several threads.
+    """
+
+    chunk_size = 1024 * 1024
+    # Downloads of keys sharing a stripe are serialized; plenty for the
+    # handful of download threads of the repo updater.
+    lock_stripes = 64
+
+    def __init__(self, directory, session=None, metrics=None, timeout=60):
+        self.directory = directory
+        # Seconds to wait to connect and for each read of a download
+        self.timeout = timeout
+        self.partial_dir = os.path.join(directory, 'partial')
+        self.used_dir = os.path.join(directory, 'used')
+        self.session = session if session is not None else requests.Session()
+        # Optional tds.utils.metrics.Metrics for download throughput
+        self.metrics = metrics
+        self._locks = [threading.Lock() for _idx in range(self.lock_stripes)]
+
+        for path in (self.directory, self.partial_dir, self.used_dir):
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+    def _lock_for(self, key):
+        """Return the lock serializing downloads of the given key."""
+        return self._locks[hash(key) % len(self._locks)]
+
+    def path_for(self, md5):
+        """Return the path a complete artifact with the given MD5 has."""
+        return os.path.join(self.directory, md5.lower())
+
+    def get(self, md5):
+        """Return the path of the artifact with the given MD5, or None."""
+        path = self.path_for(md5)
+        if os.path.isfile(path):
+            return path
+        return None
+
+    def _partial_path(self, url, md5):
+        """
+        Return the path of the partial download of an artifact: by its
+        expected MD5 if known, otherwise by its URL.
+        """
+        if md5 is not None:
+            key = md5.lower()
+        else:
+            key = 'url-' + hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.partial_dir, key + '.part')
+
+    def _hash_file(self, path):
+        """Return an MD5 object fed with the contents of path."""
+        md5 = hashlib.md5()
+        with open(path, 'rb') as fobj:
+            for chunk in iter(lambda: fobj.read(self.chunk_size), ''):
+                md5.update(chunk)
+        return md5
+
+    @staticmethod
+    def _range_start(req):
+        """Return the first byte offset of a 206 response, or None."""
+        match = re.match(
+            r'bytes (\d+)-', req.headers.get('Content-Range', '')
+        )
+        if match is None:
+            return None
+        return int(match.group(1))
+
+    def fetch(self, url, md5=None):
+        """
+        Return the path of the artifact at url with the given MD5, which
+        is only downloaded if not in the cache yet. A previous partial
+        download of it is resumed. Return None if the server does not
+        have the artifact.
+
+        Raise ChecksumMismatchError (and drop the partial download) if the
+        data does not match md5 or cannot be resumed; requests exceptions
+        leave the partial download in place for the next attempt.
+        """
+        if md5 is not None and self.get(md5) is not None:
+            return self.get(md5)
+
+        partial = self._partial_path(url, md5)
+        with self._lock_for(partial):
+            if md5 is not None and self.get(md5) is not None:
+                return self.get(md5)
+
+            offset = 0
+            if os.path.isfile(partial):
+                offset = os.path.getsize(partial)
+
+            headers = dict()
+            if offset:
+                headers['Range'] = 'bytes=%d-' % offset
+            # Without a timeout a stalled transfer would hold the lock (and
+            # the download thread) forever instead of being resumed later.
+            req = self.session.get(
+                url, stream=True, headers=headers, timeout=self.timeout
+            )
+            try:
+                if offset and req.status_code == \
+                        requests.codes.range_not_satisfiable:
+                    # The partial download is already complete.
+                    digest = self._hash_file(partial)
+                else:
+                    digest = self._download(req, partial, offset)
+                    if digest is None:
+                        return None
+            finally:
+                req.close()
+
+            return self._store(partial, digest.hexdigest(), md5)
+
+    def _download(self, req, partial, offset):
+        """
+        Write the body of req to the partial download, appending if the
+        server honored the Range request. Return the MD5 object of the
+        whole partial file, or None for an error status.
+        """
+        if offset and req.status_code == requests.codes.partial_content \
+                and self._range_start(req) == offset:
+            log.info('Resuming download of %s at byte %d', req.url, offset)
+            mode = 'ab'
+            digest = self._hash_file(partial)
+        elif req.status_code == requests.codes.ok:
+            mode = 'wb'
+            digest = hashlib.md5()
+        elif req.status_code == requests.codes.partial_content:
+            self._remove(partial)
+            raise ChecksumMismatchError(
+                'Server resumed %s at the wrong offset' % req.url
+            )
+        else:
+            return None
+
+        start = time.time()
+        received = 0
+        try:
+            with open(partial, mode) as partial_file:
+                # The repository is served from hardlinks to the artifacts.
+                os.fchmod(partial_file.fileno(), 0o644)
+                for chunk in req.iter_content(self.chunk_size):
+                    partial_file.write(chunk)
+                    digest.update(chunk)
+                    received += len(chunk)
+                partial_file.flush()
+                os.fsync(partial_file.fileno())
+        finally:
+            self._record_download(received, time.time() - start)
+
+        return digest
+
+    def _record_download(self, received, elapsed):
+        """Record the bytes received by a download and its throughput."""
+        if self.metrics is None or not received:
+            return
+        self.metrics.increment('download.bytes', received)
+        if elapsed > 0:
+            self.metrics.observe(
+                'download.bytes_per_second', received / elapsed,
+                RATE_BUCKETS,
+            )
+
+    def _store(self, partial, digest, md5):
+        """
+        Move a complete partial download to its place in the cache, after
+        checking it against the expected md5, and return its path.
+        """
+        if md5 is not None and digest != md5.lower():
+            self._remove(partial)
+            raise ChecksumMismatchError(
+                'Downloaded data has MD5 %s, expected %s' % (digest, md5)
+            )
+
+        path = self.path_for(digest)
+        if os.path.isfile(path):
+            # Same artifact published under another URL
+            self._remove(partial)
+        else:
+            os.rename(partial, path)
+        return path
+
+    @staticmethod
+    def _remove(path):
+        """Remove a file, ignoring it not existing."""
+        try:
+            os.unlink(path)
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+
+    def _stamp_path(self, path):
+        """Return the path of the stamp recording when path was used."""
+        return os.path.join(self.used_dir, os.path.basename(path))
+
+    def link(self, path, dest):
+        """
+        Hardlink the cached artifact at path to dest, replacing dest. Fall
+        back to copying if dest is on another filesystem.
+        """
+        # Mark it as recently used for prune(). The artifact itself isn't
+        # touched: it may be linked into the repository, where createrepo
+        # goes by its modification time.
+        with open(self._stamp_path(path), 'a'):
+            os.utime(self._stamp_path(path), None)
+        self._remove(dest)
+        try:
+            os.link(path, dest)
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+            shutil.copy2(path, dest)
+
+    def _last_used(self, path, stat):
+        """
+        Return when the artifact at path (with the given os.stat result)
+        was stored or last linked, whichever is later.
+        """
+        try:
+            return max(stat.st_mtime,
+                       os.stat(self._stamp_path(path)).st_mtime)
+        except OSError:
+            return stat.st_mtime
+
+    def prune(self, max_age):
+        """
+        Remove artifacts not linked anywhere else and partial downloads
+        that have not been used for max_age seconds.
+        """
+        cutoff = time.time() - max_age
+        for directory, linked_only in (
+            (self.directory, True), (self.partial_dir, False)
+        ):
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                if linked_only:
+                    if stat.st_nlink > 1:
+                        continue
+                    last_used = self._last_used(path, stat)
+                else:
+                    last_used = stat.st_mtime
+                if last_used >= cutoff:
+                    continue
+                log.debug('Pruning %s from artifact cache', path)
+                self._remove(path)
+                if linked_only:
+                    self._remove(self._stamp_path(path))
+
+        # Stamps of artifacts that are gone, e.g. removed by hand
+        for name in os.listdir(self.used_dir):
+            if not os.path.exists(os.path.join(self.directory, name)):
+                self._remove(os.path.join(self.used_dir, name))
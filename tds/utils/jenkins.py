@@ -0,0 +1,234 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lightweight client for the Jenkins JSON API. Only the jobs and builds asked
+for are fetched, never the list of all jobs; the artifacts, fingerprints
+and revision of a build come from a single request and are cached for a
+while, so validating a package and downloading its RPM don't each go back
+to Jenkins for them.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+import requests
+import requests.exceptions
+
+__all__ = ['JenkinsBuild', 'JenkinsClient', 'get_client']
+
+log = logging.getLogger('tds.utils.jenkins')
+
+BUILD_TREE = ','.join([
+    'number',
+    'url',
+    'building',
+    'artifacts[fileName,relativePath]',
+    'fingerprint[fileName,hash]',
+    'actions[lastBuiltRevision[SHA1]]',
+    'runs[number,url]',
+])
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class JenkinsBuild(object):
+    """The metadata TDS needs of a single Jenkins build (or matrix run)."""
+
+    def __init__(self, url, data):
+        self.url = (data.get('url') or url).rstrip('/') + '/'
+        self.number = data.get('number')
+        self.building = bool(data.get('building', False))
+
+        self.artifacts = dict(
+            (artifact['fileName'],
+             self.url + 'artifact/' + artifact['relativePath'])
+            for artifact in data.get('artifacts') or []
+        )
+        self.fingerprints = dict(
+            (fingerprint['fileName'], fingerprint['hash'])
+            for fingerprint in data.get('fingerprint') or []
+        )
+
+        self.revision = None
+        for action in data.get('actions') or []:
+            revision = (action or {}).get('lastBuiltRevision')
+            if revision:
+                self.revision = revision.get('SHA1')
+                break
+
+        # Jenkins lists the runs of older builds too if a matrix
+        # configuration wasn't built this time.
+        self.runs = [
+            run['url'] for run in data.get('runs') or []
+            if run.get('number') == self.number
+        ]
+
+
+class JenkinsClient(object):
+    """
+    Client for the Jenkins server at url. Existing jobs and finished builds
+    are cached for ttl seconds, keeping the max_entries most recently used.
+    A dropped connection is reopened and the request retried once. Safe to
+    use from several threads.
+    """
+
+    def __init__(self, url, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 session=None, timeout=30):
+        self.url = url.rstrip('/')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.session = session if session is not None else requests.Session()
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_get(self, key):
+        """Return the unexpired cached value for key, or None."""
+        with self._lock:
+            expires, value = self._cache.pop(key, (0, None))
+            if expires <= time.time():
+                return None
+            # Reinsert to mark it as the most recently used.
+            self._cache[key] = (expires, value)
+            return value
+
+    def _cache_set(self, key, value):
+        """Cache value for key, evicting the least recently used entries."""
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = (time.time() + self.ttl, value)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _get_json(self, url, tree):
+        """
+        Return the decoded JSON API data at url, or None if Jenkins doesn't
+        have it. Connection and server errors raise requests exceptions.
+        """
+        for attempt in range(2):
+            try:
+                req = self.session.get(
+                    url + 'api/json', params=dict(tree=tree),
+                    timeout=self.timeout,
+                )
+            except requests.exceptions.ConnectionError as exc:
+                if attempt:
+                    raise
+                log.info('Reconnecting to Jenkins at %s: %s', self.url, exc)
+                # Drops the pooled connections; new ones are made as needed.
+                self.session.close()
+            else:
+                break
+
+        if req.status_code == requests.codes.not_found:
+            return None
+        req.raise_for_status()
+        return req.json()
+
+    def _fetch_build(self, url):
+        """Return the JenkinsBuild at url, or None."""
+        data = self._get_json(url, BUILD_TREE)
+        if data is None:
+            return None
+        return JenkinsBuild(url, data)
+
+    def job_exists(self, job_name):
+        """Return whether Jenkins has a job named job_name."""
+        key = ('job', job_name)
+        if self._cache_get(key):
+            return True
+
+        exists = self._get_json(
+            '{url}/job/{job}/'.format(url=self.url, job=job_name), 'name'
+        ) is not None
+        if exists:
+            self._cache_set(key, True)
+        return exists
+
+    def get_build(self, job_name, number):
+        """
+        Return the JenkinsBuild for the given build number of job_name, or
+        None if there is no such build. For a 'job/configuration' job_name
+        the matching run of the matrix build is returned.
+        """
+        key = ('build', job_name, str(number))
+        build = self._cache_get(key)
+        if build is not None:
+            return build
+
+        if '/' in job_name:
+            job_name, matrix_name = job_name.split('/', 1)
+            build = self.get_build(job_name, number)
+            if build is None:
+                return None
+            for run_url in build.runs:
+                if matrix_name in run_url:
+                    build = self._fetch_build(run_url)
+                    break
+            else:
+                build = None
+        else:
+            build = self._fetch_build(
+                '{url}/job/{job}/{number}/'.format(
+                    url=self.url, job=job_name, number=number,
+                )
+            )
+
+        # Missing or unfinished builds may change soon.
+        if build is not None and not build.building:
+            self._cache_set(key, build)
+        return build
+
+    def get_fingerprint_md5(self, job_name, number, file_name):
+        """
+        Return the Jenkins fingerprint MD5 of an artifact of the given
+        build, or None if the build doesn't exist or fingerprinting has
+        not been enabled for the artifact.
+        """
+        build = self.get_build(job_name, number)
+        if build is None:
+            return None
+        return build.fingerprints.get(file_name)
+
+    def get_revision(self, job_name, number):
+        """
+        Return the revision (e.g. git commit hash) the given build was made
+        from, or None if it is unknown.
+        """
+        build = self.get_build(job_name, number)
+        if build is None:
+            return None
+        return build.revision
+
+
+_clients = dict()
+_clients_lock = threading.Lock()
+
+
+def get_client(url, ttl=DEFAULT_TTL):
+    """
+    Return the JenkinsClient for the Jenkins server at url shared by the
+    whole process, so that its connections and cache outlive a single
+    command, request or repo updater pass.
+    """
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = JenkinsClient(url, ttl)
+        client.ttl = ttl
+        return client
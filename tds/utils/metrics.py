@@ -0,0 +1,161 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Simple in-process counters and histograms for long-running TDS programs,
+which can be written to a JSON file and forwarded to graphite.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+__all__ = ['Histogram', 'Metrics', 'RATE_BUCKETS', 'SECONDS_BUCKETS']
+
+log = logging.getLogger('tds.utils.metrics')
+
+SECONDS_BUCKETS = (
+    0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600,
+)
+# In bytes per second, from 64KiB/s to 1GiB/s
+RATE_BUCKETS = tuple(2 ** exp for exp in range(16, 31, 2))
+
+
+class Histogram(object):
+    """
+    Distribution of observed values: their count, sum, minimum and maximum,
+    and how many were at most each of the bucket bounds.
+    """
+
+    def __init__(self, bounds=SECONDS_BUCKETS):
+        self.bounds = tuple(sorted(bounds))
+        self.bucket_counts = [0] * len(self.bounds)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """Add a value to the distribution."""
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        for idx, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.bucket_counts[idx] += 1
+
+    def as_dict(self):
+        """Return the distribution as a dictionary."""
+        return dict(
+            count=self.count,
+            sum=self.sum,
+            min=self.min,
+            max=self.max,
+            mean=self.sum / self.count if self.count else None,
+            buckets=[
+                [bound, count]
+                for bound, count in zip(self.bounds, self.bucket_counts)
+            ],
+        )
+
+
+class Metrics(object):
+    """
+    Named counters and histograms, accumulated since the program started.
+    Safe to update from several threads.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = dict()
+        self.histograms = dict()
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        """Add value to the named counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value, bounds=SECONDS_BUCKETS):
+        """
+        Add value to the named histogram, which is created with the given
+        bucket bounds the first time.
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(bounds)
+            histogram.observe(value)
+
+    def snapshot(self):
+        """Return the current values of all metrics as a dictionary."""
+        with self._lock:
+            return dict(
+                started=self.started,
+                updated=time.time(),
+                counters=dict(self.counters),
+                histograms=dict(
+                    (name, histogram.as_dict())
+                    for name, histogram in self.histograms.items()
+                ),
+            )
+
+    def write(self, path):
+        """
+        Write a snapshot to path as JSON, replacing it atomically so readers
+        never see a partial file.
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as metrics_file:
+            json.dump(self.snapshot(), metrics_file, indent=2, sort_keys=True)
+        os.rename(tmp_path, path)
+
+    def flatten(self, prefix=''):
+        """
+        Return (name, value) pairs for all counters, and the count, sum,
+        mean and maximum of all histograms, e.g. for graphite.
+        """
+        snapshot = self.snapshot()
+        values = sorted(snapshot['counters'].items())
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            values.extend(
+                ('.'.join((name, field)), histogram[field])
+                for field in ('count', 'sum', 'mean', 'max')
+                if histogram[field] is not None
+            )
+        return [(prefix + name, value) for name, value in values]
+
+    def send_graphite(self, config, prefix=''):
+        """
+        Send the flattened metrics to the graphite server in config (the
+        notifications.graphite settings). Errors are logged, not raised.
+        """
+        # Only needed if forwarding is enabled.
+        import graphitesend
+
+        try:
+            graphite = graphitesend.init(
+                graphite_server=config['host'],
+                graphite_port=config['port'],
+                prefix=config['prefix'],
+            )
+            graphite.send_list(self.flatten(prefix))
+            graphite.disconnect()
+        except (graphitesend.GraphiteSendException, KeyError) as exc:
+            log.warning('Unable to send metrics to graphite: %s', exc)
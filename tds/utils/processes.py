@@ -43,11 +43,12 @@ def start_process(cmd, shell=False, **kwds):
         args = cmd
 
     args = map(str, args)
+    kwds.setdefault('stdout', subprocess.PIPE)
+    kwds.setdefault('stderr', subprocess.PIPE)
 
     try:
         start = time.time()
-        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE, shell=shell, **kwds)
+        proc = subprocess.Popen(args, shell=shell, **kwds)
         proc.cmd = args
         proc.start_time = start
     except OSError as e:
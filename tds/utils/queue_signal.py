@@ -0,0 +1,246 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Signals used to wake up a daemon when work is queued for it, so it does
+not have to poll the database constantly: the installer daemon for queued
+deployments and the repo updater daemon for pending packages.
+"""
+
+import atexit
+import logging
+import Queue
+import threading
+import time
+
+__all__ = [
+    'QueueSignal', 'LocalQueueSignal', 'ZooKeeperQueueSignal', 'Backoff',
+    'QueueNotifier', 'get_notifier', 'notify_queued', 'DEFAULT_PATH',
+    'PACKAGE_QUEUE_PATH',
+]
+
+log = logging.getLogger('tds.utils.queue_signal')
+
+DEFAULT_PATH = '/tdsinstaller_queue'
+PACKAGE_QUEUE_PATH = '/tdsdeployrepo_queue'
+
+
+class QueueSignal(object):
+    """
+    Base class for a queue signal. Watchers call wait(); notify() wakes them.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def notify(self):
+        """Abstract method, must be defined in subclasses"""
+
+        raise NotImplementedError
+
+    def wake(self):
+        """Wake up a local waiter without notifying anybody else."""
+        self.event.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait up to timeout seconds for a notification. Return True if one
+        arrived and False if not.
+        """
+        self.event.wait(timeout)
+        woken = self.event.is_set()
+        self.event.clear()
+        return woken
+
+
+class LocalQueueSignal(QueueSignal):
+    """
+    In-process stand-in for ZooKeeperQueueSignal, for tests and for daemons
+    running without ZooKeeper.
+    """
+
+    def notify(self):
+        """Wake up the waiter."""
+        self.wake()
+
+
+class ZooKeeperQueueSignal(QueueSignal):
+    """
+    Queue signal carried by a znode: notify() writes to it and watchers are
+    woken by a data watch on it.
+    """
+
+    def __init__(self, zoo, path=DEFAULT_PATH, watch=False):
+        super(ZooKeeperQueueSignal, self).__init__()
+        self.zoo = zoo
+        self.path = path
+        self.zoo.ensure_path(self.path)
+        if watch:
+            self.zoo.DataWatch(self.path, self._on_change)
+
+    def _on_change(self, _data, _stat):
+        """Kazoo callback run whenever the znode changes."""
+        self.wake()
+
+    def notify(self):
+        """Bump the znode, triggering the watch of every daemon."""
+        self.zoo.set(self.path, b'')
+
+
+class Backoff(object):
+    """
+    Poll interval which doubles every time nothing was found, between
+    minimum and maximum seconds.
+    """
+
+    def __init__(self, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = minimum
+
+    def reset(self):
+        """Go back to the minimum interval; return it."""
+        self.interval = self.minimum
+        return self.interval
+
+    def next(self):
+        """Return the current interval and back off for the next one."""
+        interval = self.interval
+        self.interval = min(self.interval * 2, self.maximum)
+        return interval
+
+
+class QueueNotifier(object):
+    """
+    Sends queue notifications to ZooKeeper from a background thread, so
+    callers never wait for ZooKeeper. The connection is made on first use
+    and kept for later notifications. If ZooKeeper can't be reached,
+    notifications are dropped for retry_interval seconds instead of
+    trying to connect for each of them.
+    """
+
+    def __init__(self, zookeeper_hosts, timeout=1, retry_interval=30):
+        self.hosts = ','.join(zookeeper_hosts)
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.zoo = None
+        self.retry_after = 0
+        self.paths = Queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def notify(self, path=DEFAULT_PATH):
+        """Queue a notification of the daemons watching path."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='queue-notifier'
+                )
+                self._thread.daemon = True
+                self._thread.start()
+        self.paths.put(path)
+
+    def flush(self, timeout=None):
+        """
+        Wait up to timeout seconds (forever if None) for the queued
+        notifications to be sent. Return whether they were.
+        """
+        if timeout is not None:
+            end = time.time() + timeout
+        with self.paths.all_tasks_done:
+            while self.paths.unfinished_tasks:
+                if timeout is None:
+                    self.paths.all_tasks_done.wait()
+                    continue
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return False
+                self.paths.all_tasks_done.wait(remaining)
+        return True
+
+    def _create_client(self):
+        """Return a new, unstarted ZooKeeper client."""
+        # Imported here so that clients without ZooKeeper don't pay for it.
+        from kazoo.client import KazooClient
+
+        return KazooClient(hosts=self.hosts, timeout=self.timeout)
+
+    def _run(self):
+        """Send the queued notifications, forever."""
+        while True:
+            path = self.paths.get()
+            try:
+                self._send(path)
+            finally:
+                self.paths.task_done()
+
+    def _send(self, path):
+        """Notify the daemons watching path, connecting if needed."""
+        if time.time() < self.retry_after:
+            log.debug('Not notifying daemons watching %s: ZooKeeper was '
+                      'unreachable', path)
+            return
+
+        try:
+            if self.zoo is None:
+                self.zoo = self._create_client()
+                self.zoo.start(timeout=self.timeout)
+            ZooKeeperQueueSignal(self.zoo, path).notify()
+        except Exception as exc:
+            log.warning('Could not notify daemons watching %s: %r', path, exc)
+            self.retry_after = time.time() + self.retry_interval
+            self._close()
+
+    def _close(self):
+        """Drop the ZooKeeper connection; the next notification reconnects."""
+        zoo, self.zoo = self.zoo, None
+        if zoo is None:
+            return
+        try:
+            zoo.stop()
+            zoo.close()
+        except Exception as exc:
+            log.debug('Error closing ZooKeeper connection: %r', exc)
+
+
+_notifiers = dict()
+_notifiers_lock = threading.Lock()
+
+
+def get_notifier(zookeeper_hosts, timeout=1):
+    """
+    Return the QueueNotifier for the given ZooKeeper hosts shared by the
+    whole process. Before the process exits, it waits up to twice timeout
+    seconds for the notifications still queued.
+    """
+    key = tuple(zookeeper_hosts)
+    with _notifiers_lock:
+        notifier = _notifiers.get(key)
+        if notifier is None:
+            notifier = _notifiers[key] = QueueNotifier(key, timeout)
+            atexit.register(notifier.flush, 2 * timeout)
+        return notifier
+
+
+def notify_queued(zookeeper_hosts, path=DEFAULT_PATH):
+    """
+    Tell the daemons watching path that work has been queued: by default
+    the installer daemons, about a deployment. This is best-effort and
+    doesn't wait for ZooKeeper: the daemons still poll the database, just
+    less often.
+    """
+    if not zookeeper_hosts:
+        return
+
+    get_notifier(zookeeper_hosts).notify(path)
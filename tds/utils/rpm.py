@@ -15,7 +15,9 @@
 """Classes for working with RPMs."""
 
 import logging
+import os
 import os.path
+import struct
 
 import tds.exceptions
 
@@ -24,6 +26,110 @@ from . import run
 log = logging.getLogger('tds.utils.rpm')
 
 
+class RPMHeaderProvider(object):
+    """
+    Provider for querying of data on an RPM file by reading its header
+    directly, without running the rpm binary. Only the lead and headers at
+    the start of the file are read, never the payload.
+    """
+
+    lead_size = 96
+    lead_magic = '\xed\xab\xee\xdb'
+    header_magic = '\x8e\xad\xe8\x01'
+    # Magic, reserved bytes, number of index entries, size of the data
+    header_intro = struct.Struct('>4s4xII')
+    index_entry = struct.Struct('>iiii')
+    # The limits rpm itself enforces on a header
+    max_index_entries = 0xffff
+    max_data_size = 256 * 1024 * 1024
+
+    tags = dict(name=1000, version=1001, release=1002, arch=1022)
+    # STRING, STRING_ARRAY and I18NSTRING; for the arrays, the first string
+    string_types = (6, 8, 9)
+
+    @classmethod
+    def _read(cls, fobj, size):
+        """Read exactly size bytes from fobj."""
+        data = fobj.read(size)
+        if len(data) != size:
+            raise ValueError('Truncated RPM file')
+        return data
+
+    @classmethod
+    def _read_header_intro(cls, fobj):
+        """
+        Read the intro of a header structure and return its number of index
+        entries and data size.
+        """
+        magic, num_entries, data_size = cls.header_intro.unpack(
+            cls._read(fobj, cls.header_intro.size)
+        )
+        if magic != cls.header_magic:
+            raise ValueError('Bad RPM header magic')
+        if num_entries > cls.max_index_entries or \
+                data_size > cls.max_data_size:
+            raise ValueError('RPM header too large')
+        return num_entries, data_size
+
+    @classmethod
+    def read_header(cls, fobj):
+        """
+        Read the main header of the RPM file open as fobj and return its
+        string values as a dict of tag number -> value.
+        """
+        if cls._read(fobj, cls.lead_size)[:4] != cls.lead_magic:
+            raise ValueError('Not an RPM file')
+
+        # Skip the signature header, which is padded to 8 bytes.
+        num_entries, data_size = cls._read_header_intro(fobj)
+        fobj.seek(
+            num_entries * cls.index_entry.size + data_size +
+            (8 - data_size % 8) % 8,
+            os.SEEK_CUR
+        )
+
+        num_entries, data_size = cls._read_header_intro(fobj)
+        index = cls._read(fobj, num_entries * cls.index_entry.size)
+        data = cls._read(fobj, data_size)
+
+        header = dict()
+        for idx in range(num_entries):
+            tag, tag_type, offset, _count = cls.index_entry.unpack_from(
+                index, idx * cls.index_entry.size
+            )
+            if tag_type not in cls.string_types or \
+                    not 0 <= offset < data_size:
+                continue
+            end = data.find('\0', offset)
+            if end == -1:
+                raise ValueError('Unterminated string in RPM header')
+            header[tag] = data[offset:end]
+
+        return header
+
+    @classmethod
+    def query(cls, filename, fields):
+        """
+        Query for given fields from file filename. Return None if it isn't
+        an RPM file this can read or it lacks any of the fields.
+        """
+        try:
+            with open(filename, 'rb') as fobj:
+                header = cls.read_header(fobj)
+        except (IOError, ValueError, struct.error) as exc:
+            log.debug('Unable to read RPM header of %s: %s', filename, exc)
+            return None
+
+        values = list()
+        for field in fields:
+            value = header.get(cls.tags.get(field))
+            if value is None:
+                return None
+            values.append(value)
+
+        return zip(fields, values)
+
+
 class RPMQueryProvider(object):
     """
     Provider for querying of data on an RPM file.
@@ -112,8 +218,32 @@ class RPMDescriptor(object):
     def from_path(cls, path):
         """
         Build a new RPM descriptor from the given path.
+        The RPM header is read directly; the rpm binary is only used for
+        files that can't be read that way.
         """
-        info = RPMQueryProvider.query(path, RPMDescriptor.query_fields)
+        info = RPMHeaderProvider.query(path, RPMDescriptor.query_fields)
+        if info is None:
+            info = RPMQueryProvider.query(path, RPMDescriptor.query_fields)
         if info is None:
             return None
         return cls(path, **dict(info))
+
+    @classmethod
+    def from_paths(cls, paths):
+        """
+        Build RPM descriptors for the given paths; return a list with the
+        descriptor (or None for an invalid RPM) of each path.
+        """
+        return [cls.from_path(path) for path in paths]
+
+    @classmethod
+    def from_directory(cls, directory):
+        """
+        Build RPM descriptors for all '.rpm' files in the given directory;
+        return a dict of path -> descriptor (or None for an invalid RPM).
+        """
+        paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.endswith('.rpm')
+        )
+        return dict(zip(paths, cls.from_paths(paths)))
@@ -17,6 +17,10 @@ Base view class for REST API.
 """
 
 import json
+import logging
+
+import sqlalchemy.exc
+import sqlalchemy.orm.query
 
 from pyramid.response import Response
 from cornice.resource import view
@@ -27,10 +31,13 @@ import tagopsdb
 
 import tds.model
 import tds.exceptions
+import tds.utils.jenkins
 
 from .validators import ValidatedView
 from . import obj_types, descriptions
 
+log = logging.getLogger('tds.views.rest.base')
+
 
 def init_view(_view_cls=None, name=None, plural=None, model=None,
               set_params=True):
@@ -101,12 +108,65 @@ def init_view(_view_cls=None, name=None, plural=None, model=None,
     return real_decorator
 
 
+class JSONArrayIter(object):
+    """
+    WSGI app_iter writing a JSON array of the JSON representations of objs
+    a chunk of about chunk_size bytes at a time, so that the whole list is
+    never held in memory. The database session is removed once the body
+    has been written or the server closes the iterator.
+
+    The first object is loaded and converted when this is created, so an
+    error in the query or the conversion is raised before the response is
+    started. An error with a later object can only be logged: the status
+    has been sent by then, so the client gets a 200 response whose body is
+    truncated (and so not valid JSON).
+    """
+
+    def __init__(self, objs, to_json_obj, chunk_size=64 * 1024):
+        self.objs = iter(objs)
+        self.to_json_obj = to_json_obj
+        self.chunk_size = chunk_size
+        self.head = '['
+        for obj in self.objs:
+            self.head += json.dumps(self.to_json_obj(obj), cls=TDSEncoder)
+            break
+
+    def __iter__(self):
+        chunk = [self.head]
+        size = len(self.head)
+        try:
+            for obj in self.objs:
+                element = ', ' + json.dumps(
+                    self.to_json_obj(obj), cls=TDSEncoder
+                )
+                chunk.append(element)
+                size += len(element)
+                if size >= self.chunk_size:
+                    yield ''.join(chunk)
+                    chunk = []
+                    size = 0
+        except Exception:
+            log.exception('Error while streaming response, body truncated')
+            self.close()
+            raise
+        chunk.append(']')
+        yield ''.join(chunk)
+        self.close()
+
+    def close(self):
+        """Release the database session."""
+        tagopsdb.Session.remove()
+
+
 class BaseView(ValidatedView):
     """
     This class manages & enforces permission, does basic view initialization.
     It also handles validation for requests and parameters in requests.
     """
 
+    # Rows loaded at a time when streaming a collection
+    stream_batch_size = 1000
+
     def to_json_obj(self, obj, param_routes=None):
         """
         Return a JSON object representation of this object.
@@ -282,6 +342,39 @@ class BaseView(ValidatedView):
                 )
             )
 
+    def make_stream_response(self, objs, param_routes=None, status="200 OK",
+                             headers=None):
+        """
+        Make and return a Response whose body is the JSON array of the JSON
+        representations of objs, written as the objects are loaded. A query
+        is run and its first row converted before returning (see
+        JSONArrayIter), fetching its rows in batches of stream_batch_size.
+        """
+        if headers is None:
+            headers = dict()
+
+        if isinstance(objs, sqlalchemy.orm.query.Query):
+            try:
+                objs = iter(
+                    objs.yield_per(self.stream_batch_size)
+                    .execution_options(stream_results=True)
+                )
+            except sqlalchemy.exc.InvalidRequestError as exc:
+                # Joined eager loading of collections can't be batched.
+                log.debug('Not streaming %s query: %s', self.name, exc)
+                objs = iter(objs.all())
+        else:
+            objs = iter(objs)
+
+        return Response(
+            app_iter=JSONArrayIter(
+                objs, lambda obj: self.to_json_obj(obj, param_routes)
+            ),
+            content_type="text/json",
+            status=status,
+            headers=headers,
+        )
+
     def _route_params(self, routes=None):
         """
         Map params from their front-end names to their backend names in the
@@ -311,9 +404,7 @@ class BaseView(ValidatedView):
         Returns:
             "200 OK" if valid request successfully processed
         """
-        return self.make_response(
-            [self.to_json_obj(x) for x in self.request.validated[self.plural]]
-        )
+        return self.make_stream_response(self.request.validated[self.plural])
 
     @view(validators=('validate_collection_get', 'validate_cookie'))
     def collection_head(self):
@@ -352,6 +443,18 @@ class BaseView(ValidatedView):
         """
         return self.settings['jenkins']['url']
 
+    @property
+    def jenkins(self):
+        """
+        Return the Jenkins client shared by all requests.
+        """
+        return tds.utils.jenkins.get_client(
+            self.jenkins_url,
+            self.settings['jenkins'].get(
+                'metadata_ttl', tds.utils.jenkins.DEFAULT_TTL
+            ),
+        )
+
     @view(validators=('validate_put_post', 'validate_post_required',
                       'validate_obj_post', 'validate_cookie'))
     def collection_post(self):
@@ -131,6 +131,7 @@ The full structure of the response is similar to:
 """
 
 from cornice.resource import resource, view
+from sqlalchemy import and_, func
 
 import tagopsdb.model
 import tds.model
@@ -172,33 +173,46 @@ class BystanderView(base.BaseView):
                 request.validated_params['limit']
             )
 
-        # self.applications = self.applications.all()
         self.result = dict()
-        all_envs = tagopsdb.model.Environment.all()
-        for app_tier in self.query(tagopsdb.model.ProjectPackage).filter(
-            tagopsdb.model.ProjectPackage.app_id.in_(
-                [tier.id for tier in self.tiers]
-            )
-        ).all():
-            app = self.query(tds.model.Application).get(id=app_tier.pkg_def_id)
-            tier = self.query(tds.model.AppTarget).get(id=app_tier.app_id)
-            env_sub_dict = dict()
-            for env in all_envs:
-                env_dep = app.get_latest_completed_tier_deployment(
-                    tier.id,
-                    env.id,
-                    query=self.query(tagopsdb.model.AppDeployment),
+        tiers = dict((tier.id, tier) for tier in self.tiers)
+        if not tiers:
+            return
+
+        app_tiers = set(
+            (app_tier.pkg_def_id, app_tier.app_id) for app_tier in
+            self.query(tagopsdb.model.ProjectPackage).filter(
+                tagopsdb.model.ProjectPackage.app_id.in_(tiers.keys())
+            ).all()
+        )
+        if not app_tiers:
+            return
+        apps = dict(
+            (app.id, app) for app in
+            self.query(tagopsdb.model.PackageDefinition).filter(
+                tagopsdb.model.PackageDefinition.id.in_(
+                    set(app_id for app_id, _tier_id in app_tiers)
                 )
+            ).all()
+        )
+        envs = dict((env.id, env) for env in tagopsdb.model.Environment.all())
+
+        latest = self.get_latest_tier_deployments(tiers.keys())
+        for app_id, tier_id in sorted(app_tiers):
+            env_sub_dict = dict()
+            for env_id, env in envs.items():
+                env_dep = latest.get((app_id, tier_id, env_id))
                 if env_dep is not None:
-                    env_sub_dict[env.id] = dict(
+                    tier_dep, package = env_dep
+                    env_sub_dict[env_id] = dict(
                         name=env.env,
-                        package_id=env_dep.package_id,
-                        package_version=env_dep.package.version,
-                        package_revision=env_dep.package.revision,
-                        package_commit_hash=env_dep.package.commit_hash,
+                        package_id=tier_dep.package_id,
+                        package_version=package.version,
+                        package_revision=package.revision,
+                        package_commit_hash=package.commit_hash,
                     )
             if len(env_sub_dict) == 0:
                 continue
+            tier = tiers[tier_id]
             if tier.id not in self.result:
                 self.result[tier.id] = dict(name=tier.name, status=tier.status)
             try:
@@ -213,8 +227,54 @@ class BystanderView(base.BaseView):
                 ]) > int(env_sub_dict[DEV_ID]['package_version'])
             except (KeyError, ValueError):
                 env_sub_dict['stage_ahead'] = False
-            self.result[tier.id][app.id] = env_sub_dict
-            self.result[tier.id][app.id]['name'] = app.name
+            self.result[tier.id][app_id] = env_sub_dict
+            self.result[tier.id][app_id]['name'] = apps[app_id].name
+
+    def get_latest_tier_deployments(self, tier_ids):
+        """
+        Return the latest completed (validated or complete) tier deployment
+        of each application on each of the tiers with the given IDs in each
+        environment, with its package, as a dictionary with
+        (application ID, tier ID, environment ID) keys and
+        (tier deployment, package) values. Uses a single query, grouping
+        by application, tier and environment for the latest realized time.
+        """
+        tier_dep = tagopsdb.model.AppDeployment
+        package = tagopsdb.model.Package
+        statuses = ('validated', 'complete')
+
+        latest = self.session.query(
+            package.pkg_def_id.label('pkg_def_id'),
+            tier_dep.app_id.label('app_id'),
+            tier_dep.environment_id.label('environment_id'),
+            func.max(tier_dep.realized).label('realized'),
+        ).join(
+            tier_dep.package
+        ).filter(
+            tier_dep.app_id.in_(tier_ids),
+            tier_dep.status.in_(statuses),
+        ).group_by(
+            package.pkg_def_id, tier_dep.app_id, tier_dep.environment_id,
+        ).subquery()
+
+        rows = self.session.query(tier_dep, package).join(
+            tier_dep.package
+        ).join(
+            latest, and_(
+                latest.c.pkg_def_id == package.pkg_def_id,
+                latest.c.app_id == tier_dep.app_id,
+                latest.c.environment_id == tier_dep.environment_id,
+                latest.c.realized == tier_dep.realized,
+            )
+        ).filter(
+            tier_dep.status.in_(statuses),
+        ).order_by(tier_dep.id)
+
+        # Of deployments realized at the same time, the last one wins.
+        return dict(
+            ((pkg.pkg_def_id, dep.app_id, dep.environment_id), (dep, pkg))
+            for dep, pkg in rows
+        )
 
     def validate_bystander_options(self, _request):
         """
@@ -20,6 +20,7 @@ from cornice.resource import resource, view
 
 import tagopsdb.model
 import tds.model
+import tds.utils.queue_signal
 from .base import BaseView, init_view
 from .urls import ALL_URLS
 from .permissions import DEPLOYMENT_PERMISSIONS
@@ -366,6 +367,10 @@ class DeploymentView(BaseView):
                 self.request.validated_params[attr],
             )
         self.session.commit()
+        if self.request.validated_params.get('status') == 'queued':
+            tds.utils.queue_signal.notify_queued(
+                self.settings.get('zookeeper', None)
+            )
         return self.make_response(
             self.to_json_obj(self.request.validated[self.name])
         )
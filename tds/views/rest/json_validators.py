@@ -17,15 +17,15 @@ JSON validators class, to be used as a base class for the ValidatedView class.
 """
 
 
-import os
 import datetime
-import yaml
-
-from os.path import join as opj
 
 import tagopsdb
 import tds
-import tds.utils.config
+
+from . import settings
+
+# {param}_choices attributes resolved from the model, by view class
+_CHOICES = dict()
 
 
 class JSONValidatedView(object):
@@ -58,68 +58,48 @@ class JSONValidatedView(object):
         if not getattr(self, 'defaults', None):
             self.defaults = {}
 
-        settings_path = None
-        local_path = opj(os.path.dirname(os.path.realpath(__file__)),
-                         'settings.yml')
-        global_path = opj(tds.utils.config.TDSConfig.default_conf_dir,
-                          'deploy.yml')
-        if os.path.exists(local_path):
-            settings_path = local_path
-        elif os.path.exists(global_path):
-            settings_path = global_path
-        else:
-            raise tds.exceptions.ConfigurationError(
-                "Could not find REST settings file at {local_path} "
-                "or {global_path}.".format(local_path=local_path,
-                                           global_path=global_path)
-            )
-
-        try:
-            with open(settings_path) as settings_file:
-                self.settings = yaml.load(settings_file.read())
-                if settings_path == global_path:
-                    tds_rest_path = opj(
-                        tds.utils.config.TDSConfig.default_conf_dir,
-                        'tds_rest.yml'
-                    )
-                    with open(tds_rest_path) as tds_rest_file:
-                        data = yaml.load(tds_rest_file.read())
-                        for key in data:
-                            self.settings[key] = data[key]
-                else:
-                    # This is so the feature test suite will work
-                    self.settings['url_prefix'] = ''
-        except IOError:
-            raise tds.exceptions.ConfigurationError(
-                "Could not open REST settings file {path}."
-                .format(path=settings_path)
-            )
+        self.settings = settings.get_settings()
         if self.valid_attrs and len(self.types) > 0:
-            for param in [x for x in self.types if self.types[x] == 'choice']:
-                choices = getattr(
-                    self, '{param}_choices'.format(param=param), None
-                )
-                if choices is None or len(choices) == 0:
-                    try:
-                        if getattr(self.model, 'delegate', None):
-                            table = self.model.delegate.__table__
-                        else:
-                            table = self.model.__table__
-                        col_name = self.param_routes.get(param, param)
-                        setattr(
-                            self,
-                            '{param}_choices'.format(param=param),
-                            table.columns[col_name].type.enums
-                        )
-                    except Exception as exc:
-                        raise tds.exceptions.ProgrammingError(
-                            "No choices set for param {param}. "
-                            "Got exception {e}.".format(param=param, e=exc)
-                        )
+            for name, choices in self._get_choices().items():
+                setattr(self, name, choices)
 
         self.session = tagopsdb.model.Base.Session()
         super(JSONValidatedView, self).__init__(*args, **kwargs)
 
+    @classmethod
+    def _get_choices(cls):
+        """
+        Return the {param}_choices attributes this class needs that are
+        not set on it, taken from the enum columns of its model. They are
+        only looked up once per class.
+        """
+        choices = _CHOICES.get(cls)
+        if choices is not None:
+            return choices
+
+        choices = dict()
+        types = getattr(cls, 'types', None) or {}
+        param_routes = getattr(cls, 'param_routes', None) or {}
+        for param in [x for x in types if types[x] == 'choice']:
+            name = '{param}_choices'.format(param=param)
+            if getattr(cls, name, None):
+                continue
+            try:
+                if getattr(cls.model, 'delegate', None):
+                    table = cls.model.delegate.__table__
+                else:
+                    table = cls.model.__table__
+                col_name = param_routes.get(param, param)
+                choices[name] = table.columns[col_name].type.enums
+            except Exception as exc:
+                raise tds.exceptions.ProgrammingError(
+                    "No choices set for param {param}. "
+                    "Got exception {e}.".format(param=param, e=exc)
+                )
+
+        _CHOICES[cls] = choices
+        return choices
+
     def _validate_json_params(self, types=None):
         """
         Validate all params in self.request.validated_params against each
@@ -17,13 +17,10 @@ REST API view for packages retrieved by ID.
 """
 
 from cornice.resource import resource, view
-import jenkinsapi.jenkins
-try:
-    from jenkinsapi.custom_exceptions import JenkinsAPIException, NotFound
-except ImportError:
-    from jenkinsapi.exceptions import JenkinsAPIException, NotFound
+import requests.exceptions
 
 import tds.model
+import tds.utils.queue_signal
 from .base import BaseView, init_view
 from . import obj_types, descriptions
 from .urls import ALL_URLS
@@ -224,18 +221,11 @@ class PackageByIDView(BaseView):
         updated.
         """
         try:
-            jenkins = jenkinsapi.jenkins.Jenkins(self.jenkins_url)
+            jenkins = self.jenkins
         except KeyError:
             raise tds.exceptions.ConfigurationError(
                 'Could not find jenkins_url in settings file.'
             )
-        except Exception:
-            self._add_jenkins_error(
-                "Unable to connect to Jenkins server at {addr} to check for "
-                "package.".format(addr=self.jenkins_url)
-            )
-            self.request.errors.status = 500
-            return
 
         application = None
         if 'name' in self.request.validated_params:
@@ -269,47 +259,52 @@ class PackageByIDView(BaseView):
             job_name, matrix_name = job_name.split('/', 1)
 
         try:
-            job = jenkins[job_name]
-        except KeyError:
-            self._add_jenkins_error("Jenkins job {job} does not exist.".format(
-                job=job_name,
-            ))
-            self.request.errors.status = 400
-            return
-
-        try:
-            int(version)
+            number = int(version)
         except ValueError:
-            return
+            number = None
 
         try:
-            build = job.get_build(int(version))
-        except (KeyError, JenkinsAPIException, NotFound):
-            self._add_jenkins_error(
-                "Build with version {vers} for job {job} does not exist on "
-                "Jenkins server.".format(vers=version, job=job_name)
-            )
-            self.request.errors.status = 400
-
-        if matrix_name is not None:
-            for run in build.get_matrix_runs():
-                if matrix_name in run.baseurl:
-                    build = run
-                    break
-            else:
+            build = None
+            if number is not None:
+                build = jenkins.get_build(job_name, number)
+            if build is None and not jenkins.job_exists(job_name):
                 self._add_jenkins_error(
-                    "No matrix run matching {matrix} for job {job} found."
-                    .format(matrix=matrix_name, job=job_name)
+                    "Jenkins job {job} does not exist.".format(job=job_name)
                 )
                 self.request.errors.status = 400
+                return None
+            if number is None:
+                return None
 
-        if self.request.errors.status == 400:
-            return None
-        try:
-            return build.get_revision()
-        except:             # Unkown exception type --KN
+            if build is None:
+                self._add_jenkins_error(
+                    "Build with version {vers} for job {job} does not exist "
+                    "on Jenkins server.".format(vers=version, job=job_name)
+                )
+                self.request.errors.status = 400
+                return None
+
+            if matrix_name is not None:
+                build = jenkins.get_build(
+                    '/'.join((job_name, matrix_name)), number
+                )
+                if build is None:
+                    self._add_jenkins_error(
+                        "No matrix run matching {matrix} for job {job} found."
+                        .format(matrix=matrix_name, job=job_name)
+                    )
+                    self.request.errors.status = 400
+                    return None
+        except (requests.exceptions.RequestException, ValueError):
+            self._add_jenkins_error(
+                "Unable to connect to Jenkins server at {addr} to check for "
+                "package.".format(addr=self.jenkins_url)
+            )
+            self.request.errors.status = 500
             return None
 
+        return build.revision
+
     @view(validators=('validate_put_post', 'validate_post_required',
                       'validate_obj_post', 'validate_cookie'))
     def collection_post(self):
@@ -319,4 +314,26 @@ class PackageByIDView(BaseView):
         self.request.validated_params['creator'] = self.request.validated[
             'user'
         ]
-        return self._handle_collection_post()
+        response = self._handle_collection_post()
+        self.notify_pending()
+        return response
+
+    @view(validators=('validate_individual', 'validate_put_post',
+                      'validate_obj_put', 'validate_cookie'))
+    def put(self):
+        """
+        Handle a PUT request after the parameters are marked valid JSON.
+        """
+        response = super(PackageByIDView, self).put()
+        if self.request.validated_params.get('status') == 'pending':
+            self.notify_pending()
+        return response
+
+    def notify_pending(self):
+        """
+        Wake up the repo updater daemons now that a package is pending.
+        """
+        tds.utils.queue_signal.notify_queued(
+            self.settings.get('zookeeper', None),
+            tds.utils.queue_signal.PACKAGE_QUEUE_PATH,
+        )
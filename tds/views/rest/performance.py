@@ -15,13 +15,17 @@
 """
 REST API performance endpoint. Provides information on monthly performance.
 e.g., number of tier deployments by status and total for every month since
-first tier deployment in database.
+first tier deployment in database. Weekly (starting on Mondays) and daily
+figures are available with the granularity parameter.
 """
 
 
-from datetime import datetime, timedelta
+import threading
+
+from datetime import date, datetime, timedelta
 
 from cornice.resource import resource, view
+from sqlalchemy import func
 
 import tds.model
 from . import base
@@ -29,6 +33,19 @@ from .urls import ALL_URLS
 from .permissions import PERFORMANCE_PERMISSIONS
 
 
+class DailyRollup(object):
+    """
+    Per-process cache of the daily counts by status of an object type for
+    all days before end. Days are only added once they are settled, i.e.
+    old enough that their counts should no longer change.
+    """
+
+    def __init__(self):
+        self.end = None
+        self.counts = dict()
+        self.lock = threading.Lock()
+
+
 @resource(path=ALL_URLS['performance'])
 class PerformanceView(base.BaseView):
     """
@@ -44,17 +61,96 @@ class PerformanceView(base.BaseView):
         host_deployments=dict(model=tds.model.HostDeployment, attr='realized'),
     )
 
+    granularity_choices = ('day', 'week', 'month')
+
+    # DailyRollup by object type, used if the performance_rollup_settle_days
+    # setting is set.
+    rollups = dict((obj_type, DailyRollup()) for obj_type in model_dict)
+
     @staticmethod
     def _add_one_month(date_obj):
         return (date_obj.replace(day=1) + timedelta(days=32)).replace(day=1)
 
+    @staticmethod
+    def _period_start(day, granularity):
+        """Return the first day of the period of granularity containing day."""
+        if granularity == 'day':
+            return day
+        if granularity == 'week':
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    def _next_period(self, day, granularity):
+        """Return the first day of the period after the one starting at day."""
+        if granularity == 'day':
+            return day + timedelta(days=1)
+        if granularity == 'week':
+            return day + timedelta(days=7)
+        return self._add_one_month(day)
+
+    def _query_daily_counts(self, model, column, start=None, end=None):
+        """
+        Return {day: {status: count}} for the objects of model whose column
+        is on or after start and before end, counted by the database.
+        """
+        day_column = func.date(column)
+        query = self.session.query(
+            day_column, getattr(model, 'status'), func.count()
+        )
+        if start is not None:
+            query = query.filter(column >= start)
+        if end is not None:
+            query = query.filter(column < end)
+
+        counts = dict()
+        for day, status, count in query.group_by(
+            day_column, getattr(model, 'status')
+        ):
+            if not isinstance(day, date):
+                day = datetime.strptime(str(day), "%Y-%m-%d").date()
+            counts.setdefault(day, dict())[status] = count
+        return counts
+
+    def _daily_counts(self, obj_type, model, column, start, end):
+        """
+        Return {day: {status: count}} for the days from start until end. If
+        rollups are enabled, settled days come from the rollup of obj_type,
+        which is first brought up to date.
+        """
+        settle_days = self.settings.get('performance_rollup_settle_days', None)
+        if settle_days is None:
+            return self._query_daily_counts(model, column, start, end)
+
+        rollup = self.rollups[obj_type]
+        settled = date.today() - timedelta(days=int(settle_days))
+        with rollup.lock:
+            if rollup.end is None or rollup.end < settled:
+                rollup.counts.update(
+                    self._query_daily_counts(model, column, rollup.end, settled)
+                )
+                rollup.end = settled
+            counts = dict(
+                (day, day_counts)
+                for day, day_counts in rollup.counts.items()
+                if start <= day < end
+            )
+            rollup_end = rollup.end
+
+        if end > rollup_end:
+            counts.update(self._query_daily_counts(
+                model, column, max(start, rollup_end), end
+            ))
+        return counts
+
     def validate_performance_get(self, request):
         """
         Validate a performance GET request.
         """
         self.name = 'performance'
-        self._validate_params(['limit', 'start'])
-        self._validate_json_params({'limit': 'integer', 'start': 'timestamp'})
+        self._validate_params(['granularity', 'limit', 'start'])
+        self._validate_json_params({
+            'granularity': 'choice', 'limit': 'integer', 'start': 'timestamp',
+        })
         obj_type = request.matchdict['obj_type']
         if obj_type not in self.model_dict:
             request.errors.add(
@@ -70,14 +166,9 @@ class PerformanceView(base.BaseView):
         if request.errors:
             return
 
-        time_fmt = "%Y-%m-%d %H:%M:%S"
-        to_return = dict()
+        granularity = request.validated_params.get('granularity', 'month')
         model = self.model_dict[obj_type]['model']
         col_name = self.model_dict[obj_type]['attr']
-        # for model_name in self.model_dict:
-        date_objs = list()
-        # model = self.model_dict[model_name]['model']
-        # col_name = self.model_dict[model_name]['attr']
         column = getattr(model, col_name)
         if getattr(model, 'delegate', None):
             table = model.delegate.__table__
@@ -85,52 +176,57 @@ class PerformanceView(base.BaseView):
             table = model.__table__
         statuses = table.columns['status'].type.enums
 
-        today = datetime.today()
+        today = date.today()
 
         if 'start' in request.validated_params:
             earliest = datetime.strptime(
                 request.validated['start'],
                 "%Y-%m-%d %H:%M:%S"
-            )
+            ).date()
         else:
-            earliest = min(
-                [getattr(obj, col_name) for obj in self.query(model).all()] +
-                [today]
-            )
-        earliest = datetime(
-            year=earliest.year, month=earliest.month, day=1
-        )
+            earliest = self.session.query(func.min(column)).scalar()
+            earliest = today if earliest is None else earliest.date()
+        earliest = self._period_start(earliest, granularity)
 
         if 'limit' in request.validated_params:
             limit = int(request.validated_params['limit'])
             latest = earliest
             while limit:
-                latest = self._add_one_month(latest)
+                latest = self._next_period(latest, granularity)
                 limit -= 1
         else:
             latest = today
         if latest > today:
             latest = today
 
+        # Only periods that are over by latest are covered.
+        periods = list()
         current = earliest
-        month_later = self._add_one_month(current)
-        while month_later <= latest:
-            date_obj = dict(month=current.strftime("%Y-%m"))
-            all_objs = self.query(model).filter(
-                column < month_later.strftime(time_fmt),
-                column >= current.strftime(time_fmt)
-            ).all()
-            date_obj['total'] = len(all_objs)
+        while self._next_period(current, granularity) <= latest:
+            periods.append(current)
+            current = self._next_period(current, granularity)
+
+        period_counts = dict()
+        if periods:
+            daily_counts = self._daily_counts(
+                obj_type, model, column, periods[0], current
+            )
+            for day, day_counts in daily_counts.items():
+                counts = period_counts.setdefault(
+                    self._period_start(day, granularity), dict()
+                )
+                for status, count in day_counts.items():
+                    counts[status] = counts.get(status, 0) + count
+
+        date_fmt = "%Y-%m" if granularity == 'month' else "%Y-%m-%d"
+        date_objs = list()
+        for period in periods:
+            counts = period_counts.get(period, dict())
+            date_obj = {granularity: period.strftime(date_fmt)}
+            date_obj['total'] = sum(counts.values())
             for status in statuses:
-                date_obj[status] = len([
-                    obj for obj in all_objs if
-                    getattr(obj, 'status') == status
-                ])
+                date_obj[status] = counts.get(status, 0)
             date_objs.append(date_obj)
-            current = self._add_one_month(current)
-            month_later = self._add_one_month(current)
-        # to_return[model_name] = date_objs
-        # self.result = to_return
         self.result = date_objs
 
     def validate_performance_options(self, _request):
@@ -142,8 +238,11 @@ class PerformanceView(base.BaseView):
                 description="Get metrics on packages, tier deployments, host "
                     "deployments, or deployments by month for all months.",
                 parameters=dict(
-                    limit="Number of months to cover.",
-                    start="Date or datetime during the first month to cover.",
+                    granularity="Period to aggregate by: day, week (starting "
+                        "on Monday) or month (the default).",
+                    limit="Number of periods to cover.",
+                    start="Date or datetime during the first period to "
+                        "cover.",
                 ),
             ),
             HEAD=dict(description="Do a GET query without a body returned."),
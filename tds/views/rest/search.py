@@ -367,10 +367,9 @@ class SearchView(base.BaseView):
                     body='',
                     status="417 Expectation Failed",
                 )
-        return self.make_response([
-            self.to_json_obj(x, self.obj_dict['param_routes']) for x in
-            self.results
-        ])
+        return self.make_stream_response(
+            self.results, self.obj_dict['param_routes']
+        )
 
     @view(validators=('validate_search_get', 'validate_cookie'))
     def head(self):
@@ -0,0 +1,165 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Settings of the REST API, loaded once per process and shared by all
+requests. They are reloaded when one of their files changes or the process
+gets SIGHUP.
+"""
+
+import logging
+import os
+import signal
+import threading
+import yaml
+
+from os.path import join as opj
+
+import tds.exceptions
+import tds.utils.config
+
+__all__ = ['LOCAL_PATH', 'SettingsRegistry', 'get_settings',
+           'install_reload_handler', 'load_settings']
+
+log = logging.getLogger('tds.views.rest.settings')
+
+LOCAL_PATH = opj(os.path.dirname(os.path.realpath(__file__)), 'settings.yml')
+
+
+def _settings_paths(local_path, conf_dir):
+    """
+    Return the files the settings are read from with their os.stat results:
+    the local settings.yml if it exists (as in the feature tests),
+    otherwise deploy.yml and tds_rest.yml in conf_dir.
+    """
+    try:
+        return [(local_path, os.stat(local_path))]
+    except OSError:
+        pass
+
+    global_path = opj(conf_dir, 'deploy.yml')
+    try:
+        global_stat = os.stat(global_path)
+    except OSError:
+        raise tds.exceptions.ConfigurationError(
+            "Could not find REST settings file at {local_path} "
+            "or {global_path}.".format(local_path=local_path,
+                                       global_path=global_path)
+        )
+
+    tds_rest_path = opj(conf_dir, 'tds_rest.yml')
+    try:
+        tds_rest_stat = os.stat(tds_rest_path)
+    except OSError:
+        # Reported when loading, as a missing file can't be opened.
+        tds_rest_stat = None
+    return [(global_path, global_stat), (tds_rest_path, tds_rest_stat)]
+
+
+def load_settings(local_path=LOCAL_PATH, conf_dir=None):
+    """
+    Read and return the REST settings from the files in local_path or
+    conf_dir (by default the TDS configuration directory).
+    """
+    if conf_dir is None:
+        conf_dir = tds.utils.config.TDSConfig.default_conf_dir
+
+    paths = [path for path, _stat in _settings_paths(local_path, conf_dir)]
+    try:
+        with open(paths[0]) as settings_file:
+            settings = yaml.load(settings_file.read())
+        if len(paths) > 1:
+            with open(paths[1]) as tds_rest_file:
+                data = yaml.load(tds_rest_file.read())
+                for key in data:
+                    settings[key] = data[key]
+        else:
+            # This is so the feature test suite will work
+            settings['url_prefix'] = ''
+    except IOError:
+        raise tds.exceptions.ConfigurationError(
+            "Could not open REST settings file {path}.".format(path=paths[0])
+        )
+
+    return settings
+
+
+class SettingsRegistry(object):
+    """
+    Cache of the REST settings. Each lookup only stats the settings files;
+    they are parsed again if one of them changed or a reload was requested.
+    The settings dictionary is shared, so it must not be modified.
+    """
+
+    def __init__(self, local_path=LOCAL_PATH, conf_dir=None):
+        self.local_path = local_path
+        self.conf_dir = conf_dir
+        self._settings = None
+        self._signature = None
+        self._reload_requested = False
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        """Return what identifies the current version of the files."""
+        conf_dir = self.conf_dir
+        if conf_dir is None:
+            conf_dir = tds.utils.config.TDSConfig.default_conf_dir
+
+        return tuple(
+            (path, None) if stat is None else
+            (path, stat.st_ino, stat.st_size, stat.st_mtime)
+            for path, stat in _settings_paths(self.local_path, conf_dir)
+        )
+
+    def get(self):
+        """Return the settings, loading them if needed."""
+        signature = self._current_signature()
+        if signature == self._signature and not self._reload_requested:
+            return self._settings
+
+        with self._lock:
+            if signature != self._signature or self._reload_requested:
+                self._reload_requested = False
+                log.info('Loading REST settings from %s',
+                         ', '.join(entry[0] for entry in signature))
+                self._settings = load_settings(self.local_path, self.conf_dir)
+                self._signature = signature
+            return self._settings
+
+    def request_reload(self):
+        """Make the next lookup load the settings again."""
+        self._reload_requested = True
+
+
+registry = SettingsRegistry()
+
+
+def get_settings():
+    """Return the settings of this process' REST API."""
+    return registry.get()
+
+
+def install_reload_handler(signum=signal.SIGHUP):
+    """
+    Reload the settings at the next request after the process gets signum.
+    Does nothing if signal handlers can't be set, e.g. outside the main
+    thread.
+    """
+    def reload_handler(_signum, _frame):
+        registry.request_reload()
+
+    try:
+        signal.signal(signum, reload_handler)
+    except ValueError as exc:
+        log.warning('Unable to install settings reload handler: %s', exc)
@@ -19,8 +19,63 @@ REST API utilities.
 import hmac
 import hashlib
 import base64
+import collections
+import threading
 from datetime import datetime
 
+# Number of verified cookies remembered by validate_cookie
+VERIFIED_COOKIE_CACHE_SIZE = 1000
+
+
+class VerifiedCookieCache(object):
+    """
+    Bounded LRU of the results of validating cookies, by cookie and remote
+    client address. An entry is only used with the settings it was
+    verified with and until the cookie expires. Safe to use from several
+    threads.
+    """
+
+    def __init__(self, max_entries=VERIFIED_COOKIE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, settings, now):
+        """
+        Return the cached (username, is_admin, restrictions) for key, or
+        None if not cached, expired or verified with other settings.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            entry_settings, expires, result = entry
+            if entry_settings is not settings or \
+                    (expires is not None and now >= expires):
+                return None
+            # Reinsert to mark it as the most recently used.
+            self._entries[key] = entry
+            return result
+
+    def set(self, key, settings, expires, result):
+        """
+        Cache result for key until expires (seconds since the epoch as
+        validate_cookie counts them, or None for never).
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (settings, expires, result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_verified_cookies = VerifiedCookieCache()
+
+
+def _now_seconds():
+    """Return the current time as cookies count it."""
+    return (datetime.now() - datetime.utcfromtimestamp(0)).total_seconds()
+
 
 def _create_digest(username, addr, seconds, settings, is_admin, prepend,
                    eternal):
@@ -62,14 +117,17 @@ def _create_cookie(username, addr, settings, is_admin, prepend=None,
         username, addr, seconds, settings, is_admin, prepend, eternal
     )
 
+    # admin and wildcard tell validate_cookie which digest to check.
     return (
         "{prepend}issued={issued}&user={user}&eternal={eternal}&"
-        "digest={digest}".format(
+        "admin={admin}&wildcard={wildcard}&digest={digest}".format(
             prepend=prepend,
             issued=seconds,
             user=username,
             digest=digest,
             eternal=eternal,
+            admin=bool(is_admin),
+            wildcard=addr == 'any',
         )
     )
 
@@ -105,12 +163,27 @@ def validate_cookie(request, settings):
     is valid, False otherwise.
     is_admin is True if the cookie is valid and the user has admin permissions,
     False otherwise.
+    Valid cookies are remembered (for the same remote client address) until
+    they expire, so they are only verified once.
     """
     if not getattr(request, 'cookies', None) or 'session' not in \
             request.cookies:
         return (False, False, False, dict())
 
-    digest = seconds = username = eternal = None
+    if 'X-Forwarded-For' in request.headers:
+        remote_addr = request.headers['X-Forwarded-For'].split(', ')[0]
+    else:
+        remote_addr = request.remote_addr
+
+    cache_key = (request.cookies['session'], remote_addr)
+    cached = _verified_cookies.get(cache_key, settings, _now_seconds())
+    if cached is not None:
+        username, is_admin, restrictions = cached
+        # The caller may modify the restrictions.
+        return (True, username, is_admin, dict(restrictions))
+
+    digest = seconds = username = eternal = admin = wildcard = None
+    flags = {'True': True, 'False': False}
 
     pairs = [p.split('=', 1) for p in request.cookies['session'].split('&')]
     restrictions = dict()
@@ -125,11 +198,12 @@ def validate_cookie(request, settings):
             username = val
         if key == 'digest':
             digest = val
-        if key == 'eternal':
-            if val == 'True':
-                eternal = True
-            elif val == 'False':
-                eternal = False
+        if key == 'eternal' and val in flags:
+            eternal = flags[val]
+        if key == 'admin' and val in flags:
+            admin = flags[val]
+        if key == 'wildcard' and val in flags:
+            wildcard = flags[val]
         for restrict_key in restrict_keys:
             if key == restrict_key:
                 restrictions[key] = val
@@ -142,37 +216,49 @@ def validate_cookie(request, settings):
     if None in (digest, seconds, username, eternal):
         return (True, False, False, restrictions)
 
-    if 'X-Forwarded-For' in request.headers:
-        remote_addr = request.headers['X-Forwarded-For'].split(', ')[0]
+    if admin is not None and wildcard is not None:
+        # The cookie says which digest it has; a false claim won't match.
+        is_admin = admin
+        valid = hmac.compare_digest(
+            str(digest),
+            str(_create_digest(
+                username, 'any' if wildcard else remote_addr, seconds,
+                settings, admin, prepend, eternal
+            ))
+        )
     else:
-        remote_addr = request.remote_addr
-
-    admin_digest = _create_digest(
-        username, remote_addr, seconds, settings, True, prepend, eternal
-    )
-    non_admin_digest = _create_digest(
-        username, remote_addr, seconds, settings, False, prepend, eternal
-    )
-    wildcard_admin_digest = _create_digest(
-        username, 'any', seconds, settings, True, prepend, eternal
-    )
-    wildcard_non_admin_digest = _create_digest(
-        username, 'any', seconds, settings, False, prepend, eternal
-    )
-    if digest not in (
-        admin_digest, non_admin_digest, wildcard_admin_digest,
-        wildcard_non_admin_digest,
-    ):
+        # Cookies from before admin and wildcard were added
+        admin_digest = _create_digest(
+            username, remote_addr, seconds, settings, True, prepend, eternal
+        )
+        non_admin_digest = _create_digest(
+            username, remote_addr, seconds, settings, False, prepend, eternal
+        )
+        wildcard_admin_digest = _create_digest(
+            username, 'any', seconds, settings, True, prepend, eternal
+        )
+        wildcard_non_admin_digest = _create_digest(
+            username, 'any', seconds, settings, False, prepend, eternal
+        )
+        is_admin = digest in (admin_digest, wildcard_admin_digest,)
+        valid = digest in (
+            admin_digest, non_admin_digest, wildcard_admin_digest,
+            wildcard_non_admin_digest,
+        )
+    if not valid:
         return (True, False, False, restrictions)
 
     if eternal:
         if settings.get('eternal_users', None) is None or username not in \
                 settings['eternal_users']:
             return (True, False, False, restrictions)
-    elif (datetime.now() - datetime.utcfromtimestamp(0)).total_seconds() - \
-            seconds - settings['cookie_life'] >= 0:
-        return (True, False, False, restrictions)
-
-    is_admin = digest in (admin_digest, wildcard_admin_digest,)
+        expires = None
+    else:
+        expires = seconds + settings['cookie_life']
+        if _now_seconds() - expires >= 0:
+            return (True, False, False, restrictions)
 
+    _verified_cookies.set(
+        cache_key, settings, expires, (username, is_admin, dict(restrictions))
+    )
     return (True, username, is_admin, restrictions)
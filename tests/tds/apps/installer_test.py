@@ -0,0 +1,144 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import StringIO
+import unittest
+
+from mock import Mock, patch
+
+from tds.apps.installer import Installer
+
+
+def make_deployment(dep_id, tiers=(), hosts=(), env_id=1):
+    """
+    Return a queued deployment to the given tier IDs and host IDs, all in
+    environment env_id.
+    """
+    return Mock(
+        id=dep_id,
+        app_deployments=[Mock(app_id=tier_id, environment_id=env_id)
+                         for tier_id in tiers],
+        host_deployments=[Mock(host_id=host_id,
+                               host=Mock(environment_id=env_id))
+                          for host_id in hosts],
+    )
+
+
+class TestFindDeployments(unittest.TestCase):
+    def setUp(self):
+        self.installer = Installer.__new__(Installer)
+        self.queued = list()
+        patch.object(self.installer, 'queued_deployments_query',
+                     return_value=self.queued).start()
+        patch('tds.model.Deployment',
+              side_effect=lambda delegate: delegate).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def find(self, ongoing=None, **kwargs):
+        return [
+            deployment.id for deployment, _targets in
+            self.installer.find_deployments(ongoing, **kwargs)
+        ]
+
+    def test_disjoint_deployments_start_together(self):
+        self.queued.extend([
+            make_deployment(1, tiers=[10]),
+            make_deployment(2, tiers=[11], hosts=[100]),
+            make_deployment(3, hosts=[101]),
+        ])
+        self.assertEqual(self.find(), [1, 2, 3])
+
+    def test_overlapping_deployment_waits(self):
+        self.queued.extend([
+            make_deployment(1, tiers=[10]),
+            make_deployment(2, tiers=[10, 11]),
+            make_deployment(3, tiers=[12]),
+        ])
+        self.assertEqual(self.find(), [1, 3])
+
+    def test_waits_for_ongoing_deployment(self):
+        ongoing = dict(
+            (dep.id, Installer.get_deployment_targets(dep))
+            for dep in [make_deployment(1, hosts=[100])]
+        )
+        self.queued.extend([
+            make_deployment(2, hosts=[100]),
+            make_deployment(3, hosts=[101]),
+        ])
+        self.assertEqual(self.find(ongoing), [3])
+
+    def test_order_kept_behind_held_back_deployment(self):
+        # 3 doesn't conflict with anything running, but must not overtake
+        # 2, which is held back and touches the same tier.
+        ongoing = {1: Installer.get_deployment_targets(
+            make_deployment(1, tiers=[10])
+        )}
+        self.queued.extend([
+            make_deployment(2, tiers=[10, 11]),
+            make_deployment(3, tiers=[11]),
+            make_deployment(4, tiers=[12]),
+        ])
+        self.assertEqual(self.find(ongoing), [4])
+
+    def test_tier_and_host_targets_are_distinct(self):
+        self.queued.extend([
+            make_deployment(1, tiers=[10]),
+            make_deployment(2, hosts=[10]),
+            make_deployment(3, tiers=[10], env_id=2),
+        ])
+        self.assertEqual(self.find(), [1, 2, 3])
+
+    def test_max_deployments(self):
+        self.queued.extend(
+            make_deployment(dep_id, tiers=[dep_id]) for dep_id in range(5)
+        )
+        self.assertEqual(self.find(max_deployments=2), [0, 1])
+        ongoing = {10: frozenset([('tier', 10, 1)])}
+        self.assertEqual(self.find(ongoing, max_deployments=2), [0])
+        ongoing[11] = frozenset([('tier', 11, 1)])
+        self.assertEqual(self.find(ongoing, max_deployments=2), [])
+
+    def test_max_per_environment(self):
+        ongoing = {10: frozenset([('tier', 10, 1)])}
+        self.queued.extend([
+            make_deployment(1, tiers=[1], env_id=1),
+            make_deployment(2, tiers=[2], env_id=2),
+            make_deployment(3, tiers=[3], env_id=2),
+            make_deployment(4, tiers=[4], env_id=3),
+        ])
+        self.assertEqual(self.find(ongoing, max_per_environment=1), [2, 4])
+
+
+class TestServe(unittest.TestCase):
+    def test_reports_each_deployment(self):
+        installer = Installer.__new__(Installer)
+        deployments = {1: Mock(id=1), 3: Mock(id=3)}
+        failed = RuntimeError('salt went away')
+        outfile = StringIO.StringIO()
+        with patch('tagopsdb.Session') as session, \
+                patch.object(installer, 'get_deployment',
+                             side_effect=deployments.get), \
+                patch.object(installer, 'do_serial_deployment',
+                             side_effect=[None, failed]) as deploy:
+            installer.serve(StringIO.StringIO('1\nbad\n2\n3\n'), outfile)
+
+        self.assertEqual(outfile.getvalue(), '1\n2\n3\n')
+        self.assertEqual(
+            [args[0][0] for args in deploy.call_args_list],
+            [deployments[1], deployments[3]]
+        )
+        self.assertEqual(session.close.call_count, 3)
+        self.assertEqual(session.rollback.call_count, 1)
@@ -0,0 +1,203 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+from mock import Mock, patch
+
+import tds.exceptions
+import tds.utils.metrics
+
+from tds.apps.repo_updater import RepoUpdater
+
+
+def make_updater(**attrs):
+    """Return a RepoUpdater set up as by initialize(), without a database."""
+    updater = RepoUpdater(dict())
+    updater._config = {'repo.incoming': '/incoming',
+                      'repo.processing': '/processing',
+                      'repo.repo_location': '/repo'}
+    updater.max_parallel_downloads = 4
+    updater.pipeline_queue_size = 4
+    updater.metrics = tds.utils.metrics.Metrics()
+    updater.metrics_file = None
+    updater.metrics_graphite = None
+    updater.metrics_interval = 3600
+    updater.last_metrics_flush = time.time()
+    updater.last_prune = time.time()
+    updater.index_mode = 'make'
+    updater.index_command = ['createrepo', '--update', '--quiet']
+    updater.index_debounce = 0
+    updater.index_max_delay = 60
+    updater.unindexed = list()
+    updater.first_unindexed = None
+    updater.last_unindexed = None
+    for key, value in attrs.items():
+        setattr(updater, key, value)
+    return updater
+
+
+def make_package(pkg_id, arch='noarch'):
+    return Mock(
+        id=pkg_id, job='myjob', version=str(pkg_id), revision='1',
+        status='pending', created=None,
+        application=Mock(pkg_name='myapp', arch=arch),
+    )
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.packages = [make_package(pkg_id) for pkg_id in range(5)]
+        patch('tagopsdb.Session').start()
+        patch('tagopsdb.Package.find', return_value=self.packages).start()
+        patch('tds.model.Package.get',
+              return_value=Mock(status='completed', created=None)).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def ingest_burst(self, updater, download_time=0):
+        """
+        Run a pass over self.packages, downloading one at a time in
+        download_time seconds each, and return the update_repo mock.
+        """
+        def download(*_args):
+            time.sleep(download_time)
+
+        patch.object(updater, '_download_rpm_for_pkg',
+                     side_effect=download).start()
+        patch.object(updater, '_describe_rpm',
+                     side_effect=lambda name, path: Mock(
+                         arch='noarch', path=path, info=dict(name=name),
+                     )).start()
+        patch.object(updater, 'stage_rpm', return_value=Mock()).start()
+        patch.object(updater, 'publish_rpm', return_value=True).start()
+        return patch.object(updater, 'update_repo').start()
+
+    def test_burst_is_indexed_once(self):
+        updater = make_updater()
+        update_repo = self.ingest_burst(updater)
+        self.assertEqual(updater.run(), 5)
+        self.assertEqual(update_repo.call_count, 1)
+        self.assertEqual(len(update_repo.call_args[0][0]), 5)
+
+    def test_pass_without_debounce_is_indexed_at_its_end(self):
+        updater = make_updater(max_parallel_downloads=1)
+        update_repo = self.ingest_burst(updater, download_time=0.05)
+        updater.run()
+        self.assertEqual(update_repo.call_count, 1)
+        self.assertEqual(len(update_repo.call_args[0][0]), 5)
+
+    def test_burst_waits_for_debounce(self):
+        updater = make_updater(index_debounce=30)
+        update_repo = self.ingest_burst(updater)
+        updater.run()
+        self.assertFalse(update_repo.called)
+        self.assertEqual(len(updater.unindexed), 5)
+        self.assertTrue(updater.index_due(time.time() + 30))
+
+    def test_max_delay_interrupts_pass(self):
+        updater = make_updater(max_parallel_downloads=1, index_max_delay=0)
+        update_repo = self.ingest_burst(updater)
+        updater.run()
+        self.assertEqual(update_repo.call_count, 5)
+
+
+class TestIndexDelay(unittest.TestCase):
+    def add_unindexed(self, updater, when):
+        if not updater.unindexed:
+            updater.first_unindexed = when
+        updater.last_unindexed = when
+        updater.unindexed.append(
+            Mock(rpm=Mock(info=dict()), time_to_available=1.0)
+        )
+
+    def test_nothing_to_index(self):
+        updater = make_updater(index_debounce=10)
+        self.assertIsNone(updater.index_delay(100))
+        self.assertFalse(updater.index_due(100))
+        self.assertFalse(updater.index_overdue(100))
+
+    def test_debounce_restarts_on_arrival(self):
+        updater = make_updater(index_debounce=10, index_max_delay=60)
+        self.add_unindexed(updater, 100)
+        self.assertEqual(updater.index_delay(105), 5)
+        self.add_unindexed(updater, 105)
+        self.assertEqual(updater.index_delay(105), 10)
+        self.assertFalse(updater.index_due(114))
+        self.assertTrue(updater.index_due(115))
+
+    def test_max_delay_bounds_debounce(self):
+        updater = make_updater(index_debounce=10, index_max_delay=20)
+        for when in range(100, 125, 5):
+            self.add_unindexed(updater, when)
+        self.assertEqual(updater.index_delay(118), 2)
+        self.assertFalse(updater.index_overdue(118))
+        self.assertTrue(updater.index_due(120))
+        self.assertTrue(updater.index_overdue(120))
+
+    def test_no_debounce_waits_for_end_of_pass(self):
+        updater = make_updater(index_debounce=0, index_max_delay=60)
+        self.add_unindexed(updater, 100)
+        self.assertTrue(updater.index_due(100))
+        self.assertFalse(updater.index_due(100, ingesting=True))
+        self.assertEqual(updater.index_delay(110, ingesting=True), 50)
+        self.assertTrue(updater.index_due(160, ingesting=True))
+
+    def test_index_repo_clears_queue(self):
+        updater = make_updater(index_debounce=10)
+        self.add_unindexed(updater, 100)
+        with patch('tds.model.Package.get', return_value=None), \
+                patch.object(updater, 'update_repo') as update_repo, \
+                patch.object(updater, 'remove_file'):
+            updater.index_repo()
+        update_repo.assert_called_once_with([])
+        self.assertIsNone(updater.index_delay(200))
+
+
+class TestIndexCommands(unittest.TestCase):
+    def test_make_mode(self):
+        updater = make_updater()
+        self.assertEqual(
+            updater._index_commands([Mock(arch='x86_64')]),
+            [['make', '-C', '/repo']]
+        )
+
+    def test_incremental_mode_indexes_each_arch_once(self):
+        updater = make_updater(index_mode='incremental')
+        rpms = [Mock(arch=arch) for arch in ('x86_64', 'noarch', 'x86_64')]
+        self.assertEqual(
+            updater._index_commands(rpms),
+            [['createrepo', '--update', '--quiet', '/repo/noarch'],
+             ['createrepo', '--update', '--quiet', '/repo/x86_64']]
+        )
+
+    def test_failed_index_is_retried_then_fails_packages(self):
+        updater = make_updater(index_mode='incremental')
+        rpm = Mock(arch='noarch', path='/processing/myapp.rpm')
+        package = Mock(status='processing')
+        error = tds.exceptions.RunProcessError(1, 'createrepo')
+        with patch('tds.utils.run', side_effect=error) as run, \
+                patch('tagopsdb.Session'), \
+                patch('time.sleep'), \
+                patch.object(updater, 'remove_file') as remove_file:
+            updater.update_repo([(rpm, package)])
+        self.assertEqual(run.call_count, 2)
+        run.assert_called_with(
+            ['createrepo', '--update', '--quiet', '/repo/noarch']
+        )
+        self.assertEqual(package.status, 'failed')
+        self.assertEqual(updater.metrics.counters['index.failures'], 1)
+        remove_file.assert_called_once_with('/processing/myapp.rpm')
@@ -0,0 +1,177 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import signal
+import subprocess
+import sys
+import time
+import unittest
+
+from datetime import timedelta
+
+from mock import Mock, patch
+
+from tds.scripts.tds_installer import TDSInstallerDaemon
+
+# Stands in for 'installer.py --worker' (Installer.serve): reports each
+# deployment ID back once done. IDs from 100 up never finish; with the
+# 'stubborn' argument the worker also ignores SIGTERM.
+WORKER = '''
+import signal, sys, time
+if sys.argv[1:] == ['stubborn']:
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+for line in iter(sys.stdin.readline, ''):
+    if int(line) >= 100:
+        time.sleep(60)
+    sys.stdout.write(line)
+    sys.stdout.flush()
+'''
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.app = Mock(config=dict(installer_workers=1), params=dict())
+        self.app.get_deployment.side_effect = \
+            lambda dep_id: self.deployments[dep_id]
+        # Reading a deployment back gets the status its worker left.
+        self.app._refresh.side_effect = \
+            lambda dep: setattr(dep, 'status', self.final_status[dep.id])
+        self.deployments = dict()
+        self.final_status = dict()
+        self.worker_args = []
+        self.started = []
+
+        patch('tagopsdb.Session').start()
+        self.daemon = TDSInstallerDaemon(self.app)
+        patch.object(self.daemon, 'start_worker',
+                     side_effect=self.start_worker).start()
+        self.daemon.configure()
+        self.daemon.deploy_exit_timeout = timedelta(seconds=0)
+        self.app.find_deployments.return_value = []
+
+    def tearDown(self):
+        patch.stopall()
+        for worker in self.started:
+            if worker.poll() is None:
+                worker.kill()
+                worker.wait()
+
+    def start_worker(self):
+        worker = subprocess.Popen(
+            [sys.executable, '-c', WORKER] + self.worker_args,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        self.started.append(worker)
+        return worker
+
+    def deploy(self, dep_id, status='complete'):
+        """
+        Start the deployment, which its worker leaves in the given status,
+        and return the worker.
+        """
+        self.deployments[dep_id] = Mock(id=dep_id, status='queued')
+        self.final_status[dep_id] = status
+        self.daemon.start_deployment(self.deployments[dep_id], frozenset())
+        return self.daemon.ongoing_processes[dep_id][0]
+
+    def wait_for_deployments(self, timeout=10):
+        give_up = time.time() + timeout
+        while self.daemon.ongoing_processes and time.time() < give_up:
+            self.daemon.clean_up_processes()
+            time.sleep(0.01)
+        self.assertEqual(self.daemon.ongoing_processes, dict())
+
+    def test_workers_start_with_first_run(self):
+        # Before run_callback the daemon may be a standby without the lock.
+        self.assertEqual(self.started, [])
+        self.assertEqual(self.daemon.idle_workers, [])
+        self.daemon.run_callback()
+        self.assertEqual(self.daemon.idle_workers, self.started)
+        self.assertEqual(len(self.started), 1)
+
+    def test_worker_is_reused(self):
+        self.daemon.run_callback()
+        self.assertEqual(len(self.daemon.idle_workers), 1)
+        first = self.deploy(1)
+        self.assertEqual(self.daemon.idle_workers, [])
+        self.wait_for_deployments()
+        self.assertEqual(self.daemon.idle_workers, [first])
+
+        second = self.deploy(2)
+        self.wait_for_deployments()
+        self.assertIs(second, first)
+        self.assertEqual(len(self.started), 1)
+        self.assertIsNone(first.poll())
+        self.assertEqual(self.deployments[1].status, 'complete')
+        self.assertEqual(self.deployments[2].status, 'complete')
+        self.assertTrue(self.daemon.check_queue)
+
+    def test_extra_worker_is_retired(self):
+        self.daemon.run_callback()
+        first = self.deploy(1)
+        # The pool is empty, so this one needs a new worker.
+        second = self.deploy(2)
+        self.assertIsNot(second, first)
+        self.wait_for_deployments()
+        self.assertEqual(len(self.daemon.idle_workers), 1)
+        retired = [worker for worker in (first, second)
+                   if worker not in self.daemon.idle_workers]
+        self.assertEqual(len(retired), 1)
+        self.assertTrue(retired[0].stdin.closed)
+
+        self.daemon.stop_workers()
+        for worker in (first, second):
+            self.assertIsNotNone(worker.poll())
+        self.assertEqual(self.daemon.idle_workers, [])
+        self.assertEqual(self.daemon.retired_workers, [])
+
+    def check_timeout(self, signum):
+        self.daemon.threshold = timedelta(seconds=1)
+        with patch('tds.scripts.tds_installer.log') as log:
+            worker = self.deploy(100, status='inprogress')
+            self.wait_for_deployments()
+        log.warning.assert_any_call(
+            'Deployment ID 100 exited from signal %d' % signum
+        )
+
+        self.assertNotIn(worker, self.daemon.idle_workers)
+        self.assertTrue(worker.stdin.closed)
+        self.assertEqual(self.deployments[100].status, 'failed')
+        self.assertTrue(self.app.commit_session.called)
+
+        # A new worker takes the next deployment.
+        self.daemon.threshold = timedelta(minutes=30)
+        self.daemon.fill_worker_pool()
+        self.assertIsNot(self.deploy(1), worker)
+        self.wait_for_deployments()
+        self.assertEqual(self.deployments[1].status, 'complete')
+
+    def test_timed_out_worker_is_terminated(self):
+        self.daemon.deploy_exit_timeout = timedelta(seconds=5)
+        self.check_timeout(signal.SIGTERM)
+
+    def test_stubborn_worker_is_killed(self):
+        self.worker_args = ['stubborn']
+        self.check_timeout(signal.SIGKILL)
+
+    def test_dead_idle_worker_is_replaced(self):
+        self.daemon.run_callback()
+        idle = self.daemon.idle_workers[0]
+        idle.kill()
+        idle.wait()
+        worker = self.deploy(1)
+        self.assertIsNot(worker, idle)
+        self.wait_for_deployments()
+        self.daemon.reap_workers()
+        self.assertEqual(self.daemon.retired_workers, [])
@@ -0,0 +1,182 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests.exceptions
+
+from tds.exceptions import ChecksumMismatchError
+from tds.utils.artifact_cache import ArtifactCache
+from tds.utils.metrics import Metrics
+
+DATA = 'rpm data ' * 1000
+DATA_MD5 = hashlib.md5(DATA).hexdigest()
+
+
+class FakeResponse(object):
+    def __init__(self, url, status_code, body, headers=None, fail_after=None,
+                 error=requests.exceptions.ConnectionError):
+        self.url = url
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.fail_after = fail_after
+        self.error = error
+
+    def iter_content(self, chunk_size):
+        for idx in range(0, len(self.body), 100):
+            if self.fail_after is not None and idx >= self.fail_after:
+                raise self.error('connection reset')
+            yield self.body[idx:idx + 100]
+
+    def close(self):
+        pass
+
+
+class FakeSession(object):
+    """Serve DATA at any URL, honoring Range headers."""
+
+    def __init__(self, fail_after=None, body=DATA,
+                 error=requests.exceptions.ConnectionError):
+        self.fail_after = fail_after
+        self.body = body
+        self.error = error
+        self.requests = []
+        self.timeouts = []
+
+    def get(self, url, stream=False, headers=None, timeout=None):
+        headers = headers or {}
+        self.requests.append(headers)
+        self.timeouts.append(timeout)
+        fail_after, self.fail_after = self.fail_after, None
+        if 'Range' in headers:
+            start = int(headers['Range'][len('bytes='):-1])
+            if start >= len(self.body):
+                return FakeResponse(url, 416, '')
+            return FakeResponse(
+                url, 206, self.body[start:],
+                {'Content-Range': 'bytes %d-%d/%d' % (
+                    start, len(self.body) - 1, len(self.body)
+                )},
+                fail_after, self.error,
+            )
+        return FakeResponse(url, 200, self.body, fail_after=fail_after,
+                            error=self.error)
+
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fetch_and_dedup(self):
+        session = FakeSession()
+        cache = ArtifactCache(self.cache_dir, session)
+        path = cache.fetch('http://jenkins/a.rpm', DATA_MD5)
+        self.assertEqual(path, cache.path_for(DATA_MD5))
+        self.assertEqual(open(path).read(), DATA)
+
+        self.assertEqual(cache.fetch('http://jenkins/b.rpm', DATA_MD5), path)
+        self.assertEqual(len(session.requests), 1)
+
+    def test_resume_after_interruption(self):
+        session = FakeSession(fail_after=500)
+        metrics = Metrics()
+        cache = ArtifactCache(self.cache_dir, session, metrics)
+        self.assertRaises(
+            requests.exceptions.ConnectionError,
+            cache.fetch, 'http://jenkins/a.rpm', DATA_MD5
+        )
+        path = cache.fetch('http://jenkins/a.rpm', DATA_MD5)
+        self.assertEqual(session.requests[-1], {'Range': 'bytes=500-'})
+        self.assertEqual(open(path).read(), DATA)
+        # Resuming doesn't download the first 500 bytes again
+        self.assertEqual(metrics.counters['download.bytes'], len(DATA))
+
+    def test_resume_after_timeout(self):
+        session = FakeSession(fail_after=500,
+                              error=requests.exceptions.Timeout)
+        cache = ArtifactCache(self.cache_dir, session, timeout=5)
+        self.assertRaises(
+            requests.exceptions.Timeout,
+            cache.fetch, 'http://jenkins/a.rpm', DATA_MD5
+        )
+        partial = cache._partial_path('http://jenkins/a.rpm', DATA_MD5)
+        self.assertEqual(os.path.getsize(partial), 500)
+
+        path = cache.fetch('http://jenkins/a.rpm', DATA_MD5)
+        self.assertEqual(session.requests[-1], {'Range': 'bytes=500-'})
+        self.assertEqual(session.timeouts, [5, 5])
+        self.assertEqual(open(path).read(), DATA)
+        self.assertFalse(os.path.exists(partial))
+
+    def test_checksum_mismatch(self):
+        cache = ArtifactCache(self.cache_dir, FakeSession())
+        self.assertRaises(
+            ChecksumMismatchError,
+            cache.fetch, 'http://jenkins/a.rpm', '0' * 32
+        )
+        self.assertEqual(os.listdir(cache.partial_dir), [])
+
+    def test_unknown_checksum(self):
+        cache = ArtifactCache(self.cache_dir, FakeSession())
+        self.assertEqual(
+            cache.fetch('http://jenkins/a.rpm'), cache.path_for(DATA_MD5)
+        )
+
+    def test_link_and_prune(self):
+        cache = ArtifactCache(self.cache_dir, FakeSession())
+        path = cache.fetch('http://jenkins/a.rpm', DATA_MD5)
+        dest = os.path.join(self.tmpdir, 'a.rpm')
+        cache.link(path, dest)
+        self.assertEqual(os.stat(dest).st_ino, os.stat(path).st_ino)
+
+        cache.prune(-1)
+        self.assertTrue(os.path.isfile(path))
+        os.unlink(dest)
+        cache.prune(-1)
+        self.assertFalse(os.path.isfile(path))
+
+    def test_download_locks_are_bounded(self):
+        cache = ArtifactCache(self.cache_dir, FakeSession())
+        for idx in range(500):
+            cache.fetch('http://jenkins/%d.rpm' % idx)
+        self.assertEqual(len(cache._locks), cache.lock_stripes)
+        partial = cache._partial_path('http://jenkins/a.rpm', DATA_MD5)
+        self.assertIs(cache._lock_for(partial), cache._lock_for(partial))
+
+    def test_link_keeps_artifact_mtime(self):
+        cache = ArtifactCache(self.cache_dir, FakeSession())
+        path = cache.fetch('http://jenkins/a.rpm', DATA_MD5)
+        os.utime(path, (1000, 1000))
+        dest = os.path.join(self.tmpdir, 'a.rpm')
+        cache.link(path, dest)
+        cache.link(path, dest)
+        self.assertEqual(os.stat(dest).st_mtime, 1000)
+
+        # The link still counts as a use: only a stale stamp lets it go.
+        os.unlink(dest)
+        cache.prune(3600)
+        self.assertTrue(os.path.isfile(path))
+        os.utime(cache._stamp_path(path), (1000, 1000))
+        cache.prune(3600)
+        self.assertFalse(os.path.isfile(path))
+        self.assertEqual(os.listdir(cache.used_dir), [])
@@ -0,0 +1,149 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import requests.exceptions
+
+from tds.utils.jenkins import JenkinsClient
+
+BUILD = dict(
+    number=3,
+    url='http://jenkins/job/myjob/3/',
+    building=False,
+    artifacts=[dict(fileName='myapp-3-1.noarch.rpm',
+                    relativePath='out/myapp-3-1.noarch.rpm')],
+    fingerprint=[dict(fileName='myapp-3-1.noarch.rpm', hash='abc123')],
+    actions=[{}, dict(lastBuiltRevision=dict(SHA1='deadbeef'))],
+    runs=[dict(number=3, url='http://jenkins/job/myjob/arch=x86_64/3/'),
+          dict(number=2, url='http://jenkins/job/myjob/arch=i386/2/')],
+)
+
+
+class FakeResponse(object):
+    def __init__(self, data):
+        self.data = data
+        self.status_code = 200 if data is not None else 404
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeSession(object):
+    def __init__(self, builds, fail=0):
+        self.builds = builds
+        self.urls = []
+        self.fail = fail
+        self.closed = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.urls.append(url)
+        if self.fail:
+            self.fail -= 1
+            raise requests.exceptions.ConnectionError('connection reset')
+        return FakeResponse(self.builds.get(url))
+
+    def close(self):
+        self.closed += 1
+
+
+class TestJenkinsClient(unittest.TestCase):
+    def test_build_is_cached(self):
+        session = FakeSession({'http://jenkins/job/myjob/3/api/json': BUILD})
+        client = JenkinsClient('http://jenkins/', session=session)
+
+        build = client.get_build('myjob', 3)
+        self.assertEqual(
+            build.artifacts['myapp-3-1.noarch.rpm'],
+            'http://jenkins/job/myjob/3/artifact/out/myapp-3-1.noarch.rpm'
+        )
+        self.assertEqual(build.revision, 'deadbeef')
+        self.assertEqual(
+            client.get_fingerprint_md5('myjob', '3', 'myapp-3-1.noarch.rpm'),
+            'abc123'
+        )
+        self.assertEqual(len(session.urls), 1)
+
+    def test_expired_and_unfinished_builds_are_fetched_again(self):
+        building = dict(BUILD, building=True)
+        session = FakeSession(
+            {'http://jenkins/job/myjob/3/api/json': building}
+        )
+        client = JenkinsClient('http://jenkins', session=session)
+        client.get_build('myjob', 3)
+        client.get_build('myjob', 3)
+        self.assertEqual(len(session.urls), 2)
+
+        session.builds['http://jenkins/job/myjob/3/api/json'] = BUILD
+        client.ttl = -1
+        client.get_build('myjob', 3)
+        client.get_build('myjob', 3)
+        self.assertEqual(len(session.urls), 4)
+
+    def test_missing_build(self):
+        client = JenkinsClient('http://jenkins', session=FakeSession({}))
+        self.assertIsNone(client.get_build('myjob', 3))
+        self.assertIsNone(client.get_revision('myjob', 3))
+
+    def test_matrix_run(self):
+        session = FakeSession({
+            'http://jenkins/job/myjob/3/api/json': BUILD,
+            'http://jenkins/job/myjob/arch=x86_64/3/api/json': dict(
+                BUILD, url='http://jenkins/job/myjob/arch=x86_64/3/',
+                runs=[],
+            ),
+        })
+        client = JenkinsClient('http://jenkins', session=session)
+        run = client.get_build('myjob/arch=x86_64', 3)
+        self.assertEqual(run.url, 'http://jenkins/job/myjob/arch=x86_64/3/')
+        # Only runs of the same build number count
+        self.assertIsNone(client.get_build('myjob/arch=i386', 3))
+
+    def test_cache_is_bounded(self):
+        session = FakeSession(dict(
+            ('http://jenkins/job/myjob/%d/api/json' % number,
+             dict(BUILD, number=number))
+            for number in range(5)
+        ))
+        client = JenkinsClient('http://jenkins', max_entries=2,
+                               session=session)
+        for number in (0, 1, 0, 2, 0, 1):
+            client.get_build('myjob', number)
+        # 1 was evicted by 2, as 0 was used more recently
+        self.assertEqual(len(session.urls), 4)
+
+    def test_job_exists(self):
+        session = FakeSession({'http://jenkins/job/myjob/api/json': {}})
+        client = JenkinsClient('http://jenkins', session=session)
+        self.assertTrue(client.job_exists('myjob'))
+        self.assertTrue(client.job_exists('myjob'))
+        self.assertFalse(client.job_exists('other'))
+        self.assertEqual(len(session.urls), 2)
+
+    def test_reconnect(self):
+        session = FakeSession(
+            {'http://jenkins/job/myjob/3/api/json': BUILD}, fail=1
+        )
+        client = JenkinsClient('http://jenkins', session=session)
+        self.assertEqual(client.get_build('myjob', 3).number, 3)
+        self.assertEqual(session.closed, 1)
+
+        session.fail = 2
+        self.assertRaises(
+            requests.exceptions.ConnectionError,
+            client.get_build, 'myjob', 4
+        )
@@ -0,0 +1,63 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from tds.utils.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.increment('download.retries')
+        self.metrics.increment('download.retries', 2)
+        for value in (0.3, 4, 7000):
+            self.metrics.observe('index.make', value, bounds=(1, 10))
+
+    def test_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'download.retries': 3})
+        histogram = snapshot['histograms']['index.make']
+        self.assertEqual(histogram['count'], 3)
+        self.assertEqual(histogram['min'], 0.3)
+        self.assertEqual(histogram['max'], 7000)
+        self.assertEqual(histogram['buckets'], [[1, 1], [10, 2]])
+
+    def test_write(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'metrics.json')
+            self.metrics.write(path)
+            self.assertEqual(os.listdir(tmpdir), ['metrics.json'])
+            with open(path) as metrics_file:
+                data = json.load(metrics_file)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(data['counters'], {'download.retries': 3})
+
+    def test_flatten(self):
+        self.assertEqual(
+            dict(self.metrics.flatten('repo_updater.')),
+            {
+                'repo_updater.download.retries': 3,
+                'repo_updater.index.make.count': 3,
+                'repo_updater.index.make.sum': 7004.3,
+                'repo_updater.index.make.mean': 7004.3 / 3,
+                'repo_updater.index.make.max': 7000,
+            }
+        )
@@ -0,0 +1,137 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+
+from mock import Mock, patch
+
+import tds.utils.queue_signal as queue_signal
+
+
+class TestLocalQueueSignal(unittest.TestCase):
+    def test_wait_times_out(self):
+        signal = queue_signal.LocalQueueSignal()
+        self.assertFalse(signal.wait(0.01))
+
+    def test_notify_wakes_waiter_once(self):
+        signal = queue_signal.LocalQueueSignal()
+        timer = threading.Timer(0.01, signal.notify)
+        timer.start()
+        self.assertTrue(signal.wait(5))
+        timer.join()
+        self.assertFalse(signal.wait(0))
+
+
+class TestZooKeeperQueueSignal(unittest.TestCase):
+    def test_notify_sets_znode(self):
+        zoo = Mock()
+        queue_signal.ZooKeeperQueueSignal(zoo, '/queue').notify()
+        zoo.ensure_path.assert_called_once_with('/queue')
+        zoo.set.assert_called_once_with('/queue', b'')
+        self.assertFalse(zoo.DataWatch.called)
+
+    def test_watch_wakes_waiter(self):
+        zoo = Mock()
+        signal = queue_signal.ZooKeeperQueueSignal(zoo, '/queue', watch=True)
+        path, callback = zoo.DataWatch.call_args[0]
+        self.assertEqual(path, '/queue')
+        callback('', Mock())
+        self.assertTrue(signal.wait(0))
+
+
+class TestBackoff(unittest.TestCase):
+    def test_doubles_up_to_maximum(self):
+        backoff = queue_signal.Backoff(1, 5)
+        self.assertEqual(
+            [backoff.next() for _i in range(5)], [1, 2, 4, 5, 5]
+        )
+
+    def test_reset(self):
+        backoff = queue_signal.Backoff(1, 5)
+        backoff.next()
+        backoff.next()
+        self.assertEqual(backoff.reset(), 1)
+        self.assertEqual(backoff.next(), 1)
+
+
+class TestNotifyQueued(unittest.TestCase):
+    def test_without_zookeeper(self):
+        self.assertIsNone(queue_signal.notify_queued(None))
+
+    def test_uses_shared_notifier(self):
+        with patch.object(queue_signal, 'get_notifier') as get_notifier:
+            queue_signal.notify_queued(['zk1', 'zk2'], '/queue')
+        get_notifier.assert_called_once_with(['zk1', 'zk2'])
+        get_notifier.return_value.notify.assert_called_once_with('/queue')
+
+    def test_get_notifier(self):
+        with patch.dict(queue_signal._notifiers, clear=True), \
+                patch('atexit.register') as register:
+            notifier = queue_signal.get_notifier(['zk1', 'zk2'])
+            self.assertIs(queue_signal.get_notifier(['zk1', 'zk2']), notifier)
+            self.assertIsNot(queue_signal.get_notifier(['zk3']), notifier)
+        self.assertEqual(notifier.hosts, 'zk1,zk2')
+        register.assert_any_call(notifier.flush, 2)
+
+
+class TestQueueNotifier(unittest.TestCase):
+    def setUp(self):
+        self.create_client = patch.object(
+            queue_signal.QueueNotifier, '_create_client'
+        ).start()
+        self.zoo = self.create_client.return_value
+        self.addCleanup(patch.stopall)
+
+    def test_connection_is_reused(self):
+        notifier = queue_signal.QueueNotifier(['zk1', 'zk2'])
+        notifier.notify('/queue')
+        notifier.notify('/other')
+        self.assertTrue(notifier.flush(5))
+
+        self.assertEqual(self.create_client.call_count, 1)
+        self.zoo.start.assert_called_once_with(timeout=1)
+        self.assertEqual(
+            [args[0] for args in self.zoo.set.call_args_list],
+            [('/queue', b''), ('/other', b'')]
+        )
+        self.assertFalse(self.zoo.stop.called)
+
+    def test_notify_does_not_wait(self):
+        connecting = threading.Event()
+        self.zoo.start.side_effect = lambda timeout: connecting.wait(5)
+        notifier = queue_signal.QueueNotifier(['zk1'])
+        notifier.notify('/queue')
+        self.assertFalse(notifier.flush(0.01))
+        connecting.set()
+        self.assertTrue(notifier.flush(5))
+        self.zoo.set.assert_called_once_with('/queue', b'')
+
+    def test_unreachable_zookeeper(self):
+        self.zoo.start.side_effect = Exception('timed out')
+        notifier = queue_signal.QueueNotifier(['zk1'], retry_interval=60)
+        notifier.notify('/queue')
+        notifier.notify('/queue')
+        self.assertTrue(notifier.flush(5))
+        # The second notification was dropped without trying to connect.
+        self.assertEqual(self.zoo.start.call_count, 1)
+        self.assertEqual(self.zoo.close.call_count, 1)
+        self.assertIsNone(notifier.zoo)
+
+        notifier.retry_after = 0
+        self.zoo.start.side_effect = None
+        notifier.notify('/queue')
+        self.assertTrue(notifier.flush(5))
+        self.assertEqual(self.zoo.start.call_count, 2)
+        self.zoo.set.assert_called_once_with('/queue', b'')
@@ -0,0 +1,94 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os.path
+import shutil
+import struct
+import tempfile
+import unittest
+
+from mock import patch
+
+from tds.utils.rpm import RPMDescriptor, RPMHeaderProvider, RPMQueryProvider
+
+
+def make_header(entries):
+    """Build an RPM header structure from (tag, type, value) entries."""
+    index = data = ''
+    for tag, tag_type, value in entries:
+        index += struct.pack('>iiii', tag, tag_type, len(data), 1)
+        data += value
+    return (struct.pack('>4s4xII', '\x8e\xad\xe8\x01', len(entries),
+                        len(data)) + index + data)
+
+
+def make_rpm(name='myapp', version='123', release='1', arch='noarch'):
+    """Build the start of an RPM file with the given header fields."""
+    lead = '\xed\xab\xee\xdb' + '\0' * 92
+    # Odd data size so the signature needs padding
+    signature = make_header([(1000, 7, 'abcde')]) + '\0' * 3
+    header = make_header([
+        (1000, 6, name + '\0'),
+        (1001, 6, version + '\0'),
+        (1002, 6, release + '\0'),
+        (1004, 9, 'An application\0'),
+        (1009, 4, '\0\0\0\1'),
+        (1022, 6, arch + '\0'),
+    ])
+    return lead + signature + header + 'payload'
+
+
+class TestRPMHeaderProvider(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as fobj:
+            fobj.write(data)
+        return path
+
+    def test_query(self):
+        path = self.write('myapp-123-1.noarch.rpm', make_rpm())
+        self.assertEqual(
+            RPMHeaderProvider.query(path, RPMDescriptor.query_fields),
+            [('arch', 'noarch'), ('name', 'myapp'), ('version', '123'),
+             ('release', '1')]
+        )
+
+    def test_invalid_files(self):
+        rpm = make_rpm()
+        for data in ('', 'not an rpm' * 20, rpm[:150], rpm[:-20]):
+            path = self.write('bad.rpm', data)
+            self.assertIsNone(
+                RPMHeaderProvider.query(path, RPMDescriptor.query_fields)
+            )
+
+    def test_from_directory_falls_back_to_rpm(self):
+        good = self.write('myapp-123-1.noarch.rpm', make_rpm())
+        other = self.write('other.rpm', 'not an rpm')
+        self.write('README', 'not an rpm either')
+
+        with patch.object(RPMQueryProvider, 'query',
+                          return_value=None) as query:
+            rpms = RPMDescriptor.from_directory(self.tmpdir)
+
+        query.assert_called_once_with(other, RPMDescriptor.query_fields)
+        self.assertEqual(sorted(rpms), [good, other])
+        self.assertEqual(rpms[good].info,
+                         dict(name='myapp', version='123', revision='1'))
+        self.assertIsNone(rpms[other])
@@ -0,0 +1,84 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import unittest
+
+from datetime import datetime
+
+from mock import patch
+
+from tds.views.json_encoder import TDSEncoder
+from tds.views.rest.base import JSONArrayIter
+
+
+def make_objs(count):
+    return [
+        dict(id=idx, name=u'app-\xe9%d' % idx, created=datetime(2016, 1, 1))
+        for idx in range(count)
+    ]
+
+
+class TestJSONArrayIter(unittest.TestCase):
+    def setUp(self):
+        self.session = patch('tagopsdb.Session').start()
+        self.addCleanup(patch.stopall)
+
+    def stream(self, objs, to_json_obj=lambda obj: obj,
+               chunk_size=64 * 1024):
+        return list(JSONArrayIter(objs, to_json_obj, chunk_size))
+
+    def test_same_body_as_json_dumps(self):
+        for count, chunk_size, min_chunks in ((0, 100, 1), (1, 100, 1),
+                                              (50, 100, 10)):
+            objs = make_objs(count)
+            chunks = self.stream(iter(objs), chunk_size=chunk_size)
+            self.assertEqual(''.join(chunks),
+                             json.dumps(objs, cls=TDSEncoder))
+            self.assertGreaterEqual(len(chunks), min_chunks)
+        self.assertEqual(self.session.remove.call_count, 3)
+
+    def test_objects_are_converted_while_streaming(self):
+        converted = list()
+
+        def to_json_obj(obj):
+            converted.append(obj['id'])
+            return obj
+
+        objs = make_objs(10)
+        app_iter = iter(JSONArrayIter(objs, to_json_obj, 1))
+        self.assertEqual(converted, [0])
+        self.assertEqual(
+            next(app_iter),
+            '[%s, %s' % (json.dumps(objs[0], cls=TDSEncoder),
+                         json.dumps(objs[1], cls=TDSEncoder))
+        )
+        self.assertEqual(converted, [0, 1])
+
+    def test_error_before_response_is_started(self):
+        def to_json_obj(_obj):
+            raise ValueError('bad row')
+
+        self.assertRaises(ValueError, JSONArrayIter, make_objs(2), to_json_obj)
+
+    def test_error_while_streaming(self):
+        def to_json_obj(obj):
+            if obj['id'] == 2:
+                raise ValueError('bad row')
+            return obj
+
+        app_iter = iter(JSONArrayIter(make_objs(3), to_json_obj, 1))
+        next(app_iter)
+        self.assertRaises(ValueError, next, app_iter)
+        self.assertEqual(self.session.remove.call_count, 1)
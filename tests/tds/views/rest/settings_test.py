@@ -0,0 +1,98 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import os.path
+import shutil
+import signal
+import tempfile
+import unittest
+
+from mock import patch
+
+import tds.exceptions
+import tds.views.rest.settings as rest_settings
+
+
+class TestSettingsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.conf_dir)
+        self.write('deploy.yml', 'secret_key: secret\ncookie_life: 3600\n')
+        self.write('tds_rest.yml', 'cookie_life: 60\n')
+        self.registry = rest_settings.SettingsRegistry(
+            local_path=os.path.join(self.conf_dir, 'missing.yml'),
+            conf_dir=self.conf_dir,
+        )
+        self.load_settings = patch.object(
+            rest_settings, 'load_settings', wraps=rest_settings.load_settings
+        ).start()
+        self.addCleanup(patch.stopall)
+
+    def write(self, name, content, mtime=None):
+        path = os.path.join(self.conf_dir, name)
+        with open(path, 'w') as settings_file:
+            settings_file.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_loaded_once(self):
+        settings = self.registry.get()
+        self.assertEqual(settings['secret_key'], 'secret')
+        self.assertEqual(settings['cookie_life'], 60)
+        for _idx in range(3):
+            self.assertIs(self.registry.get(), settings)
+        self.assertEqual(self.load_settings.call_count, 1)
+
+    def test_reloaded_after_change(self):
+        self.write('tds_rest.yml', 'cookie_life: 60\n', mtime=1000)
+        settings = self.registry.get()
+        # Same size, only the modification time differs
+        self.write('tds_rest.yml', 'cookie_life: 90\n', mtime=2000)
+        new_settings = self.registry.get()
+        self.assertIsNot(new_settings, settings)
+        self.assertEqual(new_settings['cookie_life'], 90)
+        self.assertIs(self.registry.get(), new_settings)
+        self.assertEqual(self.load_settings.call_count, 2)
+
+    def test_reloaded_on_request(self):
+        settings = self.registry.get()
+        self.registry.request_reload()
+        self.assertIsNot(self.registry.get(), settings)
+        self.registry.get()
+        self.assertEqual(self.load_settings.call_count, 2)
+
+    def test_reloaded_after_sighup(self):
+        previous = signal.getsignal(signal.SIGHUP)
+        self.addCleanup(signal.signal, signal.SIGHUP, previous)
+        patch.object(rest_settings, 'registry', self.registry).start()
+
+        rest_settings.install_reload_handler()
+        settings = rest_settings.get_settings()
+        self.assertIs(rest_settings.get_settings(), settings)
+        os.kill(os.getpid(), signal.SIGHUP)
+        self.assertIsNot(rest_settings.get_settings(), settings)
+        self.assertEqual(self.load_settings.call_count, 2)
+
+    def test_missing_settings(self):
+        os.remove(os.path.join(self.conf_dir, 'deploy.yml'))
+        self.assertRaises(tds.exceptions.ConfigurationError,
+                          self.registry.get)
+
+    def test_local_settings(self):
+        self.registry.local_path = os.path.join(self.conf_dir, 'local.yml')
+        self.write('local.yml', 'secret_key: local\n')
+        settings = self.registry.get()
+        self.assertEqual(settings['secret_key'], 'local')
+        self.assertEqual(settings['url_prefix'], '')
@@ -0,0 +1,157 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from mock import Mock, patch
+
+import tds.views.rest.utils as rest_utils
+
+SETTINGS = {'secret_key': 'secret', 'cookie_life': 3600}
+
+
+def make_request(cookie, addr='10.0.0.1'):
+    return Mock(cookies={'session': cookie}, headers={}, remote_addr=addr)
+
+
+def issued(cookie):
+    return int(dict(
+        pair.split('=', 1) for pair in cookie.split('&')
+    )['issued'])
+
+
+class TestValidateCookie(unittest.TestCase):
+    def setUp(self):
+        patch.object(rest_utils, '_verified_cookies',
+                     rest_utils.VerifiedCookieCache()).start()
+        self.create_digest = patch.object(
+            rest_utils, '_create_digest', wraps=rest_utils._create_digest
+        ).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def validate(self, cookie, settings=SETTINGS, addr='10.0.0.1'):
+        self.create_digest.reset_mock()
+        return rest_utils.validate_cookie(make_request(cookie, addr), settings)
+
+    def test_valid_cookie(self):
+        cookie = rest_utils._create_cookie('me', '10.0.0.1', SETTINGS, True,
+                                           '')
+        self.assertEqual(self.validate(cookie), (True, 'me', True, dict()))
+        self.assertEqual(self.validate(cookie, addr='10.0.0.2'),
+                         (True, False, False, dict()))
+
+    def test_wildcard_cookie(self):
+        cookie = rest_utils._create_cookie('me', 'any', SETTINGS, False, '')
+        self.assertEqual(self.validate(cookie, addr='10.0.0.2'),
+                         (True, 'me', False, dict()))
+
+    def test_changed_flags_are_rejected(self):
+        cookie = rest_utils._create_cookie('me', '10.0.0.1', SETTINGS, False,
+                                           '')
+        for forged in (cookie.replace('admin=False', 'admin=True'),
+                       cookie.replace('wildcard=False', 'wildcard=True')):
+            self.assertNotEqual(forged, cookie)
+            self.assertEqual(self.validate(forged, addr='10.0.0.1'),
+                             (True, False, False, dict()))
+            self.assertEqual(self.validate(forged, addr='10.0.0.2'),
+                             (True, False, False, dict()))
+
+    def test_single_digest_checked(self):
+        cookie = rest_utils._create_cookie('me', '10.0.0.1', SETTINGS, False,
+                                           '')
+        self.validate(cookie)
+        self.assertEqual(self.create_digest.call_count, 1)
+
+    def test_old_cookie_without_flags(self):
+        for addr, is_admin in (('10.0.0.1', True), ('any', False)):
+            cookie = rest_utils._create_cookie('me', addr, SETTINGS, is_admin,
+                                               'environments=1&')
+            old_cookie = cookie.split('&admin=')[0] + '&digest=' + \
+                cookie.split('&digest=')[1]
+            self.assertEqual(
+                self.validate(old_cookie),
+                (True, 'me', is_admin, dict(environments='1'))
+            )
+            self.assertEqual(self.create_digest.call_count, 4)
+
+    def test_verified_cookie_is_cached(self):
+        cookie = rest_utils._create_cookie('me', '10.0.0.1', SETTINGS, False,
+                                           '')
+        self.validate(cookie)
+        self.assertEqual(self.validate(cookie), (True, 'me', False, dict()))
+        self.assertFalse(self.create_digest.called)
+
+    def test_cached_cookie_expires(self):
+        cookie = rest_utils._create_cookie('me', '10.0.0.1', SETTINGS, False,
+                                           '')
+        expires = issued(cookie) + SETTINGS['cookie_life']
+        with patch.object(rest_utils, '_now_seconds',
+                          return_value=expires - 1):
+            self.assertEqual(self.validate(cookie),
+                             (True, 'me', False, dict()))
+            self.assertEqual(self.validate(cookie),
+                             (True, 'me', False, dict()))
+            self.assertFalse(self.create_digest.called)
+        with patch.object(rest_utils, '_now_seconds', return_value=expires):
+            self.assertEqual(self.validate(cookie),
+                             (True, False, False, dict()))
+            self.assertTrue(self.create_digest.called)
+
+    def test_cache_ignored_with_new_settings(self):
+        cookie = rest_utils._create_cookie('me', '10.0.0.1', SETTINGS, False,
+                                           '')
+        self.validate(cookie)
+        self.assertEqual(self.validate(cookie, dict(SETTINGS)),
+                         (True, 'me', False, dict()))
+        self.assertTrue(self.create_digest.called)
+        self.assertEqual(
+            self.validate(cookie, dict(SETTINGS, secret_key='other')),
+            (True, False, False, dict())
+        )
+
+    def test_restrictions_are_copied(self):
+        cookie = rest_utils._create_cookie('me', '10.0.0.1', SETTINGS, False,
+                                           'environments=1&methods=GET&')
+        expected = dict(environments='1', methods='GET')
+        for _idx in range(2):
+            restrictions = self.validate(cookie)[3]
+            self.assertEqual(restrictions, expected)
+            restrictions['environments'] = '2'
+            del restrictions['methods']
+
+
+class TestVerifiedCookieCache(unittest.TestCase):
+    def test_expiry(self):
+        cache = rest_utils.VerifiedCookieCache()
+        cache.set('key', SETTINGS, 100, 'result')
+        self.assertEqual(cache.get('key', SETTINGS, 99), 'result')
+        self.assertIsNone(cache.get('key', SETTINGS, 100))
+        cache.set('key', SETTINGS, None, 'result')
+        self.assertEqual(cache.get('key', SETTINGS, 1e12), 'result')
+
+    def test_other_settings(self):
+        cache = rest_utils.VerifiedCookieCache()
+        cache.set('key', SETTINGS, None, 'result')
+        self.assertIsNone(cache.get('key', dict(SETTINGS), 0))
+
+    def test_bounded(self):
+        cache = rest_utils.VerifiedCookieCache(max_entries=2)
+        for key in ('a', 'b', 'a', 'c'):
+            if cache.get(key, SETTINGS, 0) is None:
+                cache.set(key, SETTINGS, None, key)
+        self.assertEqual(cache.get('a', SETTINGS, 0), 'a')
+        self.assertIsNone(cache.get('b', SETTINGS, 0))
+        self.assertEqual(cache.get('c', SETTINGS, 0), 'c')